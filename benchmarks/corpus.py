@@ -0,0 +1,118 @@
+"""
+corpus.py
+
+Generates synthetic diary-style journals for benchmarking. The journals are plain text,
+in the same shape as the transcriptions NEAM is run on: a dated title line for each
+entry, followed by paragraphs mentioning people, places and organizations, with page
+numbers and [sic] marks scattered through them.
+
+Use:
+    python -m benchmarks.corpus --entries 1000 > journal.txt
+"""
+import argparse
+import random
+import sys
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS = ['Jan.', 'Feb.', 'Mar.', 'Apr.', 'May', 'June', 'July', 'Aug.', 'Sep.', 'Oct.', 'Nov.', 'Dec.']
+ORDINALS = {1: 'st', 2: 'd', 3: 'd', 21: 'st', 22: 'd', 23: 'd', 31: 'st'}
+
+PEOPLE = ['Mr. Davis', 'Mrs. Andrews', 'Maspero', 'Dr. Sayce', 'Lady Cromer', 'Capt. Moore', 'Miss Buttles']
+PLACES = ['Luxor', 'Cairo', 'Thebes', 'Assouan', 'Karnak', 'the Nile', 'Philae']
+ORGANIZATIONS = ['Cook', 'Khedivial', 'Museum', 'Consulate']
+
+SENTENCES = [
+    'We went with {person} to {place} in the morning.',
+    'Called upon {person} at {place}, who showed us the tombs.',
+    '{person} lunched with us on board the {org} boat.',
+    'A letter from {person} came by the {org} post from {place}.',
+    'The wind was very high all day and we did not go out.',
+    'Rode on donkeys to {place} and back before sunset.',
+    'In the evening {person} and {person} dined with us.'
+]
+MISSPELLINGS = ['teh', 'recieved', 'vry', 'seperate', 'untill']
+
+
+def generate_journal(entries, paragraphs=3, sentences=5, page_rate=0.3, sic_rate=0.05, year=1890, seed=0):
+    """
+    Generates the lines of a synthetic journal
+
+    :param entries: The number of dated entries in the journal
+    :type entries: int
+    :param paragraphs: The most paragraphs an entry can have
+    :type paragraphs: int
+    :param sentences: The most sentences a paragraph can have
+    :type sentences: int
+    :param page_rate: The chance of a paragraph starting on a new page
+    :type page_rate: float
+    :param sic_rate: The chance of a sentence containing a [sic] mark
+    :type sic_rate: float
+    :param year: The year of the first entry
+    :type year: int
+    :param seed: The seed for the random number generator
+    :return: The lines of the journal, each ending in a newline
+    :rtype: generator of str
+    """
+    rand = random.Random(seed)
+    month, day, weekday, page = 0, 1, 0, 1
+
+    yield 'Journal of a voyage up the Nile, {}\n'.format(year)
+
+    for _ in range(entries):
+        day += rand.randint(1, 3)
+        if day > 28:
+            day -= 28
+            month += 1
+            if month == 12:
+                month = 0
+                year += 1
+        weekday = (weekday + 1) % 7
+
+        title = '{}, {} {}{}'.format(WEEKDAYS[weekday], MONTHS[month], day, ORDINALS.get(day, 'th'))
+        if rand.random() < 0.1:
+            title += ' {}'.format(year)
+        yield title + '\n'
+
+        for _ in range(rand.randint(1, paragraphs)):
+            line = []
+            if rand.random() < page_rate:
+                page += 1
+                line.append('Page {}:'.format(page))
+            for _ in range(rand.randint(1, sentences)):
+                line.append(_sentence(rand, sic_rate))
+            yield ' '.join(line) + '\n'
+
+
+def _sentence(rand, sic_rate):
+    """
+    Generates a sentence for a journal entry
+
+    :param rand: The random number generator to use
+    :type rand: random.Random
+    :param sic_rate: The chance of the sentence containing a [sic] mark
+    :type sic_rate: float
+    :return: The sentence
+    :rtype: str
+    """
+    sentence = rand.choice(SENTENCES)
+    while '{person}' in sentence:
+        sentence = sentence.replace('{person}', rand.choice(PEOPLE), 1)
+    sentence = sentence.replace('{place}', rand.choice(PLACES)).replace('{org}', rand.choice(ORGANIZATIONS))
+
+    if rand.random() < sic_rate:
+        sentence += ' It was [sic; {}] tiring.'.format(rand.choice(MISSPELLINGS))
+
+    return sentence[0].upper() + sentence[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates a synthetic journal')
+    parser.add_argument('--entries', help='The number of entries to generate', type=int, default=1000)
+    parser.add_argument('--seed', help='The seed for the random number generator', type=int, default=0)
+    args = parser.parse_args()
+
+    sys.stdout.writelines(generate_journal(args.entries, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+run.py
+
+Benchmarks each stage of the NEAM pipeline, and the pipeline as a whole, on a synthetic
+journal. CoreNLP, the title model and Wikidata are replaced with the offline stand-ins
+in stubs.py, so the numbers reflect NEAM's own processing and can be reproduced on any
+machine.
+
+The results are written as JSON, and can be compared against the results from another
+commit to catch regressions.
+
+Use:
+    python -m benchmarks.run --entries 2000 --output baseline.json
+    python -m benchmarks.run --entries 2000 --compare baseline.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from neam.python.evaluation.regression import compare_stages
+from neam.python.neam import neam, build_pipeline
+from neam.python.util import git_commit
+
+from benchmarks.corpus import generate_journal
+from benchmarks.stubs import StubClassifier, StubTitleAnnotator, offline_wikidata
+
+MB = 1024 * 1024
+
+
+def benchmark_pipeline(parser='xml'):
+    """
+    Builds the standard NEAM pipeline around the offline stand-ins
+
+    :param parser: The XML parser to use for the later stages
+    :type parser: str
+    :return: The pipeline
+    :rtype: Pipeline
+    """
+    return build_pipeline(year=1890, parser=parser, classifier=StubClassifier(), title_annotator=StubTitleAnnotator())
+
+
+def run_stages(pipeline, lines, trace_memory=False):
+    """
+    Runs a journal through a pipeline one stage at a time, measuring each stage
+
+    Parsing the input into a soup is measured as a stage of its own.
+
+    :param pipeline: The pipeline to run
+    :type pipeline: Pipeline
+    :param lines: The lines of the journal
+    :type lines: list of str
+    :param trace_memory: Whether to measure the peak memory of each stage. This slows
+                         the stages down, so the timings are not meaningful.
+    :type trace_memory: bool
+    :return: The name, running time, and peak memory in bytes of each stage
+    :rtype: list of (str, float, int)
+    """
+    stages = [('parse', lambda text: BeautifulSoup(text, 'html.parser'))]
+    stages += [(type(process).__name__, getattr(process, 'run', process)) for process in pipeline.processes]
+
+    results = []
+    data = '<body>' + ''.join(lines) + '</body>'
+
+    for name, run in stages:
+        if trace_memory:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+        start = time.perf_counter()
+        data = run(data)
+        elapsed = time.perf_counter() - start
+
+        peak = tracemalloc.get_traced_memory()[1] - baseline if trace_memory else 0
+        results.append((name, elapsed, peak))
+
+    return results
+
+
+def benchmark(entries, repeat=3, parser='xml', seed=0):
+    """
+    Benchmarks the pipeline on a synthetic journal
+
+    Each stage, and the full pipeline, is timed *repeat* times and the best time is
+    kept. Peak memory is measured in a separate run.
+
+    :param entries: The number of entries in the journal
+    :type entries: int
+    :param repeat: The number of times to time each stage
+    :type repeat: int
+    :param parser: The XML parser to use for the later stages
+    :type parser: str
+    :param seed: The seed for the journal generator
+    :type seed: int
+    :return: The benchmark report
+    :rtype: dict
+    """
+    lines = list(generate_journal(entries, seed=seed))
+    size = sum(len(line.encode('utf-8')) for line in lines)
+
+    with offline_wikidata():
+        pipeline = benchmark_pipeline(parser)
+
+        best = {}
+        for _ in range(repeat):
+            for name, elapsed, _ in run_stages(pipeline, lines):
+                best[name] = min(best.get(name, float('inf')), elapsed)
+
+        tracemalloc.start()
+        peaks = {name: peak for name, _, peak in run_stages(pipeline, lines, trace_memory=True)}
+        tracemalloc.stop()
+
+        total = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            neam(lines, pipeline=pipeline)
+            total = min(total, time.perf_counter() - start)
+
+        tracemalloc.start()
+        neam(lines, pipeline=pipeline)
+        total_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'entries': entries,
+            'bytes': size,
+            'parser': parser,
+            'repeat': repeat,
+            'seed': seed
+        },
+        'stages': [_measurements(name, best[name], peaks[name], entries, size) for name in best],
+        'pipeline': _measurements('neam', total, total_peak, entries, size)
+    }
+
+
+def compare(report, baseline, threshold=0.1):
+    """
+    Prints how a report's timings have changed since a baseline
+
+    :param report: The current benchmark report
+    :type report: dict
+    :param baseline: The benchmark report to compare against
+    :type baseline: dict
+    :param threshold: The fraction a stage can slow down by before it is flagged
+    :type threshold: float
+    :return: The names of the stages that slowed down by more than the threshold
+    :rtype: list of str
+    """
+    print('Compared with {} ({})'.format(baseline['meta']['commit'], baseline['meta']['timestamp']))
+    return list(compare_stages(report, baseline, threshold))
+
+
+def print_report(report):
+    """
+    Prints a benchmark report as a table
+
+    :param report: The benchmark report
+    :type report: dict
+    """
+    meta = report['meta']
+    print('{} entries, {:.2f} MB, parser={}'.format(meta['entries'], meta['bytes'] / MB, meta['parser']))
+    print('{:>20}{:>12}{:>14}{:>10}{:>12}'.format('Stage', 'Time (s)', 'Entries/s', 'MB/s', 'Peak (MB)'))
+    for stage in report['stages'] + [report['pipeline']]:
+        print('{:>20}{:>12.4f}{:>14.1f}{:>10.2f}{:>12.1f}'.format(
+            stage['name'], stage['seconds'], stage['entries_per_sec'], stage['mb_per_sec'], stage['peak_memory_mb']
+        ))
+
+
+def _measurements(name, seconds, peak, entries, size):
+    """
+    Packs the measurements for a stage into a dict, working out its throughput
+
+    :return: The measurements
+    :rtype: dict
+    """
+    return {
+        'name': name,
+        'seconds': seconds,
+        'entries_per_sec': entries / seconds if seconds else float('inf'),
+        'mb_per_sec': size / MB / seconds if seconds else float('inf'),
+        'peak_memory_mb': peak / MB
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the NEAM pipeline on a synthetic journal')
+    parser.add_argument('--entries', help='The number of journal entries to generate', type=int, default=1000)
+    parser.add_argument('--repeat', help='The number of times to time each stage', type=int, default=3)
+    parser.add_argument('--parser', help='The XML parser to use for the later stages', choices=['xml', 'lxml'], default='xml')
+    parser.add_argument('--seed', help='The seed for the journal generator', type=int, default=0)
+    parser.add_argument('--output', help='A file to write the results to as JSON')
+    parser.add_argument('--compare', help='A JSON results file to compare against')
+    parser.add_argument('--threshold', help='The slowdown at which a stage is flagged', type=float, default=0.1)
+    args = parser.parse_args()
+
+    report = benchmark(args.entries, args.repeat, args.parser, args.seed)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+stubs.py
+
+Offline stand-ins for the parts of the pipeline that need CoreNLP, the NLTK models or
+Wikidata, so the pipeline can be benchmarked without a JVM or a network connection.
+
+The stand-ins subclass the real processors and only replace the model behind them, so
+the soup handling around each model is still exercised and timed.
+"""
+import re
+from contextlib import contextmanager
+from unittest import mock
+
+from bs4 import BeautifulSoup
+
+from neam.python.classification.classifier import Classifier, DEFAULT_TAGS
+from neam.python.classification.processing import NEAMProcessor
+from neam.python.classification.title_annotator import TitleAnnotator
+from neam.python.query import wiki
+
+from benchmarks.corpus import PEOPLE, PLACES, ORGANIZATIONS, MONTHS, WEEKDAYS
+
+# The Wikidata classes that WikiRetagger asks about, and the entities that belong to them
+WIKIDATA_CLASSES = {
+    'Person': 'Q5',
+    'Physical Object': 'Q223557',
+    'Agent': 'Q24229398',
+    'Group of humans': 'Q16334295',
+    'Network': 'Q1900326',
+    'Company': 'Q783794',
+    'Organization': 'Q43229'
+}
+WIKIDATA = dict(
+    [(name, 'Person') for name in PEOPLE] +
+    [(name, 'Physical Object') for name in PLACES] +
+    [(name, 'Company') for name in ORGANIZATIONS]
+)
+WIKIDATA_IDS = {name: 'Q{}'.format(1000 + i) for i, name in enumerate(sorted(WIKIDATA))}
+WIKIDATA_TYPES = {WIKIDATA_IDS[name]: WIKIDATA_CLASSES[cls] for name, cls in WIKIDATA.items()}
+
+
+class StubTitleClassifier:
+    """
+    Classifies a line as a title if it starts with a date
+    """
+    _PATTERN = re.compile('(?:{}), (?:{})'.format('|'.join(WEEKDAYS), '|'.join(re.escape(m) for m in MONTHS)))
+
+    def classify(self, line):
+        return 'I' if self._PATTERN.match(line) else 'O'
+
+
+class StubTitleAnnotator(TitleAnnotator):
+    """
+    A TitleAnnotator that doesn't need the NLTK models
+    """
+    def __init__(self):
+        self._classifier = StubTitleClassifier()
+        self._inside = 'I'
+        self._outside = 'O'
+        NEAMProcessor.__init__(self, BeautifulSoup, BeautifulSoup)
+
+
+class StubClassifier(Classifier):
+    """
+    A Classifier that tags a fixed list of names instead of running CoreNLP
+    """
+    def __init__(self):
+        names = [(name, 'persName') for name in PEOPLE] + \
+                [(name, 'placeName') for name in PLACES] + \
+                [(name, 'orgName') for name in ORGANIZATIONS]
+        self._tags = dict(names)
+        self._pattern = re.compile('|'.join(re.escape(name) for name, _ in sorted(names, key=lambda n: -len(n[0]))))
+        self._target_tags = set(DEFAULT_TAGS.values())
+        NEAMProcessor.__init__(self, BeautifulSoup, str)
+
+    def classify(self, text):
+        return self._pattern.sub(self._wrap, re.sub('\n', ' ', text))
+
+    def _wrap(self, match_object):
+        name = match_object.group(0)
+        return '<{0}>{1}</{0}>'.format(self._tags[name], name)
+
+
+def _lookup(string):
+    """
+    Answers entity lookups from the fixed tables rather than Wikidata
+    """
+    if string in WIKIDATA_CLASSES:
+        return {'id': WIKIDATA_CLASSES[string], 'label': string}
+    if string in WIKIDATA:
+        return {'id': WIKIDATA_IDS[string], 'label': string}
+    return {'id': None, 'label': None}
+
+
+def _run_sparql_query(query):
+    """
+    Answers type queries from the fixed tables rather than Wikidata
+    """
+    qid = re.search(r'wd:(Q\d+)', query).group(1)
+    types = [WIKIDATA_TYPES[qid]] if qid in WIKIDATA_TYPES else []
+    return [{'type': {'value': 'http://www.wikidata.org/entity/' + type_qid}} for type_qid in types]
+
+
+@contextmanager
+def offline_wikidata():
+    """
+    Answers any Wikidata queries made inside the block from fixed tables
+    """
+    with mock.patch.object(wiki, 'lookup', _lookup), mock.patch.object(wiki, 'run_sparql_query', _run_sparql_query):
+        yield
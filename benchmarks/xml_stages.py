@@ -0,0 +1,97 @@
+"""
+xml_stages.py
+
+Compares the BeautifulSoup and lxml implementations of the XML-consuming stages on a
+large synthetic journal, checking that both produce the same output. The Beautifier is
+also run on the journal wrapped in a namespaced TEI document, as the journals are
+published.
+
+Use:
+    python -m benchmarks.xml_stages --entries 5000
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from neam.python.classification.beautifier import Beautifier
+from neam.python.classification.wiki_retagger import WikiRetagger
+
+from benchmarks.corpus import generate_journal
+from benchmarks.run import benchmark_pipeline
+from benchmarks.stubs import offline_wikidata
+
+TEI = '<TEI xmlns="http://www.tei-c.org/ns/1.0"><!-- generated --><text>{}</text></TEI>'
+
+
+def stage_inputs(entries):
+    """
+    Runs a synthetic journal through the pipeline, keeping the input to each stage
+
+    :param entries: The number of journal entries to generate
+    :type entries: int
+    :return: The input to each stage, by the name of the stage
+    :rtype: dict
+    """
+    inputs = {}
+    data = BeautifulSoup('<body>' + ''.join(generate_journal(entries)) + '</body>', 'html.parser')
+
+    for process in benchmark_pipeline().processes:
+        inputs[type(process).__name__] = data
+        data = process.run(data)
+
+    return inputs
+
+
+def time_stage(make_stage, text, repeat):
+    """
+    Times a stage, keeping the best of several runs
+
+    :param make_stage: Creates the stage for a given parser
+    :param text: The input to the stage
+    :param repeat: The number of times to run the stage
+    :return: The best time for each parser, and whether their outputs matched
+    :rtype: tuple of (dict of str: float, bool)
+    """
+    times = {}
+    outputs = {}
+
+    for parser in ('xml', 'lxml'):
+        stage = make_stage(parser)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs[parser] = stage.run(text)
+            best = min(best, time.perf_counter() - start)
+        times[parser] = best
+
+    return times, outputs['xml'] == outputs['lxml']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the XML stages with BeautifulSoup and lxml')
+    parser.add_argument('--entries', help='The number of journal entries to generate', type=int, default=5000)
+    parser.add_argument('--repeat', help='The number of times to run each stage', type=int, default=3)
+    args = parser.parse_args()
+
+    stages = [
+        ('WikiRetagger', lambda parser: WikiRetagger(['placeName', 'orgName'], parser=parser)),
+        ('Beautifier', lambda parser: Beautifier(parser=parser)),
+        ('Beautifier TEI', lambda parser: Beautifier(parser=parser))
+    ]
+
+    with offline_wikidata():
+        inputs = stage_inputs(args.entries)
+        inputs['Beautifier TEI'] = TEI.format(inputs['Beautifier'])
+
+        print('{} entries, {:.1f} MB'.format(args.entries, len(inputs['WikiRetagger']) / 1e6))
+        print('{:>14}{:>12}{:>12}{:>10}{:>10}'.format('Stage', 'xml (s)', 'lxml (s)', 'Speedup', 'Same'))
+        for name, make_stage in stages:
+            times, same = time_stage(make_stage, inputs[name], args.repeat)
+            print('{:>14}{:>12.3f}{:>12.3f}{:>9.1f}x{:>10}'.format(
+                name, times['xml'], times['lxml'], times['xml'] / times['lxml'], 'yes' if same else 'NO'
+            ))
+
+
+if __name__ == '__main__':
+    main()
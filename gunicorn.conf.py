@@ -0,0 +1,31 @@
+"""
+gunicorn.conf.py
+
+Settings for serving the web application with gunicorn.
+"""
+import os
+import shutil
+import tempfile
+
+# Each worker keeps its metrics here, so that /metrics can add them all up no matter
+# which worker serves it. It's emptied when gunicorn starts.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'neam-metrics-web'))
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def post_worker_init(worker):
+    """
+    Loads the models behind the pipelines as each worker starts, so that the first
+    snippet sent to /annotate/text doesn't have to wait for them
+    """
+    from neam.python.app import load_pipelines
+    load_pipelines()
+
+
+def child_exit(server, worker):
+    """
+    Stops reporting the live metrics of a worker that has exited
+    """
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,4 +1,4 @@
 #!/bin/sh
 source .venv/bin/activate
-celery worker -A neam.python.app.celery -E --loglevel=info
+celery worker -A neam.python.app.celery -Q interactive,bulk -B -E --loglevel=info
 
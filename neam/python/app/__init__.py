@@ -1,11 +1,21 @@
+import io
 import os
-import re
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from flask import Flask
-from celery import Celery
-from jinja2 import Template
+from celery import Celery, chord
+from celery.signals import task_prerun, task_postrun, worker_init
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 
-from neam.python.neam import neam
+from neam.python.classification import Progress, EntityRegistry
+from neam.python.classification.entity_registry import rename_refs
+from neam.python.neam import read_journal, build_shaping_pipeline, build_annotation_pipeline, split_journal, join_journal, \
+    entity_registry
+from neam.python.app import status, routing, batch, metrics
+from neam.python.app.storage import make_store, clean_up
 
 
 FILE_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -36,44 +46,577 @@ def make_celery(app):
 
 # Initialize the application and configure it
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = '/tmp/'
+app.config['BLOB_STORE'] = os.environ.get('BLOB_STORE', 'local')
+app.config['BLOB_STORE_PATH'] = os.environ.get('BLOB_STORE_PATH', '/tmp/neam')
+app.config['BLOB_STORE_BUCKET'] = os.environ.get('BLOB_STORE_BUCKET')
+app.config['BLOB_STORE_PREFIX'] = os.environ.get('BLOB_STORE_PREFIX', '')
+app.config['BLOB_STORE_ENDPOINT_URL'] = os.environ.get('BLOB_STORE_ENDPOINT_URL')
 app.config['CELERY_BROKER_URL'] = os.environ['REDIS_URL'] if 'REDIS_URL' in os.environ else 'redis://localhost:6379/0'
 app.config['CELERY_RESULT_BACKEND'] = os.environ['REDIS_URL'] if 'REDIS_URL' in os.environ else 'redis://localhost:6379/0'
+app.config['STATUS_REDIS_URL'] = app.config['CELERY_BROKER_URL']
+app.config['STATUS_STREAM_TIMEOUT'] = int(os.environ.get('STATUS_STREAM_TIMEOUT', 300))
+app.config['CHUNK_ENTRIES'] = int(os.environ.get('CHUNK_ENTRIES', 200))
+app.config['SMALL_DOCUMENT_BYTES'] = int(os.environ.get('SMALL_DOCUMENT_BYTES', 256 * 1024))
+app.config['INTERACTIVE_QUEUE'] = os.environ.get('INTERACTIVE_QUEUE', 'interactive')
+app.config['BULK_QUEUE'] = os.environ.get('BULK_QUEUE', 'bulk')
+app.config['USER_TASK_LIMIT'] = int(os.environ.get('USER_TASK_LIMIT', 2))
+app.config['USER_RETRY_DELAY'] = int(os.environ.get('USER_RETRY_DELAY', 10))
+app.config['USER_MAX_RETRIES'] = int(os.environ.get('USER_MAX_RETRIES', 360))
+# The chunks of a large document are always bulk work, and a worker shouldn't reserve
+# more tasks than it is running so that waiting tasks can go to whichever worker frees up
+app.config['CELERY_ROUTES'] = {
+    'neam.python.app.annotate_chunk': {'queue': app.config['BULK_QUEUE']},
+    'neam.python.app.stitch_chunks': {'queue': app.config['BULK_QUEUE']},
+    'neam.python.app.free_slot': {'queue': app.config['BULK_QUEUE']},
+    'neam.python.app.annotate_documents': {'queue': app.config['BULK_QUEUE']},
+    'neam.python.app.pack_batch': {'queue': app.config['BULK_QUEUE']},
+    'neam.python.app.clean_up_blob_store': {'queue': app.config['BULK_QUEUE']}
+}
+app.config['CELERYD_PREFETCH_MULTIPLIER'] = 1
+# 'perceptron' runs the pure Python classifier instead of CoreNLP, which needs far less
+# memory and starts up straight away, and the URL of a CoreNLP server lets the workers
+# share its JVM rather than each starting one; NER_MODEL overrides the model of any
+app.config['NER_BACKEND'] = os.environ.get('NER_BACKEND', 'corenlp')
+app.config['NER_MODEL'] = os.environ.get('NER_MODEL')
+# A CSV file of known entities, in the format csv_to_sql.py reads, to tag before NER
+app.config['GAZETTEER'] = os.environ.get('GAZETTEER')
+# How many entities a worker remembers the retagging of from one document to the next,
+# rather than checking each against Wikidata once per document, with 0 for none
+app.config['WIKI_MEMO_SIZE'] = int(os.environ.get('WIKI_MEMO_SIZE', 0))
+app.config['SNIPPET_MAX_CHARS'] = int(os.environ.get('SNIPPET_MAX_CHARS', 10000))
+app.config['SNIPPET_TIMEOUT'] = float(os.environ.get('SNIPPET_TIMEOUT', 10))
+app.config['BATCH_MAX_DOCUMENTS'] = int(os.environ.get('BATCH_MAX_DOCUMENTS', 1000))
+# The most the documents of a batch may take up once unpacked, with 0 meaning no limit
+app.config['BATCH_MAX_BYTES'] = int(os.environ.get('BATCH_MAX_BYTES', 512 * 1024 ** 2))
+app.config['BATCH_DOCUMENTS_PER_TASK'] = int(os.environ.get('BATCH_DOCUMENTS_PER_TASK', 10))
+app.config['WORKER_METRICS_PORT'] = int(os.environ.get('WORKER_METRICS_PORT', 9540))
+# How long uploads, results and task states are kept for, and how much space the blob
+# store may take up, with 0 meaning no limit
+app.config['RESULT_MAX_AGE'] = int(os.environ.get('RESULT_MAX_AGE', 7 * 24 * 60 * 60))
+app.config['BLOB_STORE_MAX_BYTES'] = int(os.environ.get('BLOB_STORE_MAX_BYTES', 10 * 1024 ** 3))
+# How long a blob is kept for after it was last used, even if the blob store is over
+# BLOB_STORE_MAX_BYTES, which has to be longer than an upload can wait in the queue and
+# its chunks can wait to be stitched together
+app.config['BLOB_STORE_MIN_AGE'] = int(os.environ.get('BLOB_STORE_MIN_AGE', 24 * 60 * 60))
+app.config['CLEAN_UP_INTERVAL'] = int(os.environ.get('CLEAN_UP_INTERVAL', 60 * 60))
+app.config['CELERY_TASK_RESULT_EXPIRES'] = app.config['RESULT_MAX_AGE'] or None
+app.config['CELERYBEAT_SCHEDULE'] = {
+    'clean-up-blob-store': {
+        'task': 'neam.python.app.clean_up_blob_store',
+        'schedule': app.config['CLEAN_UP_INTERVAL']
+    }
+}
 
 celery = make_celery(app)
+store = make_store(app.config)
+
+# The TEI templates, which are compiled once per process. Flask's own environment
+# isn't used since it escapes XML templates.
+tei_templates = Environment(
+    loader=FileSystemLoader(os.path.join(FILE_DIR, 'templates')),
+    bytecode_cache=FileSystemBytecodeCache()
+)
+
+
+class ProgressReporter:
+    """
+    Passes pipeline progress on to a task's state, and publishes it to anyone streaming
+    the task's status. Updates are sent at most once every *interval* seconds within a
+    stage so that Redis isn't flooded with them.
+    """
+    def __init__(self, task, interval=1.0, task_id=None):
+        """
+        Initializes the reporter
+
+        :param task: The bound task whose state should be updated
+        :param interval: The minimum number of seconds between updates within a stage
+        :type interval: float
+        :param task_id: The ID of the task to report progress for, if it isn't *task*
+        :type task_id: str
+        """
+        self._task = task
+        self._task_id = task_id or task.request.id
+        self._interval = interval
+        self._stage = None
+        self._last = 0
+
+    def __call__(self, progress):
+        now = time.monotonic()
+        finished = progress.total and progress.current == progress.total
+
+        if progress.stage == self._stage and not finished and now - self._last < self._interval:
+            return
+
+        self._stage = progress.stage
+        self._last = now
+        message = 'Running {} ({} of {})'.format(progress.stage, progress.stage_number, progress.stages)
+        if progress.total:
+            message += ': {} of {}'.format(progress.current, progress.total)
+
+        self._task.update_state(task_id=self._task_id, state='PROGRESS', meta=dict(progress._asdict(), status=message))
+        status.publish(app.config['STATUS_REDIS_URL'], self._task_id, {
+            'state': 'PROGRESS', 'status': message, 'progress': progress._asdict()
+        })
+
+
+def offset_progress(report, before, after):
+    """
+    Adjusts the progress of a pipeline that is one part of a larger run
+
+    :param report: Reports the progress of the whole run
+    :type report: callable
+    :param before: The number of stages that run before the pipeline
+    :type before: int
+    :param after: The number of stages that run after the pipeline
+    :type after: int
+    :return: Reports the progress of the pipeline as part of the whole run
+    :rtype: callable
+    """
+    return lambda progress: report(progress._replace(
+        stage_number=before + progress.stage_number,
+        stages=before + progress.stages + after
+    ))
+
+
+class ChunkProgress:
+    """
+    Combines the progress of a journal's chunks, which are annotated in parallel, into
+    the progress of the journal.
+
+    Each chunk records how many annotation stages it has finished. The journal is
+    reported as being on the stage that the slowest chunks have reached, with its
+    current count being the number of chunks that have finished that stage.
+    """
+    def __init__(self, report, task_id, chunk, chunks, offset):
+        """
+        Initializes the progress
+
+        :param report: Reports the progress of the journal
+        :type report: callable
+        :param task_id: The ID of the task annotating the journal
+        :type task_id: str
+        :param chunk: The index of this chunk
+        :type chunk: int
+        :param chunks: The number of chunks the journal was split into
+        :type chunks: int
+        :param offset: The number of stages run before the chunks were split off
+        :type offset: int
+        """
+        self._report = report
+        self._task_id = task_id
+        self._chunk = chunk
+        self._chunks = chunks
+        self._offset = offset
+
+    def __call__(self, progress):
+        # Only the start of each stage is recorded
+        if not progress.total:
+            self.record(progress.stage_number - 1, progress.stages)
+
+    def record(self, stages_done, stages):
+        """
+        Records how many stages the chunk has finished, and reports the progress of
+        the journal
+
+        :param stages_done: The number of stages the chunk has finished
+        :type stages_done: int
+        :param stages: The number of annotation stages
+        :type stages: int
+        """
+        done = status.record_chunk(app.config['STATUS_REDIS_URL'], self._task_id, self._chunk, stages_done)
+        # chunks that haven't recorded anything yet haven't finished any stages
+        stage = min(min(done) if len(done) == self._chunks else 0, stages - 1)
+        finished = sum(1 for chunk_done in done if chunk_done > stage)
+        self._report(Progress('Annotation', self._offset + stage + 1, self._offset + stages, finished, self._chunks))
+
+
+def run_pipeline(pipeline, data, progress=None):
+    """
+    Runs a pipeline, recording how long each of its stages takes
+
+    :param pipeline: The pipeline to run
+    :type pipeline: Pipeline
+    :param data: The data to pass into the first stage
+    :param progress: Called with a Progress as the pipeline runs
+    :type progress: callable
+    :return: The output from the final stage
+    """
+    timer = metrics.StageTimer(progress)
+    try:
+        return pipeline.run(data, timer)
+    finally:
+        timer.finish()
+
+
+@lru_cache(maxsize=None)
+def load_pipelines():
+    """
+    Builds the pipelines once per worker, so the models behind them are only loaded
+    once
+
+    :return: The shaping and annotation pipelines
+    :rtype: tuple of (Pipeline, Pipeline)
+    """
+    return build_shaping_pipeline(), build_annotation_pipeline(app.config['NER_MODEL'], ner=app.config['NER_BACKEND'],
+                                                               gazetteer=app.config['GAZETTEER'],
+                                                               wiki_memo_size=app.config['WIKI_MEMO_SIZE'])
+
+
+# The pipelines aren't safe to share between threads, so snippets are annotated one at
+# a time on a thread of their own
+snippet_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def annotate_snippet(text, timeout):
+    """
+    Annotates a short piece of text in this process, using the same pipelines as the
+    workers
+
+    :param text: The text to annotate
+    :type text: str
+    :param timeout: The longest to wait for the annotation, in seconds, including any
+                    time spent waiting for other snippets to finish
+    :type timeout: float
+    :return: The annotated text
+    :rtype: str
+    :raises concurrent.futures.TimeoutError: If the annotation takes too long
+    """
+    def run():
+        shaping, annotation = load_pipelines()
+        return run_pipeline(annotation, run_pipeline(shaping, read_journal([text])))
+
+    return snippet_executor.submit(run).result(timeout)
 
 
 @celery.task(bind=True)
-def neam_annotate(self, filename, form):
+def neam_annotate(self, key, form, user=None):
     """
     Annotates a document with NEAM
 
+    Documents with more than CHUNK_ENTRIES entries are split into chunks once their
+    entries have been found, and the chunks are annotated in parallel by *annotate_chunk*
+    and stitched back together by *stitch_chunks*. This task is replaced by that
+    workflow, so its result is still the result of the whole document.
+
+    If the user already has USER_TASK_LIMIT documents being annotated, the task goes
+    back on its queue and tries again after USER_RETRY_DELAY seconds, up to
+    USER_MAX_RETRIES times. The slot is held under the ID of this task until the
+    document has been annotated, or has failed to be.
+
     TODO: Ensure the file exists
 
-    :param filename: The name of the file to annotate
-    :param email: The data provided to the HTML form
-    :return: A response object that has as its result the name of the annotated file
+    :param key: The key of the uploaded file in the blob store
+    :param form: The data provided to the HTML form
+    :param user: Identifies the user who uploaded the file
+    :return: A response object that has as its result the path to download the
+             annotated file from
+    """
+    slot = self.request.id
+    if user and not routing.acquire_slot(app.config['STATUS_REDIS_URL'], user, slot, app.config['USER_TASK_LIMIT']):
+        raise self.retry(countdown=app.config['USER_RETRY_DELAY'], max_retries=app.config['USER_MAX_RETRIES'])
+
+    handed_off = False
+    try:
+        self.update_state(state='PROGRESS', meta={})
+        shaping, annotation = load_pipelines()
+        report = ProgressReporter(self)
+        before, after = len(shaping.processes), len(annotation.processes)
+
+        # Find the entries
+        with io.TextIOWrapper(store.open(key), encoding='utf-8') as f:
+            soup = run_pipeline(shaping, read_journal(f), offset_progress(report, 0, after))
+        chunks = split_journal(soup, app.config['CHUNK_ENTRIES'])
+
+        if len(chunks) == 1:
+            body = run_pipeline(annotation, read_journal(chunks[0]), offset_progress(report, before, 0))
+            return render_document(body, form, entity_registry(annotation))
+
+        # Fan the chunks out across the workers. The user's slot is released once
+        # they've been stitched back together, or if any of them fails.
+        keys = [store.put([chunk.encode('utf-8')]) for chunk in chunks]
+        handed_off = True
+        stitch = stitch_chunks.s(form, user, slot)
+        if user:
+            stitch = stitch.on_error(free_slot.si(user, slot))
+        return self.replace(chord(
+            [annotate_chunk.s(chunk_key, self.request.id, i, len(keys), before) for i, chunk_key in enumerate(keys)],
+            stitch
+        ))
+    finally:
+        if user and not handed_off:
+            release_slot(user, slot)
+
+
+@celery.task(bind=True)
+def annotate_chunk(self, key, task_id, chunk, chunks, offset):
+    """
+    Annotates a chunk of a document
+
+    :param key: The key of the chunk in the blob store
+    :param task_id: The ID of the task annotating the whole document
+    :param chunk: The index of the chunk
+    :param chunks: The number of chunks the document was split into
+    :param offset: The number of stages run before the document was split
+    :return: The key of the annotated chunk in the blob store, and the entities it
+             refers to, as returned by EntityRegistry.to_dict
+    """
+    _, annotation = load_pipelines()
+    progress = ChunkProgress(ProgressReporter(self, task_id=task_id), task_id, chunk, chunks, offset)
+
+    with io.TextIOWrapper(store.open(key), encoding='utf-8') as f:
+        body = run_pipeline(annotation, read_journal(f), progress)
+    progress.record(len(annotation.processes), len(annotation.processes))
+
+    return store.put([body.encode('utf-8')]), entity_registry(annotation).to_dict()
+
+
+@celery.task
+def stitch_chunks(chunks, form, user=None, slot=None):
+    """
+    Stitches the annotated chunks of a document back together, along with the entities
+    each refers to
+
+    :param chunks: The results of *annotate_chunk* for each chunk, in order
+    :param form: The data provided to the HTML form
+    :param user: Identifies the user who uploaded the document
+    :param slot: Identifies the slot the user's document is held in
+    :return: A response object that has as its result the path to download the
+             annotated file from
+    """
+    try:
+        registry = EntityRegistry()
+        bodies = []
+        for key, entities in chunks:
+            renames = registry.merge(EntityRegistry.from_dict(entities))
+            bodies.append(rename_refs(b''.join(store.get(key)).decode('utf-8'), renames))
+        body = join_journal(bodies)
+        return render_document(body, form, registry)
+    finally:
+        if user:
+            release_slot(user, slot)
+
+
+@celery.task
+def free_slot(user, slot):
+    """
+    Frees a user's slot when a chunk of their document fails to be annotated, since
+    *stitch_chunks* never runs to free it
+
+    :param user: Identifies the user
+    :param slot: Identifies the slot the document was held in
+    """
+    release_slot(user, slot)
+
+
+def release_slot(user, slot):
+    """
+    Frees the slot a user's document was being annotated in
+
+    :param user: Identifies the user
+    :type user: str
+    :param slot: Identifies the slot the document was held in
+    :type slot: str
+    """
+    if app.config['USER_TASK_LIMIT']:
+        routing.release_slot(app.config['STATUS_REDIS_URL'], user, slot)
+
+
+def start_batch(documents, name):
+    """
+    Starts annotating a batch of documents
+
+    The documents are split into groups of BATCH_DOCUMENTS_PER_TASK, each annotated by
+    a single *annotate_documents* task so that a worker keeps its pipeline busy, and
+    *pack_batch* zips the results up once they're all done. The batch's status is
+    reported under the ID of the *pack_batch* task.
+
+    :param documents: The key of each document in the blob store, and the form data for
+                      it
+    :type documents: list of (str, dict)
+    :param name: The name to give the zipped results
+    :type name: str
+    :return: The result of the batch
+    :rtype: celery.result.AsyncResult
+    """
+    size = app.config['BATCH_DOCUMENTS_PER_TASK']
+    groups = [documents[i:i + size] for i in range(0, len(documents), size)]
+
+    callback = pack_batch.s(name)
+    batch_id = callback.freeze().id
+    return chord(
+        [annotate_documents.s(group, batch_id, i, len(documents)) for i, group in enumerate(groups)],
+        callback
+    ).apply_async()
+
+
+@celery.task(bind=True)
+def annotate_documents(self, documents, batch_id, group, total):
+    """
+    Annotates a group of documents from a batch
+
+    A document that can't be annotated doesn't stop the rest of the group; the error is
+    passed on to be listed alongside the results.
+
+    :param documents: The key of each document in the blob store, and the form data for
+                      it
+    :param batch_id: The ID of the batch
+    :param group: The index of the group in the batch
+    :param total: The number of documents in the batch
+    :return: The name of each document and either the key of the annotated document in
+             the blob store or the error that stopped it from being annotated
+    """
+    shaping, annotation = load_pipelines()
+    report = ProgressReporter(self, task_id=batch_id)
+    results = []
+
+    for key, form in documents:
+        try:
+            with io.TextIOWrapper(store.open(key), encoding='utf-8') as f:
+                body = run_pipeline(annotation, run_pipeline(shaping, read_journal(f)))
+            result_key, name = render_document(body, form, entity_registry(annotation))['result'].split('/', 1)
+            results.append((name, result_key, None))
+        except Exception as e:
+            results.append((form['filename'], None, str(e)))
+
+        done = sum(status.record_chunk(app.config['STATUS_REDIS_URL'], batch_id, group, len(results)))
+        report(Progress('Annotation', 1, 1, done, total))
+
+    return results
+
+
+@celery.task
+def pack_batch(groups, name):
+    """
+    Zips up the annotated documents of a batch
+
+    :param groups: The results of each group of documents in the batch
+    :param name: The name to give the zipped results
+    :return: A response object that has as its result the path to download the zipped
+             results from
+    """
+    results = [result for group in groups for result in group]
+    documents = [(name, key) for name, key, error in results if key]
+    errors = [(name, error) for name, key, error in results if error]
+
+    return {'result': '{}/{}'.format(batch.write_archive(documents, errors, store), name)}
+
+
+@celery.task
+def clean_up_blob_store():
+    """
+    Removes uploads and results that are older than RESULT_MAX_AGE, then the least
+    recently used until the blob store fits within BLOB_STORE_MAX_BYTES, leaving those
+    used within BLOB_STORE_MIN_AGE. Celery beat runs this every CLEAN_UP_INTERVAL
+    seconds.
+
+    :return: The number of blobs removed, and the number of bytes they took up
     """
-    new_file = filename + '.xml'
-    tab = '\t' * 2
+    return clean_up(store, app.config['RESULT_MAX_AGE'] or None, app.config['BLOB_STORE_MAX_BYTES'] or None,
+                    app.config['BLOB_STORE_MIN_AGE'])
 
-    self.update_state(state='PROGRESS', meta={})
 
-    # Annotate the file
-    with open(os.path.join(app.config['UPLOAD_FOLDER'], filename)) as f:
-        form['body'] = tab + re.sub('\n', '\n' + tab, neam(f))
+def render_document(body, form, registry=None):
+    """
+    Embeds an annotated document inside a TEI document, and stores it as it is rendered
+
+    :param body: The output of the annotation pipeline
+    :type body: str
+    :param form: The data provided to the HTML form
+    :type form: dict
+    :param registry: The entities the document refers to, which are described in its
+                     standoff markup
+    :type registry: EntityRegistry
+    :return: A response object that has as its result the path to download the
+             annotated file from
+    """
+    new_file = form['filename'] + '.xml'
 
-    # Embed the file inside a TEI document
-    with open(os.path.join(FILE_DIR, 'templates', 'tei.xml')) as template_file:
-        with open(os.path.join(app.config['UPLOAD_FOLDER'], new_file), 'w') as out:
-            template = Template(''.join(template_file.readlines()))
-            out.write(template.render(**form))
+    standoff = registry.standoff('\t') if registry else ''
+    stream = tei_templates.get_template('tei.xml').stream(form, body=indent(body, '\t' * 2),
+                                                          standoff=indent(standoff, '\t') if standoff else None)
+    stream.enable_buffering(64)
+    result = store.put(chunk.encode('utf-8') for chunk in stream)
 
-    if form['email']:
+    if form.get('email'):
         # TODO: implement email functionality
         pass
 
-    return {'result': new_file}
+    return {'result': '{}/{}'.format(result, new_file)}
+
+
+def indent(text, tab):
+    """
+    Indents each line of some text, a line at a time
+
+    :param text: The text to indent
+    :type text: str
+    :param tab: The string to put at the start of each line
+    :type tab: str
+    :return: The indented text, in pieces
+    :rtype: generator of str
+    """
+    start = 0
+    separator = tab
+    while True:
+        end = text.find('\n', start)
+        if end == -1:
+            yield separator + text[start:]
+            return
+        yield separator + text[start:end]
+        separator = '\n' + tab
+        start = end + 1
+
+
+@task_postrun.connect
+def publish_final_status(sender, task_id, retval, state, **kwargs):
+    """
+    Publishes the outcome of an annotation to anyone streaming its status
+
+    A task that was replaced by a workflow finishes without a final state, and the
+    workflow's last task publishes it instead under the same ID.
+    """
+    if sender not in (neam_annotate, stitch_chunks, pack_batch) or state not in status.FINAL_STATES:
+        return
+
+    if state == 'SUCCESS':
+        final_status = {'state': state, 'status': '', 'result': retval['result']}
+    else:
+        final_status = {'state': state, 'status': str(retval)}
+    status.publish(app.config['STATUS_REDIS_URL'], task_id, final_status)
+
+
+_task_starts = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id, **kwargs):
+    _task_starts[task_id] = time.monotonic()
+
+
+@task_postrun.connect
+def record_task_metrics(sender, task_id, state, **kwargs):
+    """
+    Records how long a task took, and the state of the worker after running it
+    """
+    start = _task_starts.pop(task_id, None)
+    if start is not None:
+        metrics.TASK_DURATION.labels(sender.name, state or 'UNKNOWN').observe(time.monotonic() - start)
+    metrics.record_worker_state()
+
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs):
+    """
+    Serves the metrics of a worker's processes, unless WORKER_METRICS_PORT is 0
+    """
+    if app.config['WORKER_METRICS_PORT']:
+        metrics.serve(app.config['WORKER_METRICS_PORT'], [queue_collector])
+
+
+# Reports the depth of every queue the annotation tasks go on
+queue_collector = metrics.QueueCollector(
+    app.config['CELERY_BROKER_URL'], ['celery', app.config['INTERACTIVE_QUEUE'], app.config['BULK_QUEUE']]
+)
 
 
 from neam.python.app import routes
@@ -1,6 +1,7 @@
 $(() => {
   let elements = {
     progress_bar: $('#progress-bar'),
+    bar: $('#progress-bar > div'),
     button: $('#submit-button'),
     text: $('#info-text')
   };
@@ -10,8 +11,13 @@ $(() => {
 
   $('#annotation-form').ajaxForm({
     success(data, textStatus, request) {
-      status_url = request.getResponseHeader('Location');
-      update_progress(status_url, elements);
+      let status_url = request.getResponseHeader('Location');
+
+      if (window.EventSource && data['stream']) {
+        stream_progress(data['stream'], status_url, elements);
+      } else {
+        update_progress(status_url, elements);
+      }
     },
     beforeSubmit() {
       elements['progress_bar'].show();
@@ -21,20 +27,56 @@ $(() => {
   });
 });
 
+function stream_progress(stream_url, status_url, elements) {
+  let source = new EventSource(stream_url);
+
+  source.onmessage = event => {
+    if (!handle_status(JSON.parse(event.data), elements)) {
+      source.close();
+    }
+  };
+  source.onerror = () => {
+    // The server closes the stream after a while; EventSource reconnects by itself
+    // unless the connection failed outright, in which case fall back to polling
+    if (source.readyState == EventSource.CLOSED) {
+      update_progress(status_url, elements);
+    }
+  };
+}
+
 function update_progress(status_url, elements) {
   $.getJSON(status_url, data => {
-    let state = data['state'];
-
-    if (state == 'PENDING' || state == 'PROGRESS') {
+    if (handle_status(data, elements)) {
       setTimeout(() => {
         update_progress(status_url, elements);
       }, 2000);
-    } else {
-      window.location = '/download/' + data['result'];
-      elements['progress_bar'].hide();
-      elements['text'].hide();
-      elements['button'].removeClass('disabled');
     }
   });
 }
 
+function handle_status(data, elements) {
+  let state = data['state'];
+
+  if (state == 'PENDING' || state == 'PROGRESS' || state == 'RETRY') {
+    if (data['progress']) {
+      show_progress(data['status'], data['progress'], elements);
+    } else if (state == 'RETRY') {
+      elements['text'].text(data['status']);
+    }
+    return true;
+  }
+
+  window.location = '/download/' + data['result'];
+  elements['progress_bar'].hide();
+  elements['text'].hide();
+  elements['button'].removeClass('disabled');
+  return false;
+}
+
+function show_progress(status, progress, elements) {
+  let stage_fraction = progress['total'] ? progress['current'] / progress['total'] : 0;
+  let percent = 100 * (progress['stage_number'] - 1 + stage_fraction) / progress['stages'];
+
+  elements['bar'].removeClass('indeterminate').addClass('determinate').css('width', percent + '%');
+  elements['text'].text(status);
+}
@@ -0,0 +1,152 @@
+"""
+batch.py
+
+Unpacks the documents of a batch upload, and packs the annotated documents back up
+into a single archive.
+
+A batch can be sent as several files, as a zip or tar archive, or as a mix of both.
+Documents are read out of archives a chunk at a time, so that they can be passed
+straight on to the blob store. They keep their paths within an archive, so that the
+annotated documents are laid out the same way. The size of a batch can be limited, and
+is checked against both the sizes an archive gives for its documents and the bytes
+actually read, so that a small archive can't unpack into more than the limit.
+"""
+import os
+import tarfile
+import tempfile
+import zipfile
+
+from neam.python.app.storage import read_chunks
+
+_TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+class BatchTooLarge(ValueError):
+    """
+    Raised when the documents in a batch take up more than the limit, once unpacked
+    """
+
+
+def iter_documents(files, max_bytes=None):
+    """
+    Generates the documents in a batch upload
+
+    :param files: The uploaded files
+    :type files: list of werkzeug.datastructures.FileStorage
+    :param max_bytes: The most the documents may take up once unpacked, in bytes, or
+                      None for no limit
+    :type max_bytes: int
+    :return: The name of each document, and its content a chunk at a time. The content
+             must be read before moving on to the next document. No two documents have
+             the same name.
+    :rtype: generator of (str, iterable of bytes)
+    :raises BatchTooLarge: If the documents take up more than *max_bytes*, either
+                           before a document is generated or as its content is read
+    """
+    names = set()
+    total = [0]  # the bytes read so far, across every document
+
+    def count(chunks):
+        for chunk in chunks:
+            total[0] += len(chunk)
+            _check_size(total[0], max_bytes)
+            yield chunk
+
+    for name, size, chunks in _iter_files(files):
+        _check_size(total[0] + size, max_bytes)
+        yield _unique_name(_safe_path(name), names), count(chunks)
+
+
+def _check_size(size, max_bytes):
+    """
+    :raises BatchTooLarge: If the size is over the limit
+    """
+    if max_bytes is not None and size > max_bytes:
+        raise BatchTooLarge('A batch can take up at most {} bytes'.format(max_bytes))
+
+
+def _iter_files(files):
+    """
+    Generates the documents in a batch upload, with the paths they were given and the
+    sizes their archives give for them, or 0 if they aren't in an archive
+    """
+    for f in files:
+        name = f.filename.lower()
+
+        if name.endswith('.zip'):
+            with zipfile.ZipFile(f.stream) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir():
+                        with archive.open(member) as document:
+                            yield member.filename, member.file_size, read_chunks(document)
+        elif name.endswith(_TAR_EXTENSIONS):
+            with tarfile.open(fileobj=f.stream, mode='r|*') as archive:
+                for member in archive:
+                    if member.isfile():
+                        yield member.name, member.size, read_chunks(archive.extractfile(member))
+        else:
+            yield os.path.basename(f.filename), 0, read_chunks(f.stream)
+
+
+def _safe_path(path):
+    """
+    :return: A path with no parent directories, drive or leading slash, so that it
+             stays inside whatever directory it is extracted to
+    :rtype: str
+    """
+    parts = path.replace('\\', '/').split('/')
+    parts = [part for part in parts if part not in ('', '.', '..')]
+    if parts and parts[0].endswith(':'):
+        parts = parts[1:]
+    return '/'.join(parts) or 'document'
+
+
+def _unique_name(name, names):
+    """
+    Numbers a name if it has already been used, such as x (2).txt for a second x.txt
+
+    :param name: The name
+    :type name: str
+    :param names: The names used so far, which the name returned is added to
+    :type names: set of str
+    :rtype: str
+    """
+    base, extension = os.path.splitext(name)
+    unique = name
+    number = 1
+    while unique in names:
+        number += 1
+        unique = '{} ({}){}'.format(base, number, extension)
+    names.add(unique)
+    return unique
+
+
+def write_archive(documents, errors, store):
+    """
+    Packs annotated documents into a zip archive in the blob store
+
+    :param documents: The name of each annotated document, and its key in the blob store
+    :type documents: list of (str, str)
+    :param errors: The name of each document that couldn't be annotated, and why. These
+                   are listed in an errors.txt file in the archive.
+    :type errors: list of (str, str)
+    :param store: The blob store
+    :type store: BlobStore
+    :return: The key of the archive in the blob store
+    :rtype: str
+    """
+    with tempfile.SpooledTemporaryFile(max_size=1 << 24) as spool:
+        with zipfile.ZipFile(spool, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, key in documents:
+                with archive.open(name, 'w') as member:
+                    for chunk in store.get(key):
+                        member.write(chunk)
+
+            if errors:
+                archive.writestr('errors.txt', ''.join('{}: {}\n'.format(name, error) for name, error in errors))
+
+        spool.seek(0)
+        return store.put(read_chunks(spool))
+
+
+__all__ = ['BatchTooLarge', 'iter_documents', 'write_archive']
@@ -0,0 +1,173 @@
+"""
+metrics.py
+
+Defines the Prometheus metrics for the web application and the workers.
+
+Both gunicorn and Celery run several processes, so the metrics are kept in Prometheus'
+multiprocess mode whenever PROMETHEUS_MULTIPROC_DIR is set. The web application serves
+them at /metrics, and each worker serves its own on WORKER_METRICS_PORT.
+
+Queue depths are read from the broker when the metrics are scraped. Everything else is
+recorded as it happens:
+    * HTTP requests, by endpoint and status, and how long they took
+    * The size of each uploaded document
+    * How long each task and each pipeline stage took
+    * How much of the JVM's heap CoreNLP is using, after each task
+    * How often a Wikidata lookup is answered from the cache
+"""
+import os
+import sys
+
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+                               start_http_server, CONTENT_TYPE_LATEST)
+from prometheus_client.core import GaugeMetricFamily
+
+from neam.python.app import status
+from neam.python.classification import processing
+from neam.python.query import wiki
+
+# Durations from 10ms up to about 90 minutes
+_DURATION_BUCKETS = [0.01 * 2 ** n for n in range(20)]
+
+REQUESTS = Counter('neam_http_requests_total', 'HTTP requests handled', ['method', 'endpoint', 'status'])
+REQUEST_DURATION = Histogram('neam_http_request_duration_seconds', 'Time taken to handle HTTP requests', ['endpoint'])
+DOCUMENT_SIZE = Histogram(
+    'neam_document_size_bytes', 'Size of uploaded documents', buckets=[1024 * 4 ** n for n in range(10)]
+)
+TASK_DURATION = Histogram(
+    'neam_task_duration_seconds', 'Time taken to run tasks', ['task', 'state'], buckets=_DURATION_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    'neam_stage_duration_seconds', 'Time taken to run pipeline stages', ['stage'], buckets=_DURATION_BUCKETS
+)
+JVM_HEAP = Gauge('neam_jvm_heap_bytes', 'JVM heap usage', ['area'], multiprocess_mode='liveall')
+WIKIDATA_LOOKUPS = Counter('neam_wikidata_lookups_total', 'Wikidata lookups, by whether they were cached', ['result'])
+
+_QUEUE_PRIORITIES = ['', '\x06\x163', '\x06\x166', '\x06\x169']
+_wikidata_seen = {'hits': 0, 'misses': 0}
+# The collectors already added to the global registry
+_global_collectors = set()
+
+
+class QueueCollector:
+    """
+    Reports how many tasks are waiting on each queue, by asking the Redis broker
+    """
+    def __init__(self, url, queues):
+        """
+        Initializes the collector
+
+        :param url: The URL of the broker
+        :type url: str
+        :param queues: The names of the queues to report on
+        :type queues: list of str
+        """
+        self._url = url
+        self._queues = queues
+
+    def describe(self):
+        # Lets the collector be registered without asking the broker anything
+        yield GaugeMetricFamily('neam_queue_depth', 'Tasks waiting on each queue', labels=['queue'])
+
+    def collect(self):
+        depth = GaugeMetricFamily('neam_queue_depth', 'Tasks waiting on each queue', labels=['queue'])
+        redis = status.connect(self._url)
+
+        for queue in self._queues:
+            # The Redis transport keeps a list per priority level
+            depth.add_metric([queue], sum(redis.llen(queue + priority) for priority in _QUEUE_PRIORITIES))
+
+        yield depth
+
+
+class StageTimer(processing.StageTimer):
+    """
+    Records how long each stage of a pipeline takes in the stage duration histogram
+    """
+    def record(self, stage, seconds):
+        STAGE_DURATION.labels(stage).observe(seconds)
+
+
+def observe_size(chunks):
+    """
+    Records the size of a document as it is read
+
+    :param chunks: The content of the document, a chunk at a time
+    :type chunks: iterable of bytes
+    :return: The same chunks
+    :rtype: generator of bytes
+    """
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    DOCUMENT_SIZE.observe(size)
+
+
+def record_worker_state():
+    """
+    Records how much of the JVM's heap is used, and the Wikidata lookups made since
+    this was last called, in this process
+    """
+    for result in _wikidata_seen:
+        WIKIDATA_LOOKUPS.labels(result).inc(wiki.STATS[result] - _wikidata_seen[result])
+        _wikidata_seen[result] = wiki.STATS[result]
+
+    # jpype is only imported by the CoreNLP classifier, and there is no JVM without it
+    jpype = sys.modules.get('jpype')
+    if jpype and jpype.isJVMStarted():
+        runtime = jpype.java.lang.Runtime.getRuntime()
+        JVM_HEAP.labels('used').set(runtime.totalMemory() - runtime.freeMemory())
+        JVM_HEAP.labels('committed').set(runtime.totalMemory())
+        JVM_HEAP.labels('max').set(runtime.maxMemory())
+
+
+def registry(collectors=()):
+    """
+    Gets the registry to read the metrics from
+
+    :param collectors: Any collectors to add to the registry. Outside of multiprocess
+                       mode this is the global registry, which each is only added to
+                       once, however many times this is called.
+    :type collectors: list
+    :return: The registry
+    :rtype: CollectorRegistry
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        scraped = CollectorRegistry()
+        multiprocess.MultiProcessCollector(scraped)
+    else:
+        scraped = REGISTRY
+        collectors = [collector for collector in collectors if collector not in _global_collectors]
+        _global_collectors.update(collectors)
+
+    for collector in collectors:
+        scraped.register(collector)
+    return scraped
+
+
+def serve(port, collectors=()):
+    """
+    Serves the metrics over HTTP from a thread of this process
+
+    :param port: The port to serve them on
+    :type port: int
+    :param collectors: Any collectors to add to the registry
+    :type collectors: list
+    """
+    start_http_server(port, registry=registry(collectors))
+
+
+def latest(scraped):
+    """
+    Gets the current value of the metrics
+
+    :param scraped: The registry to read the metrics from
+    :type scraped: CollectorRegistry
+    :return: The metrics in the Prometheus text format, and its content type
+    :rtype: tuple of (bytes, str)
+    """
+    return generate_latest(scraped), CONTENT_TYPE_LATEST
+
+
+__all__ = ['QueueCollector', 'StageTimer', 'observe_size', 'record_worker_state', 'registry', 'serve', 'latest']
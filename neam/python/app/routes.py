@@ -1,13 +1,36 @@
+import mimetypes
 import os
+import time
+from concurrent.futures import TimeoutError as AnnotationTimeout
 
-from flask import render_template, request, send_from_directory, jsonify, url_for, Markup
+from flask import render_template, request, jsonify, url_for, Markup, Response, stream_with_context, abort, g
 from markdown import markdown
+from werkzeug.utils import secure_filename
 
-from neam.python.app import app, celery, neam_annotate
+from neam.python.app import app, celery, neam_annotate, status, store, routing, batch, metrics, annotate_snippet, start_batch, queue_collector
+from neam.python.app.storage import read_chunks
+from neam.python.classification import Progress
 
 
 FILE_DIR = os.path.dirname(os.path.realpath(__file__))
 
+# The metrics served at /metrics
+registry = metrics.registry([queue_collector])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.monotonic()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """ Records how long a request took, and how it was answered """
+    endpoint = request.endpoint or 'unknown'
+    metrics.REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+    metrics.REQUEST_DURATION.labels(endpoint).observe(time.monotonic() - g.request_start)
+    return response
+
 
 @app.route('/')
 @app.route('/index')
@@ -32,24 +55,115 @@ def annotate():
     TODO: Add validation
 
     :return: An HTTP response, where the Location key corresponds to the URI to check on
-             the annotation process
+             the annotation process. The body gives the same URI, and the URI to stream
+             the status of the process from.
     """
     # Grab the data from the request
     email = request.form['email']
     f = request.files['file']
+    form = form_data()
+    form['filename'] = f.filename
+
+    # Store the file so the worker can find it
+    key = store.put(metrics.observe_size(read_chunks(f.stream)))
+    size = f.stream.tell()
+
+    # Fire off a worker to annotate the file, on the queue for its size
+    user = email or request.remote_addr
+    t = neam_annotate.apply_async((key, form, user), queue=routing.queue_for(size, app.config))
+
+    return accepted(t.id)
+
+
+@app.route('/annotate/batch', methods=['POST'])
+def annotate_batch():
+    """
+    Annotates a batch of documents, sent as any mix of plain files and zip or tar
+    archives of them under the "file" field. The rest of the form applies to every
+    document.
+
+    :return: An HTTP response, where the Location key corresponds to the URI to check on
+             the batch. Once the batch is finished, its result is the path to download a
+             zip archive of the annotated documents from.
+    """
+    files = request.files.getlist('file')
+    form = form_data()
+    max_documents = app.config['BATCH_MAX_DOCUMENTS']
+
+    # Store each document so the workers can find it
+    documents = []
+    try:
+        for name, chunks in batch.iter_documents(files, app.config['BATCH_MAX_BYTES'] or None):
+            if len(documents) == max_documents:
+                return jsonify({'error': 'A batch can hold at most {} documents'.format(max_documents)}), 413
+            documents.append((store.put(metrics.observe_size(chunks)), dict(form, filename=name)))
+    except batch.BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+
+    if not documents:
+        return jsonify({'error': 'No documents were sent'}), 400
+
+    name = os.path.splitext(files[0].filename)[0] if len(files) == 1 else 'batch'
+    return accepted(start_batch(documents, name + '.zip').id)
+
+
+def form_data():
+    """
+    Gets the data from the HTML form that should be passed on to the TEI template
+
+    :return: The value of each field
+    :rtype: dict
+    """
     form = {**request.form}
     for k in form:
         if isinstance(form[k], list):
             form[k] = '\n'.join(form[k])
-    form['filename'] = f.filename
+    return form
+
+
+def accepted(task_id):
+    """
+    Responds to a request that started a worker
+
+    :param task_id: The ID of the worker
+    :type task_id: str
+    :return: An HTTP response, where the Location key corresponds to the URI to check on
+             the worker. The body gives the same URI, and the URI to stream the status of
+             the worker from.
+    """
+    status_url = url_for('taskstatus', task_id=task_id)
+    return jsonify({'status': status_url, 'stream': url_for('streamstatus', task_id=task_id)}), 202, {'Location': status_url}
+
+
+@app.route('/annotate/text', methods=['POST'])
+def annotate_text():
+    """
+    Annotates a short piece of text while the client waits
 
-    # Save the file so the worker can find it
-    f.save(os.path.join(app.config['UPLOAD_FOLDER'], f.filename))
+    The request should be a JSON object whose "text" holds at most SNIPPET_MAX_CHARS
+    characters. Annotation gives up after SNIPPET_TIMEOUT seconds.
 
-    # Fire off a worker to annotate the file
-    t = neam_annotate.delay(f.filename, form)
+    :return: An HTTP response whose JSON body holds the annotated text under "tei", or
+             an "error" if the text couldn't be annotated
+    """
+    max_chars = app.config['SNIPPET_MAX_CHARS']
+    # Allow for escapes in the JSON before reading it
+    if request.content_length and request.content_length > 6 * max_chars + 1024:
+        return jsonify({'error': 'Text is longer than {} characters'.format(max_chars)}), 413
+
+    data = request.get_json(silent=True)
+    text = data.get('text') if isinstance(data, dict) else None
+    if not isinstance(text, str):
+        return jsonify({'error': 'Expected a JSON object with a "text" string'}), 400
+    if len(text) > max_chars:
+        return jsonify({'error': 'Text is longer than {} characters'.format(max_chars)}), 413
 
-    return jsonify({}), 202, {'Location': url_for('taskstatus', task_id=t.id)}
+    try:
+        tei = annotate_snippet(text, app.config['SNIPPET_TIMEOUT'])
+    except AnnotationTimeout:
+        return jsonify({'error': 'Annotation timed out'}), 504
+
+    return jsonify({'tei': tei})
 
 
 @app.route('/status/<task_id>')
@@ -61,6 +175,42 @@ def taskstatus(task_id):
     :type task_id: str
     :return: The status of the worker
     """
+    return jsonify(task_status(task_id))
+
+
+@app.route('/status/<task_id>/stream')
+def streamstatus(task_id):
+    """
+    Streams the status of a worker as Server-Sent Events, sending a new event
+    whenever it changes
+
+    :param task_id: The ID of the worker
+    :type task_id: str
+    :return: An event stream of the statuses of the worker
+    """
+    events = status.stream(
+        app.config['STATUS_REDIS_URL'],
+        task_id,
+        lambda: task_status(task_id),
+        app.config['STATUS_STREAM_TIMEOUT']
+    )
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def task_status(task_id):
+    """
+    Looks up the status of a worker
+
+    :param task_id: The ID of the worker
+    :type task_id: str
+    :return: The state of the worker, a description of its status, and its progress
+             or result if it has either
+    :rtype: dict
+    """
     # Find the task
     # TODO: handle invalid queries
     task = neam_annotate.AsyncResult(task_id)
@@ -69,25 +219,45 @@ def taskstatus(task_id):
     response = { 'state': task.state }
     if task.state == 'PENDING':
         response['status'] = 'Pending'
+    elif task.state == 'RETRY':
+        response['status'] = 'Waiting for your other documents to finish'
     elif task.state != 'FAILURE':
         response['status'] = task.info.get('status', '')
         if 'result' in task.info:
             response['result'] = task.info['result']
+        if 'stage' in task.info:
+            response['progress'] = {key: task.info[key] for key in Progress._fields}
     else:
         response['status'] = str(task.info)
 
-    return jsonify(response)
+    return response
 
 
-@app.route('/download/<filename>')
-def download(filename):
-    """
-    Downloads a file from the server
+@app.route('/metrics')
+def metrics_page():
+    """ Serves the metrics of the web application for Prometheus to scrape """
+    data, content_type = metrics.latest(registry)
+    return Response(data, content_type=content_type)
 
-    TODO: validate the input
 
-    :param filename: The name of the file to download
+@app.route('/download/<key>/<filename>')
+def download(key, filename):
+    """
+    Downloads a file from the blob store
+
+    :param key: The key of the file in the blob store
+    :type key: str
+    :param filename: The name to download the file as
+    :type filename: str
     :return: The requested file
     """
-    return send_from_directory(os.path.join(app.config['UPLOAD_FOLDER']), filename, as_attachment=True)
+    try:
+        blob = store.open(key)
+    except KeyError:
+        abort(404)
+
+    response = Response(read_chunks(blob), mimetype=mimetypes.guess_type(filename)[0] or 'application/xml')
+    response.headers['Content-Disposition'] = 'attachment; filename="{}"'.format(secure_filename(filename))
+    response.call_on_close(blob.close)
+    return response
 
@@ -0,0 +1,94 @@
+"""
+routing.py
+
+Decides which queue an annotation goes on, and keeps any one user from taking up every
+worker.
+
+Small documents go on an interactive queue and large ones on a bulk queue, so that each
+can be served by its own pool of workers and a short letter never waits behind a long
+diary. Each user may only have a limited number of documents being annotated at once;
+a task over the limit is put back on its queue to wait for one of the others to finish.
+"""
+import time
+
+from neam.python.app import status
+
+_SLOTS = 'neam:slots:{}'
+
+
+def queue_for(size, config):
+    """
+    Chooses the queue to annotate a document on
+
+    :param size: The size of the document, in bytes
+    :type size: int
+    :param config: The application's configuration
+    :type config: dict
+    :return: The name of the queue
+    :rtype: str
+    """
+    if size <= config['SMALL_DOCUMENT_BYTES']:
+        return config['INTERACTIVE_QUEUE']
+    return config['BULK_QUEUE']
+
+
+def acquire_slot(url, user, slot, limit, expire=86400):
+    """
+    Takes one of a user's slots for annotating a document, if they have one free
+
+    The slots a user holds are kept in a sorted set, scored by when each was taken.
+    Slots that aren't released, for instance because a worker died, free themselves
+    once *expire* seconds have passed since they were taken; a request that is turned
+    away doesn't extend them.
+
+    :param url: The URL of the Redis server
+    :type url: str
+    :param user: Identifies the user
+    :type user: str
+    :param slot: Identifies the document the slot is for, such as the ID of the task
+                 annotating it. Taking a slot the document already holds succeeds.
+    :type slot: str
+    :param limit: The number of documents a user may have annotated at once, or 0 for
+                  no limit
+    :type limit: int
+    :param expire: How long to keep slots that haven't been released for, in seconds
+    :type expire: int
+    :return: Whether a slot was taken
+    :rtype: bool
+    """
+    if not limit:
+        return True
+
+    key = _SLOTS.format(user)
+    now = time.time()
+    connection = status.connect(url)
+    pipeline = connection.pipeline()
+    pipeline.zremrangebyscore(key, '-inf', now - expire)
+    pipeline.zadd(key, {slot: now})
+    pipeline.zrank(key, slot)
+    rank = pipeline.execute()[2]
+
+    # the slots taken first win, so that two requests racing for the last slot
+    # can't both be turned away
+    if rank >= limit:
+        connection.zrem(key, slot)
+        return False
+    connection.expire(key, expire)
+    return True
+
+
+def release_slot(url, user, slot):
+    """
+    Frees one of a user's slots
+
+    :param url: The URL of the Redis server
+    :type url: str
+    :param user: Identifies the user
+    :type user: str
+    :param slot: Identifies the document the slot was taken for
+    :type slot: str
+    """
+    status.connect(url).zrem(_SLOTS.format(user), slot)
+
+
+__all__ = ['queue_for', 'acquire_slot', 'release_slot']
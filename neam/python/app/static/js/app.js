@@ -1 +1 @@
-!function(t){var e={};function o(n){if(e[n])return e[n].exports;var r=e[n]={i:n,l:!1,exports:{}};return t[n].call(r.exports,r,r.exports,o),r.l=!0,r.exports}o.m=t,o.c=e,o.d=function(t,e,n){o.o(t,e)||Object.defineProperty(t,e,{configurable:!1,enumerable:!0,get:n})},o.n=function(t){var e=t&&t.__esModule?function(){return t.default}:function(){return t};return o.d(e,"a",e),e},o.o=function(t,e){return Object.prototype.hasOwnProperty.call(t,e)},o.p="/",o(o.s=0)}([function(t,e,o){o(1),t.exports=o(2)},function(t,e){$(function(){var t={progress_bar:$("#progress-bar"),button:$("#submit-button"),text:$("#info-text")};t.progress_bar.hide(),t.text.hide(),$("#annotation-form").ajaxForm({success:function(e,o,n){status_url=n.getResponseHeader("Location"),function t(e,o){$.getJSON(e,function(n){var r=n.state;"PENDING"==r||"PROGRESS"==r?setTimeout(function(){t(e,o)},2e3):(window.location="/download/"+n.result,o.progress_bar.hide(),o.text.hide(),o.button.removeClass("disabled"))})}(status_url,t)},beforeSubmit:function(){t.progress_bar.show(),t.text.show(),t.button.addClass("disabled")}})})},function(t,e){}]);
\ No newline at end of file
+!function(t){var e={};function o(n){if(e[n])return e[n].exports;var r=e[n]={i:n,l:!1,exports:{}};return t[n].call(r.exports,r,r.exports,o),r.l=!0,r.exports}o.m=t,o.c=e,o.d=function(t,e,n){o.o(t,e)||Object.defineProperty(t,e,{configurable:!1,enumerable:!0,get:n})},o.n=function(t){var e=t&&t.__esModule?function(){return t.default}:function(){return t};return o.d(e,"a",e),e},o.o=function(t,e){return Object.prototype.hasOwnProperty.call(t,e)},o.p="/",o(o.s=0)}([function(t,e,o){o(1),t.exports=o(2)},function(t,e){function n(t,e,n){var r=new EventSource(t);r.onmessage=function(t){a(JSON.parse(t.data),n)||r.close()},r.onerror=function(){r.readyState==EventSource.CLOSED&&o(e,n)}}function o(t,e){$.getJSON(t,function(n){a(n,e)&&setTimeout(function(){o(t,e)},2e3)})}function a(t,e){var n=t.state;return"PENDING"==n||"PROGRESS"==n||"RETRY"==n?(t.progress?s(t.status,t.progress,e):"RETRY"==n&&e.text.text(t.status),!0):(window.location="/download/"+t.result,e.progress_bar.hide(),e.text.hide(),e.button.removeClass("disabled"),!1)}function s(t,e,n){var o=e.total?e.current/e.total:0,r=100*(e.stage_number-1+o)/e.stages;n.bar.removeClass("indeterminate").addClass("determinate").css("width",r+"%"),n.text.text(t)}$(function(){var t={progress_bar:$("#progress-bar"),bar:$("#progress-bar > div"),button:$("#submit-button"),text:$("#info-text")};t.progress_bar.hide(),t.text.hide(),$("#annotation-form").ajaxForm({success:function(e,r,a){var s=a.getResponseHeader("Location");window.EventSource&&e.stream?n(e.stream,s,t):o(s,t)},beforeSubmit:function(){t.progress_bar.show(),t.text.show(),t.button.addClass("disabled")}})})},function(t,e){}]);
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+status.py
+
+Publishes the status of annotation tasks as it changes, and streams it to clients as
+Server-Sent Events so that they don't have to poll for it.
+
+Workers publish every status change to a Redis pub/sub channel for the task. The
+streaming endpoint subscribes to that channel, sends the task's current status, and then
+forwards each change as it arrives until the task finishes.
+"""
+import json
+import time
+
+import redis
+
+# The states after which a task's status won't change again
+FINAL_STATES = {'SUCCESS', 'FAILURE', 'REVOKED'}
+
+_CHANNEL = 'neam:status:{}'
+_CHUNKS = 'neam:chunks:{}'
+_connections = {}
+
+
+def connect(url):
+    """
+    Gets a Redis client for a URL, reusing one if it has already been made
+
+    :param url: The URL of the Redis server
+    :type url: str
+    :return: The client
+    :rtype: redis.Redis
+    """
+    if url not in _connections:
+        _connections[url] = redis.Redis.from_url(url)
+    return _connections[url]
+
+
+def publish(url, task_id, status):
+    """
+    Tells anyone listening that a task's status has changed
+
+    :param url: The URL of the Redis server
+    :type url: str
+    :param task_id: The ID of the task
+    :type task_id: str
+    :param status: The new status, in the same form the status endpoint returns it
+    :type status: dict
+    """
+    connect(url).publish(_CHANNEL.format(task_id), json.dumps(status))
+
+
+def record_chunk(url, task_id, chunk, stages_done, expire=86400):
+    """
+    Records how far through the annotation stages a chunk of a task has got
+
+    :param url: The URL of the Redis server
+    :type url: str
+    :param task_id: The ID of the task the chunk belongs to
+    :type task_id: str
+    :param chunk: The index of the chunk
+    :type chunk: int
+    :param stages_done: The number of stages the chunk has finished
+    :type stages_done: int
+    :param expire: How long to keep the record for, in seconds
+    :type expire: int
+    :return: The number of stages each of the task's chunks has finished, for the
+             chunks that have recorded any
+    :rtype: list of int
+    """
+    key = _CHUNKS.format(task_id)
+    pipeline = connect(url).pipeline()
+    pipeline.hset(key, chunk, stages_done)
+    pipeline.expire(key, expire)
+    pipeline.hvals(key)
+    return [int(value) for value in pipeline.execute()[-1]]
+
+
+def stream(url, task_id, current_status, timeout=300, heartbeat=15):
+    """
+    Generates Server-Sent Events for each change to a task's status
+
+    The task's current status is always sent first. The stream ends once the task
+    reaches a final state, or after *timeout* seconds, in which case the client is
+    expected to reconnect.
+
+    :param url: The URL of the Redis server
+    :type url: str
+    :param task_id: The ID of the task
+    :type task_id: str
+    :param current_status: Looks up the current status of the task
+    :type current_status: callable
+    :param timeout: The longest the stream should stay open for, in seconds
+    :type timeout: float
+    :param heartbeat: How often to send a comment to keep the connection alive, in
+                      seconds
+    :type heartbeat: float
+    :return: The events, formatted for an event stream
+    :rtype: generator of str
+    """
+    pubsub = connect(url).pubsub(ignore_subscribe_messages=True)
+    # Subscribe before looking up the status, so no changes are missed in between
+    pubsub.subscribe(_CHANNEL.format(task_id))
+
+    try:
+        status = current_status()
+        yield format_event(status)
+
+        deadline = time.monotonic() + timeout
+        while status['state'] not in FINAL_STATES and time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=heartbeat)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+
+            status = json.loads(message['data'])
+            yield format_event(status)
+    finally:
+        pubsub.close()
+
+
+def format_event(status):
+    """
+    Formats a status as a Server-Sent Event
+
+    :param status: The status of a task
+    :type status: dict
+    :return: The event
+    :rtype: str
+    """
+    return 'data: {}\n\n'.format(json.dumps(status))
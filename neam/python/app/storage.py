@@ -0,0 +1,352 @@
+"""
+storage.py
+
+Defines the blob stores that uploads and annotated documents are kept in, so that the web
+and worker processes don't have to share a filesystem.
+
+Blobs are written and read a chunk at a time, and are keyed by the SHA-256 hash of their
+content, so two uploads with the same name never collide and identical uploads are only
+stored once. Use *make_store* to create the store an application is configured for.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+
+CHUNK_SIZE = 1 << 16
+
+_KEY_PATTERN = re.compile('[0-9a-f]{64}$')
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    """
+    Reads a file-like object a chunk at a time
+
+    :param f: The file to read
+    :param chunk_size: The number of bytes to read at a time
+    :type chunk_size: int
+    :return: The chunks of the file
+    :rtype: generator of bytes
+    """
+    return iter(lambda: f.read(chunk_size), f.read(0))
+
+
+class BlobStore(ABC):
+    """
+    Defines the interface for blob stores.
+
+    A BlobStore should implement *open*, which opens a stored blob for reading, *_store*,
+    which stores a file under a key, and *blobs* and *delete* so that old blobs can be
+    cleaned up. It may override *put* if it can work out the key as it stores a blob,
+    rather than beforehand, and *delete_unfinished* if a *put* that fails partway can
+    leave anything behind.
+    """
+    def put(self, chunks):
+        """
+        Stores a blob
+
+        :param chunks: The content of the blob, a chunk at a time
+        :type chunks: iterable of bytes
+        :return: The key the blob is stored under
+        :rtype: str
+        """
+        with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 16) as spool:
+            key = self._hash(chunks, spool)
+            spool.seek(0)
+            self._store(key, spool)
+        return key
+
+    def get(self, key):
+        """
+        Reads a blob a chunk at a time
+
+        :param key: The key of the blob
+        :type key: str
+        :return: The content of the blob
+        :rtype: generator of bytes
+        """
+        with closing(self.open(key)) as f:
+            yield from read_chunks(f)
+
+    @abstractmethod
+    def open(self, key):
+        """
+        Opens a blob for reading
+
+        :param key: The key of the blob
+        :type key: str
+        :return: A binary file-like object holding the content of the blob
+        :raises KeyError: If there is no blob with the key
+        """
+        raise NotImplemented
+
+    @abstractmethod
+    def blobs(self):
+        """
+        Lists the blobs in the store
+
+        :return: The key of each blob, its size in bytes, and the time it was last used
+                 as a Unix timestamp
+        :rtype: iterable of (str, int, float)
+        """
+        raise NotImplemented
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        Removes a blob from the store, if it's there
+
+        :param key: The key of the blob
+        :type key: str
+        """
+        raise NotImplemented
+
+    def delete_unfinished(self, before):
+        """
+        Removes whatever was left behind by blobs that were never finished being put,
+        such as when a worker was killed partway through
+
+        :param before: Only what was last written to before this Unix timestamp is
+                       removed, so that blobs still being put are left alone
+        :type before: float
+        :return: The number of unfinished blobs removed, and the number of bytes they
+                 took up
+        :rtype: tuple of (int, int)
+        """
+        return 0, 0
+
+    @abstractmethod
+    def _store(self, key, f):
+        """
+        Stores the content of a file under a key
+
+        :param key: The key to store the file under
+        :type key: str
+        :param f: A binary file-like object, positioned at the start of the content
+        """
+        raise NotImplemented
+
+    @staticmethod
+    def _hash(chunks, f):
+        """
+        Copies chunks to a file, hashing them as they go
+
+        :param chunks: The chunks to copy
+        :type chunks: iterable of bytes
+        :param f: The binary file-like object to copy them to
+        :return: The hex digest of the content
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            digest.update(chunk)
+            f.write(chunk)
+        return digest.hexdigest()
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Stores blobs as files in a directory
+    """
+    def __init__(self, root):
+        """
+        Initializes the store
+
+        :param root: The directory to keep the blobs in. It is created if it doesn't
+                     exist.
+        :type root: str
+        """
+        self._root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, chunks):
+        # Write straight into the directory, then move the file into place once its
+        # key is known, so that it is only ever written once
+        with tempfile.NamedTemporaryFile(dir=self._root, delete=False) as f:
+            try:
+                key = self._hash(chunks, f)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, self._path(key))
+        return key
+
+    def open(self, key):
+        try:
+            f = open(self._path(key), 'rb')
+        except FileNotFoundError:
+            raise KeyError(key)
+        # Mark the blob as used, since file systems don't reliably keep access times
+        os.utime(f.fileno())
+        return f
+
+    def blobs(self):
+        with os.scandir(self._root) as entries:
+            for entry in entries:
+                if _KEY_PATTERN.match(entry.name):
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, stat.st_mtime
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_unfinished(self, before):
+        # put writes to a temporary file, which is left behind if it is interrupted
+        removed = freed = 0
+        with os.scandir(self._root) as entries:
+            for entry in entries:
+                if entry.name.startswith(tempfile.gettempprefix()) and not _KEY_PATTERN.match(entry.name):
+                    stat = entry.stat()
+                    if stat.st_mtime < before:
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            continue
+                        removed += 1
+                        freed += stat.st_size
+        return removed, freed
+
+    def _store(self, key, f):
+        with open(self._path(key), 'wb') as out:
+            shutil.copyfileobj(f, out, CHUNK_SIZE)
+
+    def _path(self, key):
+        if not key.isalnum():
+            raise KeyError(key)
+        return os.path.join(self._root, key)
+
+
+class S3BlobStore(BlobStore):
+    """
+    Stores blobs as objects in an S3-compatible bucket
+    """
+    def __init__(self, bucket, prefix='', endpoint_url=None):
+        """
+        Initializes the store
+
+        :param bucket: The name of the bucket to keep the blobs in
+        :type bucket: str
+        :param prefix: Prepended to the key of each blob to get its object name
+        :type prefix: str
+        :param endpoint_url: The URL of the S3-compatible service. Defaults to AWS.
+        :type endpoint_url: str
+        """
+        import boto3
+
+        self._client = boto3.client('s3', endpoint_url=endpoint_url)
+        self._bucket = bucket
+        self._prefix = prefix
+
+    def open(self, key):
+        try:
+            response = self._client.get_object(Bucket=self._bucket, Key=self._prefix + key)
+        except self._client.exceptions.NoSuchKey:
+            raise KeyError(key)
+        return response['Body']
+
+    def blobs(self):
+        # S3 doesn't track reads, so an object was last used when it was last written
+        pages = self._client.get_paginator('list_objects_v2').paginate(Bucket=self._bucket, Prefix=self._prefix)
+        for page in pages:
+            for item in page.get('Contents', []):
+                key = item['Key'][len(self._prefix):]
+                if _KEY_PATTERN.match(key):
+                    yield key, item['Size'], item['LastModified'].timestamp()
+
+    def delete(self, key):
+        self._client.delete_object(Bucket=self._bucket, Key=self._prefix + key)
+
+    def _store(self, key, f):
+        self._client.upload_fileobj(f, self._bucket, self._prefix + key)
+
+
+def clean_up(store, max_age=None, max_bytes=None, min_age=0):
+    """
+    Removes old blobs from a store
+
+    Blobs that haven't been used for *max_age* seconds are removed first, along with any
+    blobs that were never finished being put. If the blobs left over still take up more
+    than *max_bytes*, the least recently used are removed until they don't, except for
+    those used within the last *min_age* seconds, which a queued or running task may
+    still need.
+
+    :param store: The blob store to clean up
+    :type store: BlobStore
+    :param max_age: The longest a blob may go unused for, in seconds, or None for no
+                    limit
+    :type max_age: float
+    :param max_bytes: The most space the blobs may take up, in bytes, or None for no
+                      limit
+    :type max_bytes: int
+    :param min_age: How long a blob is kept for after it was last used, whatever the
+                    space limit, in seconds
+    :type min_age: float
+    :return: The number of blobs removed, and the number of bytes they took up
+    :rtype: tuple of (int, int)
+    """
+    now = time.time()
+    oldest = now - max_age if max_age else None
+    kept = []
+    removed = freed = 0
+
+    if oldest is not None:
+        removed, freed = store.delete_unfinished(oldest)
+
+    for key, size, last_used in store.blobs():
+        if oldest is not None and last_used < oldest:
+            store.delete(key)
+            removed += 1
+            freed += size
+        else:
+            kept.append((last_used, size, key))
+
+    if max_bytes is not None:
+        total = sum(size for _, size, _ in kept)
+        kept.sort()
+        for last_used, size, key in kept:
+            if total <= max_bytes or last_used >= now - min_age:
+                break
+            store.delete(key)
+            total -= size
+            removed += 1
+            freed += size
+
+    return removed, freed
+
+
+def make_store(config):
+    """
+    Creates the blob store an application is configured to use
+
+    BLOB_STORE chooses the kind of store, either 'local' or 's3'. A local store keeps
+    its blobs in BLOB_STORE_PATH. An S3 store keeps them in BLOB_STORE_BUCKET, under
+    BLOB_STORE_PREFIX, at BLOB_STORE_ENDPOINT_URL if it is set.
+
+    :param config: The application's configuration
+    :type config: dict
+    :return: The blob store
+    :rtype: BlobStore
+    """
+    kind = config.get('BLOB_STORE', 'local')
+
+    if kind == 'local':
+        return LocalBlobStore(config['BLOB_STORE_PATH'])
+    if kind == 's3':
+        return S3BlobStore(
+            config['BLOB_STORE_BUCKET'],
+            config.get('BLOB_STORE_PREFIX', ''),
+            config.get('BLOB_STORE_ENDPOINT_URL')
+        )
+    raise ValueError('Unknown blob store: {}'.format(kind))
+
+
+__all__ = ['BlobStore', 'LocalBlobStore', 'S3BlobStore', 'clean_up', 'make_store', 'read_chunks']
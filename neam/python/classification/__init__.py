@@ -1,14 +1,23 @@
 from neam.python.classification.processing import *
-from neam.python.classification.classifier import Classifier
+from neam.python.classification.classifier import Classifier, NERClassifier
+from neam.python.classification.perceptron_classifier import PerceptronClassifier
+from neam.python.classification.server_classifier import ServerClassifier
+from neam.python.classification.gazetteer import Gazetteer, GazetteerTagger
 from neam.python.classification.title_annotator import TitleAnnotator
 from neam.python.classification.wiki_retagger import WikiRetagger
 from neam.python.classification.ref_annotator import RefAnnotator
+from neam.python.classification.entity_registry import EntityRegistry
 from neam.python.classification.beautifier import Beautifier
 from neam.python.classification.journal_shaper import JournalShaper
 from neam.python.classification.date_processor import DateProcessor
 
 __all__ = [
     'Classifier',
+    'NERClassifier',
+    'PerceptronClassifier',
+    'ServerClassifier',
+    'Gazetteer',
+    'GazetteerTagger',
     'ASCIIifier',
     'PageReplacer',
     'SicReplacer',
@@ -16,9 +25,12 @@ __all__ = [
     'JournalShaper',
     'Beautifier',
     'Pipeline',
+    'Progress',
+    'StageTimer',
     'PossessionFixer',
     'TitleAnnotator',
     'RefAnnotator',
+    'EntityRegistry',
     'TagExpander',
     'WikiRetagger',
     'Beautifier',
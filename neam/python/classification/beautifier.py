@@ -1,71 +1,316 @@
-from bs4 import BeautifulSoup
+"""
+beautifier.py
+
+Defines a processor for laying XML out with one element per line.
+
+The XML is read as a stream of parser events and written out line by line as it is
+read, so neither the document tree nor the formatted output are ever held in memory in
+full. Elements are dropped from the tree as soon as they have been written. Comments
+and namespace declarations are written where they appear in the source, and both
+parsers give the same output.
+"""
+from io import StringIO
+from xml.etree.ElementTree import XMLParser, XMLPullParser, TreeBuilder
+from lxml import etree
 from neam.python.classification.processing import NEAMProcessor
 
 class Beautifier(NEAMProcessor):
     """
     Adds indentation to XML text
     """
-    def __init__(self, tab = '  ', parser = 'xml', ignore = None):
+    _PARSERS = {
+        # the standard library only keeps comments in the tree if its tree builder is told to
+        'xml': lambda events: XMLPullParser(events=events, _parser=XMLParser(target=TreeBuilder(insert_comments=True))),
+        'lxml': lambda events: etree.XMLPullParser(events=events, remove_pis=True, huge_tree=True)
+    }
+    _NAMESPACES = {
+        'http://www.w3.org/XML/1998/namespace': 'xml'
+    }
+    _ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+    def __init__(self, tab = '  ', parser = 'xml', ignore = None, chunk_size = 65536):
         """
         Initializes the processor
 
         :param tab: The string to use as a tab. Defaults to two spaces.
         :type tab: str
-        :param parser: The parser BeautifulSoup should use to load the soup
+        :param parser: The pull parser to read the XML with, either 'xml' for the
+                       standard library parser or 'lxml' for lxml
         :type parser: str
         :ignore: The tags that should not be formatted. Defaults to P tags.
         :type ignore: list of str
+        :param chunk_size: The number of characters to feed to the parser at a time
+        :type chunk_size: int
         """
+        if parser not in self._PARSERS:
+            raise ValueError('Unknown parser: {}'.format(parser))
+
         self._tab = tab
         self._parser = parser
         self._ignore_tags = ignore or ['p', 'pb', 'title']
+        self._chunk_size = chunk_size
+        super().__init__(str, str)
 
     def run(self, text):
-        soup = BeautifulSoup(text, self._parser).contents[0]
-        return '\n'.join(self._beautify(soup, 0, []))
+        output = StringIO()
+        self.write(text, output)
+        return output.getvalue()
 
-    def _beautify(self, soup, depth, builder):
+    def write(self, source, sink):
         """
-        Adds a BeautifulSoup tag to the builder recursively
+        Writes the indented XML to a file-like object as it is parsed
+
+        :param source: The XML to format, either as a string or a file-like object
+        :type source: str or file
+        :param sink: The object to write the formatted XML to
+        :type sink: file
+        """
+        lines = self.iterlines(source)
+
+        for line in lines:
+            sink.write(line)
+            break
 
-        If the tag is in the IGNORE_TAGS list, it will be printed out without formatting.
+        for line in lines:
+            sink.write('\n')
+            sink.write(line)
 
-        :param soup: A BeautifulSoup tag
-        :param depth: The current indentation depth
+    def iterlines(self, source):
         """
-        indent = self._tab * depth
+        Generates the lines of the indented XML
+
+        If a tag is in the ignore list, it will be printed out on a single line
+        without formatting.
+
+        :param source: The XML to format, either as a string or a file-like object
+        :type source: str or file
+        :return: The formatted lines, without trailing newlines
+        :rtype: generator of str
+        """
+        stack = []          # The formatted elements that are currently open
+        scopes = [self._NAMESPACES]  # The prefix of each namespace in scope in each of them
+        declarations = {}   # The namespaces declared by elements inside of an ignored element
+        pending = None      # The element and attribute holding text not yet written
+        ignored_depth = 0   # How far inside of an ignored element the parser is
+
+        for event, element, declared in self._events(source):
+            if ignored_depth:
+                if event == 'start':
+                    ignored_depth += 1
+                    if declared:
+                        declarations[element] = declared
+                elif event == 'end':
+                    ignored_depth -= 1
+                # Comments inside of an ignored element are written along with it
+                if ignored_depth:
+                    continue
+
+            # Text is only complete once the next tag has been seen
+            if pending:
+                text = getattr(*pending)
+                if text:
+                    yield self._tab * len(stack) + text
+                if pending[1] == 'tail' and stack:
+                    # The element is finished with, so release it
+                    stack[-1].remove(pending[0])
+                pending = None
+
+            if event == 'comment':
+                yield self._tab * len(stack) + self._comment(element)
+                pending = (element, 'tail')
+            elif event == 'end' and element is not (stack[-1] if stack else None):
+                # The end of an ignored element
+                yield self._tab * len(stack) + self._serialize(element, scopes[-1], declarations)
+                pending = (element, 'tail')
+            elif event == 'end':
+                stack.pop()
+                yield self._tab * len(stack) + self._close_tag(element, scopes.pop())
+                pending = (element, 'tail')
+            elif self._name(element, self._scope(scopes[-1], declared)) in self._ignore_tags:
+                ignored_depth = 1
+                if declared:
+                    declarations[element] = declared
+            else:
+                scope = self._scope(scopes[-1], declared)
+                yield self._tab * len(stack) + self._open_tag(element, scope, declared)
+                stack.append(element)
+                scopes.append(scope)
+                pending = (element, 'text')
 
-        if isinstance(soup, str) or soup.name in self._ignore_tags:
-            builder.append(indent + str(soup))
+    def _events(self, source):
+        """
+        Feeds the source to the parser a chunk at a time
+
+        :param source: The XML to parse, either as a string or a file-like object
+        :type source: str or file
+        :return: The start, end and comment events from the parser, with the prefix and
+                 URI of each namespace declared by the elements that start
+        :rtype: generator of (str, Element, list of (str, str))
+        """
+        parser = self._PARSERS[self._parser](events=('start', 'end', 'start-ns', 'comment'))
+
+        if isinstance(source, str):
+            chunks = (source[i:i + self._chunk_size] for i in range(0, len(source), self._chunk_size))
         else:
-            builder.append(indent + self._open_tag(soup))
+            chunks = iter(lambda: source.read(self._chunk_size), source.read(0))
+
+        def read_events():
+            for chunk in chunks:
+                parser.feed(chunk)
+                yield from parser.read_events()
+            parser.close()
+            yield from parser.read_events()
+
+        declared = []
+        for event, item in read_events():
+            if event == 'start-ns':
+                declared.append(item)
+            elif event == 'start':
+                yield event, item, declared
+                declared = []
+            else:
+                yield event, item, None
+
+    @staticmethod
+    def _scope(scope, declared):
+        """
+        :param scope: The prefix of each namespace in scope, by its URI
+        :type scope: dict of str: str
+        :param declared: The prefix and URI of each namespace an element declares
+        :type declared: list of (str, str)
+        :return: The prefix of each namespace in scope within the element
+        :rtype: dict of str: str
+        """
+        if not declared:
+            return scope
+        scope = dict(scope)
+        scope.update((uri, prefix) for prefix, uri in declared)
+        return scope
+
+    def _name(self, element, scope):
+        """
+        Gets the qualified name for an element or attribute
+
+        :param element: An element, or the name of an element or attribute
+        :param scope: The prefix of each namespace in scope, by its URI
+        :type scope: dict of str: str
+        :return: The name, with any namespace URI replaced by its prefix
+        :rtype: str
+        """
+        name = element if isinstance(element, str) else element.tag
 
-            for child in soup.children:
-                self._beautify(child, depth + 1, builder)
+        if name.startswith('{'):
+            namespace, name = name[1:].split('}', 1)
+            if scope.get(namespace):
+                name = scope[namespace] + ':' + name
 
-            builder.append(indent + self._close_tag(soup))
+        return name
 
-        return builder
+    def _attributes(self, element, scope, declared, quote):
+        """
+        :return: The namespace declarations and attributes of an element, each preceded
+                 by a space
+        :rtype: str
+        """
+        attrs = [('xmlns:' + prefix if prefix else 'xmlns', uri) for prefix, uri in declared or []]
+        attrs.extend((self._name(id, scope), value) for id, value in element.attrib.items())
+        return ''.join(' {}={}'.format(id, quote(value)) for id, value in attrs)
 
-    def _open_tag(self, tag):
+    def _open_tag(self, tag, scope, declared=None):
         """
         Generates an opening tag string for a given tag
 
-        :param tag: A BeautifulSoup tag
+        :param tag: An XML element
+        :param scope: The prefix of each namespace in scope within the tag, by its URI
+        :param declared: The prefix and URI of each namespace the tag declares
         :return: The string that would open the tag, including any attributes
         :rtype: str
         """
-        attrs = ' '.join(['{}="{}"'.format(id, value) for id, value in tag.attrs.items()])
-        if attrs:
-            attrs = ' ' + attrs
-        return '<{}{}>'.format(tag.name, attrs)
+        return '<{}{}>'.format(self._name(tag, scope), self._attributes(tag, scope, declared, '"{}"'.format))
 
-    def _close_tag(self, tag):
+    def _close_tag(self, tag, scope):
         """
         Generates a closing tag string for a given tag
-        :param tag: A BeautifulSoup tag
+        :param tag: An XML element
+        :param scope: The prefix of each namespace in scope within the tag, by its URI
         :return: The string that would close the tag
         :rtype: str
         """
-        return '</{}>'.format(tag.name)
+        return '</{}>'.format(self._name(tag, scope))
+
+    @staticmethod
+    def _comment(comment):
+        """
+        :param comment: A comment, as the parser represents it
+        :return: The XML for the comment, excluding its tail
+        :rtype: str
+        """
+        return '<!--{}-->'.format(comment.text or '')
+
+    def _serialize(self, tag, scope, declarations):
+        """
+        Generates the string for a tag and everything inside of it, without any
+        formatting
+
+        :param tag: An XML element
+        :param scope: The prefix of each namespace in scope outside of the tag, by its URI
+        :param declarations: The prefix and URI of each namespace declared by the tag or
+                             the elements inside of it, by the element. Those of the
+                             elements written are removed.
+        :type declarations: dict
+        :return: The XML for the tag, excluding its tail
+        :rtype: str
+        """
+        # lxml declares namespaces again on the element it is asked to serialize
+        if self._parser == 'lxml' and not tag.nsmap:
+            serialized = etree.tostring(tag, encoding='unicode', with_tail=False)
+            # lxml escapes quotes and control characters in attributes differently,
+            # so only trust it when it hasn't had to
+            if '&quot;' not in serialized and '&#' not in serialized:
+                return serialized
+
+        builder = []
+        stack = [(tag, False, scope)]
+
+        while stack:
+            element, closing, scope = stack.pop()
+
+            if closing:
+                builder.append(self._close_tag(element, scope))
+            elif callable(element.tag):
+                builder.append(self._comment(element))
+            else:
+                declared = declarations.pop(element, None)
+                scope = self._scope(scope, declared)
+                attrs = self._attributes(element, scope, declared, self._quote)
+
+                if element.text or len(element):
+                    builder.append('<{}{}>'.format(self._name(element, scope), attrs))
+                    if element.text:
+                        builder.append(element.text.translate(self._ESCAPES))
+                    stack.append((element, True, scope))
+                    stack.extend((child, False, scope) for child in reversed(element))
+                    continue
+                builder.append('<{}{}/>'.format(self._name(element, scope), attrs))
+
+            if element is not tag and element.tail:
+                builder.append(element.tail.translate(self._ESCAPES))
+
+        return ''.join(builder)
+
+    def _quote(self, value):
+        """
+        Escapes and quotes an attribute value
+
+        :param value: The value of the attribute
+        :type value: str
+        :return: The quoted value
+        :rtype: str
+        """
+        value = value.translate(self._ESCAPES)
 
+        if '"' not in value:
+            return '"{}"'.format(value)
+        if "'" not in value:
+            return "'{}'".format(value)
+        return '"{}"'.format(value.replace('"', '&quot;'))
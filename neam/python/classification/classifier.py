@@ -2,7 +2,6 @@ import re
 
 from bs4 import BeautifulSoup
 
-from neam.python.java import clms, java, boot_java
 from neam.python.classification.processing import NEAMProcessor
 
 CORE_NLP_DEFAULTS = {
@@ -25,9 +24,81 @@ DEFAULT_TAGS = {
 }
 
 
-class Classifier(NEAMProcessor):
+class NERClassifier(NEAMProcessor):
+    """
+    Defines the interface for named entity classifiers.
+
+    A classifier implements *classify*, which marks up the named entities in the text
+    of a paragraph with TEI tags. *run* passes it each paragraph of a journal in turn,
+    through *classify_all*, which a classifier can override to mark up several
+    paragraphs at once.
+
+    Entities that have already been tagged with a ref, such as by GazetteerTagger, are
+    kept as they are: any tags the classifier puts inside or around them are removed.
+    """
+    def __init__(self, tags=None):
+        """
+        :param tags: Maps the classifier's labels to the TEI tags to mark entities with
+        :type tags: dict of str: str
+        """
+        self._target_tags = set((tags or DEFAULT_TAGS).values())
+        super().__init__(BeautifulSoup, str)
+
+    def classify(self, text):
+        raise NotImplementedError
+
+    def classify_all(self, texts):
+        """
+        Marks up the named entities in several paragraphs
+
+        :param texts: The text of each paragraph
+        :type texts: list of str
+        :return: The marked up text of each paragraph, in the same order
+        :rtype: iterable of str
+        """
+        return map(self.classify, texts)
+
+    def run(self, soup):
+        paragraphs = [tag.title or tag for tag in soup.find_all('p')]
+        texts = self.classify_all([str(tag) for tag in paragraphs])
+        for i, (tag, text) in enumerate(zip(paragraphs, texts), 1):
+            tag.replace_with(self._keep_resolved(BeautifulSoup(text, 'html.parser')))
+            self.progress(i, len(paragraphs))
+
+        output = str(soup)
+        for tag in self._target_tags:
+            output = output.replace(tag.lower(), tag)
+
+        return output
+
+    def _keep_resolved(self, soup):
+        """
+        Removes the entity tags the classifier put inside or around entities that were
+        already tagged with a ref
+
+        :param soup: A classified paragraph
+        :type soup: BeautifulSoup
+        :return: The paragraph
+        :rtype: BeautifulSoup
+        """
+        names = [tag.lower() for tag in self._target_tags]
+        for resolved in soup.find_all(names, ref=True):
+            for entity in resolved.find_all(names) + resolved.find_parents(names):
+                if not entity.get('ref'):
+                    entity.unwrap()
+        return soup
+
+
+class Classifier(NERClassifier):
+    """
+    Classifies named entities with Stanford CoreNLP, running in a JVM
+    """
     def __init__(self, options = None, tags = None):
-        boot_java()
+        # Imported here so that the other classifiers can run without Java
+        from neam.python import java
+        java.boot_java()
+        self._java = java.java
+
         props = CORE_NLP_DEFAULTS.copy()
         if options:
             props.update(options)
@@ -36,10 +107,9 @@ class Classifier(NEAMProcessor):
         tags = tags or DEFAULT_TAGS
         java_tags = self._convert_props(tags)
 
-        self._target_tags = set(tags.values())
-        self._classifier = clms.neam.classify.NEAMClassifier(core_nlp_props, java_tags)
+        self._classifier = java.clms.neam.classify.NEAMClassifier(core_nlp_props, java_tags)
 
-        super().__init__(BeautifulSoup, str)
+        super().__init__(tags)
 
     def _convert_props(self, props):
         """
@@ -49,7 +119,7 @@ class Classifier(NEAMProcessor):
         :type props: dict of str: str
         :return: A corresponding Java Properties object
         """
-        java_props = java.util.Properties()
+        java_props = self._java.util.Properties()
 
         for [key, value] in props.items():
             java_props.setProperty(key, value)
@@ -63,16 +133,3 @@ class Classifier(NEAMProcessor):
 
     def classify(self, text):
         return self._classifier.classify(re.sub('\n', ' ', text))
-
-    def run(self, soup):
-        for tag in soup.find_all('p'):
-            if tag.title:
-                tag = tag.title
-            text = self.classify(str(tag))
-            tag.replace_with(BeautifulSoup(text, 'html.parser'))
-
-        output = str(soup)
-        for tag in self._target_tags:
-            output = output.replace(tag.lower(), tag)
-
-        return output
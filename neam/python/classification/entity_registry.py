@@ -0,0 +1,240 @@
+"""
+entity_registry.py
+
+Defines an index of the distinct entities in a document, keyed by their tag and the
+ref their tags point at, and a way to write it out as TEI standoff markup: a <listPerson>,
+<listPlace> and <listOrg> of the people, places and organizations mentioned, each
+with the xml:id that their refs point to.
+
+RefAnnotator fills the index in as it sets the ref of each entity, so the entities of
+a document are gathered in the same pass, without having to read the output again.
+
+Each ID belongs to entities of one type. An entity whose ref is already the ID of an
+entity of another type, such as the place Washington after the person, is given the ID
+with its tag added, Washington_placeName, and the refs that pointed at it are changed
+to match.
+
+Use:
+    annotator = RefAnnotator()
+    annotator.run('<body><persName>Mr. Davis</persName> ...</body>')
+    annotator.registry.standoff()  # '<standOff>\n  <listPerson>\n    <person xml:id="Mr_Davis">...'
+"""
+import html
+import re
+from collections import OrderedDict
+
+from neam.python.query import wiki
+
+# The list and the element each entity tag is described with in the standoff markup
+LISTS = OrderedDict([
+    ('persName', ('listPerson', 'person')),
+    ('placeName', ('listPlace', 'place')),
+    ('orgName', ('listOrg', 'org'))
+])
+
+MARKUP = re.compile('<[^>]*>')
+REF = re.compile(r'<(\w+)(\s[^>]*?)?(\sref=")#([^"]*)"')
+NOT_ID = re.compile(r'[^\w\-]')
+QID = re.compile(r'Q\d+$')
+
+
+class EntityRegistry:
+    """
+    The distinct entities mentioned in a document, with the number of times each is
+    mentioned and where it is mentioned first
+    """
+    def __init__(self):
+        self.mentions = 0  # the number of mentions of every entity
+        self._entities = OrderedDict()  # the description of each entity, by its tag and ID
+        self._tags = {}  # the tag of the entities each ID belongs to
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __iter__(self):
+        return iter(self._entities.values())
+
+    def _id_for(self, tag, key):
+        """
+        :return: The ID an entity with the given tag and ref ID is indexed under: the
+                 ref ID, unless it belongs to an entity of another type
+        :rtype: str
+        """
+        candidate, n = key, 1
+        while self._tags.get(candidate, tag) != tag:
+            n += 1
+            candidate = '{}_{}'.format(key, tag) if n == 2 else '{}_{}{}'.format(key, tag, n)
+        return candidate
+
+    def add(self, tag, name, ref):
+        """
+        Records a mention of an entity
+
+        :param tag: The TEI tag of the mention
+        :type tag: str
+        :param name: The text of the mention, as XML, which may contain markup
+        :type name: str
+        :param ref: The ref of the mention, which the ID of the entity is taken from
+        :type ref: str
+        :return: The ref the mention should have, which differs from *ref* if that is
+                 the ID of an entity of another type
+        :rtype: str
+        """
+        self.mentions += 1
+        key = self._id_for(tag, ref.lstrip('#'))
+        entity = self._entities.get((tag, key))
+        if entity:
+            entity['count'] += 1
+            return '#' + key
+
+        name = normalize(name)
+        self._add({
+            'id': key,
+            'tag': tag,
+            'name': name,
+            # Wikidata lookups are cached by the text of the entity, not its XML
+            'qid': key if QID.match(key) else wiki.CACHE.get(html.unescape(name), {}).get('id'),
+            'count': 1,
+            'first': self.mentions
+        })
+        return '#' + key
+
+    def _add(self, entity):
+        self._entities[entity['tag'], entity['id']] = entity
+        self._tags[entity['id']] = entity['tag']
+
+    def merge(self, other):
+        """
+        Adds the entities of the document that follows on from this one, such as the
+        next chunk of a journal
+
+        The chunks of a journal are given their IDs separately, so an ID can belong to
+        entities of different types in different chunks. Entities of the following
+        document are given IDs the way *add* would have given them, had the documents
+        been annotated in one go, and the refs in its text have to be changed to match
+        with *rename_refs*.
+
+        :param other: The entities of the following document
+        :type other: EntityRegistry
+        :return: The new ID of each entity of the following document whose ID changed,
+                 by its tag and old ID
+        :rtype: dict
+        """
+        renames = {}
+        for entity in other:
+            key = self._id_for(entity['tag'], entity['id'])
+            if key != entity['id']:
+                renames[entity['tag'], entity['id']] = key
+            mine = self._entities.get((entity['tag'], key))
+            if mine:
+                mine['count'] += entity['count']
+            else:
+                self._add(dict(entity, id=key, first=entity['first'] + self.mentions))
+        self.mentions += other.mentions
+        return renames
+
+    def to_dict(self):
+        """
+        :return: The registry, in a form that can be written as JSON
+        :rtype: dict
+        """
+        return {'mentions': self.mentions, 'entities': list(self)}
+
+    @staticmethod
+    def from_dict(data):
+        """
+        :param data: A registry, as returned by *to_dict*
+        :type data: dict
+        :rtype: EntityRegistry
+        """
+        registry = EntityRegistry()
+        registry.mentions = data['mentions']
+        for entity in data['entities']:
+            registry._add(dict(entity))
+        return registry
+
+    def standoff(self, tab='  '):
+        """
+        Describes the people, places and organizations in TEI standoff markup. Entities
+        of any other type are left out.
+
+        :param tab: The string to indent each level with
+        :type tab: str
+        :return: A <standOff> element, or an empty string if there are no entities to
+                 describe
+        :rtype: str
+        """
+        lists = OrderedDict((tag, []) for tag in LISTS)
+        for entity in self:
+            if entity['tag'] in lists:
+                lists[entity['tag']].append(entity)
+
+        lines = ['<standOff>']
+        for tag, entities in lists.items():
+            if not entities:
+                continue
+            list_name, element = LISTS[tag]
+            lines.append('{}<{}>'.format(tab, list_name))
+            for entity in entities:
+                lines.append('{}<{} xml:id="{}">'.format(tab * 2, element, entity['id']))
+                lines.append('{0}<{1}>{2}</{1}>'.format(tab * 3, tag, entity['name']))
+                if entity['qid']:
+                    lines.append('{}<idno type="wikidata">{}</idno>'.format(tab * 3, entity['qid']))
+                lines.append('{}<note type="mentions">{}</note>'.format(tab * 3, entity['count']))
+                lines.append('{}<note type="firstMention">{}</note>'.format(tab * 3, entity['first']))
+                lines.append('{}</{}>'.format(tab * 2, element))
+            lines.append('{}</{}>'.format(tab, list_name))
+        lines.append('</standOff>')
+
+        return '\n'.join(lines) if len(lines) > 2 else ''
+
+
+def rename_refs(text, renames):
+    """
+    Changes the refs of the entities in a document that were renamed when its entities
+    were merged into another registry
+
+    :param text: The document, as XML
+    :type text: str
+    :param renames: The new ID of each renamed entity, by its tag and old ID, as
+                    returned by *EntityRegistry.merge*
+    :type renames: dict
+    :return: The document, with its refs changed
+    :rtype: str
+    """
+    if not renames:
+        return text
+
+    def rename(match_object):
+        key = renames.get((match_object.group(1), match_object.group(4)))
+        if key is None:
+            return match_object.group(0)
+        return '<{}{}{}#{}"'.format(match_object.group(1), match_object.group(2) or '', match_object.group(3), key)
+
+    return REF.sub(rename, text)
+
+
+def normalize(name):
+    """
+    :return: The text of an entity, without any markup and with its whitespace
+             collapsed
+    :rtype: str
+    """
+    return ' '.join(MARKUP.sub('', name).split())
+
+
+def make_id(name):
+    """
+    Makes an ID for an entity from its name, such as Mrs_Andrews for Mrs. Andrews,
+    which can be used as its xml:id
+
+    :param name: The text of the entity, which may contain markup
+    :type name: str
+    :return: The ID
+    :rtype: str
+    """
+    key = NOT_ID.sub('', normalize(name).replace(' ', '_'))
+    # an xml:id has to start with a letter or an underscore
+    if not re.match(r'[^\W\d]', key):
+        key = '_' + key
+    return key
@@ -0,0 +1,206 @@
+"""
+gazetteer.py
+
+Defines a processor that tags the entities listed in a curated gazetteer before the
+named entity classifier runs. The journals mention the same people, ships and places
+thousands of times, and each of these mentions is tagged with its TEI tag and ref in
+a single pass over the text, rather than being sent through CoreNLP and then Wikidata.
+
+The gazetteer is read from a CSV file in the format csv_to_sql.py imports, with the
+ref, name and tag of an entity on each line:
+    Emma_B_Andrews,Mrs. Andrews,persName
+    Emma_B_Andrews,Emma B. Andrews,persName
+    Luxor,Luxor,placeName
+
+Entities tagged from the gazetteer have a ref attribute, which tells the later stages
+that they have already been resolved: the classifier doesn't tag inside or around
+them, and WikiRetagger and RefAnnotator leave them alone.
+"""
+import csv
+from collections import deque
+
+from bs4 import BeautifulSoup
+
+from neam.python.classification.processing import NEAMProcessor
+
+
+class Gazetteer:
+    """
+    Finds the names in a gazetteer in text, with an Aho-Corasick automaton, so that
+    the text is scanned once however many names there are
+    """
+    def __init__(self, entries):
+        """
+        :param entries: The name, TEI tag and ref of each entity. A name listed more
+                        than once keeps its first entry.
+        :type entries: iterable of (str, str, str)
+        """
+        self._goto = [{}]  # the transitions out of each state, by character
+        self._fail = [0]  # the state for the longest proper suffix of each state
+        self._entry = [None]  # the length, tag and ref of the name that ends at each state
+        self._next_entry = [0]  # the nearest state along the fail links with an entry
+        self.tags = set()
+
+        for name, tag, ref in entries:
+            name = ' '.join(name.split())
+            if name:
+                self._add(name, tag, ref)
+        self._link()
+
+    def _add(self, name, tag, ref):
+        state = 0
+        for char in name:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._entry.append(None)
+                self._next_entry.append(0)
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        if self._entry[state] is None:
+            self._entry[state] = (len(name), tag, ref)
+            self.tags.add(tag)
+
+    def _link(self):
+        """
+        Works out the fail links of each state, breadth first
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                fallback = self._fail[child]
+                self._next_entry[child] = fallback if self._entry[fallback] else self._next_entry[fallback]
+                queue.append(child)
+
+    def find(self, text):
+        """
+        Finds the names in a piece of text. Where names overlap, the one that starts
+        first wins, and then the longest. A name only matches whole words, and any run
+        of whitespace in the text matches a space in a name.
+
+        :param text: The text to search
+        :type text: str
+        :return: Where each name starts and ends in the text, and its tag and ref
+        :rtype: list of (int, int, str, str)
+        """
+        longest = {}  # the end, tag and ref of the longest name starting at each position
+        state = 0
+        for i, char in enumerate(text):
+            if char.isspace():
+                # a run of whitespace is one space, so skip all but the first
+                if i and text[i - 1].isspace():
+                    continue
+                char = ' '
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            found = state if self._entry[state] else self._next_entry[state]
+            while found:
+                length, tag, ref = self._entry[found]
+                start = _start(text, i + 1, length)
+                if _whole_words(text, start, i + 1) and i + 1 > longest.get(start, (0,))[0]:
+                    longest[start] = (i + 1, tag, ref)
+                found = self._next_entry[found]
+
+        matches = []
+        last = 0
+        for start in sorted(longest):
+            if start >= last:
+                end, tag, ref = longest[start]
+                matches.append((start, end, tag, ref))
+                last = end
+        return matches
+
+    @staticmethod
+    def from_csv(file_name):
+        """
+        Reads a gazetteer from a CSV file with the ref, name and tag of an entity on
+        each line
+
+        :param file_name: The file to read
+        :type file_name: str
+        :rtype: Gazetteer
+        """
+        with open(file_name, newline='', encoding='utf-8') as csv_file:
+            return Gazetteer((row[1], row[2], row[0]) for row in csv.reader(csv_file) if len(row) >= 3)
+
+
+class GazetteerTagger(NEAMProcessor):
+    """
+    Tags the entities in a gazetteer, with their refs
+    """
+    def __init__(self, gazetteer):
+        """
+        :param gazetteer: The gazetteer, or the CSV file to read it from
+        :type gazetteer: Gazetteer or str
+        """
+        if not isinstance(gazetteer, Gazetteer):
+            gazetteer = Gazetteer.from_csv(gazetteer)
+        self._gazetteer = gazetteer
+        self._tags = {tag.lower() for tag in gazetteer.tags}
+        super().__init__(BeautifulSoup, BeautifulSoup)
+
+    def run(self, soup):
+        paragraphs = soup.find_all('p')
+        for i, paragraph in enumerate(paragraphs, 1):
+            for string in paragraph.find_all(string=True):
+                if not any(parent.name.lower() in self._tags for parent in string.parents):
+                    self._tag(soup, string)
+            self.progress(i, len(paragraphs))
+        return soup
+
+    def _tag(self, soup, string):
+        """
+        Replaces a string with the same text, with the names in the gazetteer tagged
+
+        :param soup: The document the string belongs to
+        :type soup: BeautifulSoup
+        :param string: The string
+        :type string: NavigableString
+        """
+        text = str(string)
+        matches = self._gazetteer.find(text)
+        if not matches:
+            return
+
+        last = 0
+        for start, end, tag, ref in matches:
+            if start > last:
+                string.insert_before(text[last:start])
+            entity = soup.new_tag(tag, ref='#' + ref.lstrip('#'))
+            entity.string = text[start:end]
+            string.insert_before(entity)
+            last = end
+        if last < len(text):
+            string.insert_before(text[last:])
+        string.extract()
+
+
+def _start(text, end, length):
+    """
+    :return: Where a name of *length* characters that ends at *end* starts in the text,
+             counting each run of whitespace as one character
+    :rtype: int
+    """
+    start = end
+    while length:
+        start -= 1
+        while start and text[start].isspace() and text[start - 1].isspace():
+            start -= 1
+        length -= 1
+    return start
+
+
+def _whole_words(text, start, end):
+    """
+    :return: Whether a match covers whole words, rather than part of one
+    :rtype: bool
+    """
+    return ((start == 0 or not (text[start - 1].isalnum() and text[start].isalnum())) and
+            (end == len(text) or not (text[end - 1].isalnum() and text[end].isalnum())))
@@ -1,14 +1,55 @@
 import re
+from collections import namedtuple
 from neam.python.classification.processing import NEAMProcessor
 from bs4 import BeautifulSoup, NavigableString, Tag
 
 
+JournalDate = namedtuple('JournalDate', ['year', 'month', 'day'])
+
+
+class DateIndex:
+    """
+    The xml:id of every entry in a journal, in order
+
+    An index is computed in a single pass over the titles of a journal, so it can be
+    sliced up and handed to shapers working on separate chunks of the journal while
+    keeping the IDs the same as if the journal had been shaped in one go.
+    """
+    def __init__(self, codes):
+        """
+        Initializes the index
+
+        :param codes: The xml:id of each entry, in order
+        :type codes: list of str
+        """
+        self._codes = list(codes)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return DateIndex(self._codes[key])
+        return self._codes[key]
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __iter__(self):
+        return iter(self._codes)
+
+    def __eq__(self, other):
+        return isinstance(other, DateIndex) and self._codes == other._codes
+
+    def __repr__(self):
+        return 'DateIndex({!r})'.format(self._codes)
+
+
 class JournalShaper(NEAMProcessor):
     """
     Shapes journal text into TEI format by finding titles and paragraphs
     """
-    _MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'oct', 'nov', 'dec']
+    _MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+    _MONTH_NUMBERS = {month: number for number, month in enumerate(_MONTHS, 1)}
     _ORDINALS = ['st', 'd', 'nd', 'rd', 'th']
+    _TITLE_PATTERN = re.compile('({})(?:\.|[a-z]+)? +(\d+)(?:{})?\.?(?: +(\d+)\.?)?'.format('|'.join(_MONTHS), '|'.join(_ORDINALS)))
 
     def __init__(self, author, year = 0, month = 1, day = 1):
         """
@@ -25,36 +66,48 @@ class JournalShaper(NEAMProcessor):
         :type day: int
         """
         self._author = author
-        self._year = year
-        self._month = month
-        self._day = day
+        self._start = JournalDate(year, month, day)
         super().__init__(BeautifulSoup, BeautifulSoup)
 
     @property
     def formatted_year(self):
         """
-        :return: The current year, as far as journal parsing is concerned
+        :return: The year of the first entry
         :rtype: str
         """
-        return str(self._year)
+        return str(self._start.year)
 
     @property
     def formatted_month(self):
         """
-        :return: The current month, as far as journal parsing is concerned
+        :return: The month of the first entry
         :rtype: str
         """
-        return self._pad(self._month, 2)
+        return self._pad(self._start.month, 2)
 
     @property
     def formatted_day(self):
         """
-        :return: The current day, as far as journal parsing is concerned
+        :return: The day of the first entry
         :rtype: str
         """
-        return self._pad(self._day, 2)
+        return self._pad(self._start.day, 2)
+
+    def run(self, soup, index=None):
+        """
+        Wraps each title and the text following it in an entry div
+
+        :param soup: The journal, with its titles tagged
+        :type soup: BeautifulSoup
+        :param index: The IDs to give the entries. If not given, the index is computed
+                      from the titles in the soup.
+        :type index: DateIndex
+        :return: The shaped journal
+        :rtype: BeautifulSoup
+        """
+        index = index if index is not None else self.index(self.titles(soup))
+        codes = iter(index)
 
-    def run(self, soup):
         title = None
         body = soup.new_tag('body')
         for child in soup.body.contents[:]:
@@ -66,7 +119,7 @@ class JournalShaper(NEAMProcessor):
                 if title:
                     div = soup.new_tag('div')
                     div['type'] = 'Entry'
-                    div['xml:id'] = self.extract_code(title)
+                    div['xml:id'] = next(codes)
 
                     p_text = soup.new_tag('p')
                     p_text.append(text)
@@ -82,17 +135,94 @@ class JournalShaper(NEAMProcessor):
         soup.body.replace_with(body)
         return soup
 
-    def extract_code(self, title):
-        if title.string:
-            return self._make_code(re.search('({})(?:\.|[a-z]+)? +(\d+)(?:{})?\.?(?: +(\d+)\.?)?'.format('|'.join(self._MONTHS), '|'.join(self._ORDINALS)), title.string.lower()))
-        return self._author + '???'
+    def titles(self, soup):
+        """
+        Finds the title of every entry that *run* will create, without changing the
+        soup
+
+        :param soup: The journal, with its titles tagged
+        :type soup: BeautifulSoup
+        :return: The text of each entry's title, or None if the title has no text
+        :rtype: list of Union[str, None]
+        """
+        title = None
+        titles = []
+        for child in soup.body.contents:
+            if isinstance(child, Tag):
+                title = child
+            elif title:
+                titles.append(title.string)
+        return titles
+
+    def index(self, titles):
+        """
+        Computes the xml:id of every entry in one pass over the titles
+
+        The date is rolled forward from the first entry's date as the titles are
+        read, so the titles must be given in order and must cover the whole journal.
+
+        :param titles: The text of each entry's title, in order
+        :type titles: iterable of Union[str, None]
+        :return: The IDs of the entries
+        :rtype: DateIndex
+        """
+        codes, _ = self.extract_codes(titles)
+        return DateIndex(codes)
+
+    def extract_codes(self, titles, date=None):
+        """
+        Works out the xml:id for a run of consecutive entries from their titles
+
+        The date reached at the end of the run is returned alongside the IDs, so a
+        journal can be read a batch of titles at a time by passing it back in.
+
+        :param titles: The text of each entry's title, in order
+        :type titles: iterable of Union[str, None]
+        :param date: The date of the entry before the first title. Defaults to the
+                     date the shaper was initialized with.
+        :type date: JournalDate
+        :return: The IDs of the entries, and the date of the last entry
+        :rtype: tuple of (list of str, JournalDate)
+        """
+        date = date or self._start
+        search = self._TITLE_PATTERN.search
+        unknown = self._author + '???'
+        codes = []
+
+        for title in titles:
+            if title:
+                code, date = self._make_code(date, search(title.lower()))
+            else:
+                code = unknown
+            codes.append(code)
+
+        return codes, date
+
+    def extract_code(self, title, date):
+        """
+        Works out the xml:id for an entry from its title
+
+        :param title: The text of the entry's title
+        :type title: str
+        :param date: The date of the previous entry
+        :type date: JournalDate
+        :return: The ID of the entry, and the date of the entry
+        :rtype: tuple of (str, JournalDate)
+        """
+        codes, date = self.extract_codes([title], date)
+        return codes[0], date
 
-    def _make_code(self, match_data):
+    def _make_code(self, date, match_data):
         """
         Translates match data into a TEI title
 
+        :param date: The date of the previous entry
+        :type date: JournalDate
         :param match_data: The result from a regular expression search
+        :return: The ID of the entry, and the date of the entry
+        :rtype: tuple of (str, JournalDate)
         """
+        curr_year, curr_month, curr_day = date
         month = day = year = None
 
         if match_data:
@@ -102,20 +232,21 @@ class JournalShaper(NEAMProcessor):
 
         if day:
             day = int(day)
-            if day < self._day:
-                self._month += 1
-            self._day = int(day)
+            if day < curr_day:
+                curr_month += 1
+            curr_day = int(day)
 
         if month:
-            month = self._MONTHS.index(month.lower()) + 1
-            if month < self._month:
-                self._year += 1
-            self._month = month
+            month = self._MONTH_NUMBERS[month]
+            if month < curr_month:
+                curr_year += 1
+            curr_month = month
 
         if year:
-            self._year = int(year)
+            curr_year = int(year)
 
-        return self._author + self.formatted_year + self.formatted_month + self.formatted_day
+        code = self._author + str(curr_year) + self._pad(curr_month, 2) + self._pad(curr_day, 2)
+        return code, JournalDate(curr_year, curr_month, curr_day)
 
     def _tag_bodies(self, text):
         """
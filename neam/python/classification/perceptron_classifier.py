@@ -0,0 +1,372 @@
+"""
+perceptron_classifier.py
+
+Defines a named entity classifier that runs in pure Python, as a lightweight
+alternative to CoreNLP. It needs no JVM, starts up in well under a second and uses a
+fraction of the memory, at some cost in accuracy.
+
+The classifier is an averaged perceptron that labels each token of a paragraph as
+beginning (B-), inside (I-) or outside (O) an entity. It is trained on TEI documents
+that have already been tagged, such as the gold standards used for evaluation, and
+marks up entities with the same TEI tags as the CoreNLP classifier.
+
+To train it:
+    python -m neam.python.classification.perceptron_classifier gold1.xml gold2.xml ...
+"""
+import argparse
+import os
+import pickle
+import random
+import re
+from collections import defaultdict
+
+from bs4 import BeautifulSoup, NavigableString
+
+from neam.python.classification.classifier import NERClassifier, DEFAULT_TAGS
+
+# Character references and common abbreviations are kept whole, so that an entity never
+# ends partway through one
+TOKEN = re.compile(r"&#?\w+;|(?:Mr|Mrs|Ms|Dr|St|Mt|Capt|Col|Maj|Gen|Lt|Rev|Sr|Jr|Mme|Mlle|M)\.|\w+(?:['’]\w+)*|[^\w\s]")
+MARKUP = re.compile(r'<[^>]*>')
+OUTSIDE = 'O'
+START = '-START-'
+
+
+class AveragedPerceptron:
+    """
+    A multi-class perceptron whose weights are averaged over every update once it has
+    been trained, which makes it far less sensitive to the order of the training data
+    """
+    def __init__(self):
+        self.weights = {}  # the weight of each label, by feature
+        self.classes = set()
+        self._totals = defaultdict(float)  # the sum of each weight over every update
+        self._stamps = defaultdict(int)  # when each weight was last changed
+        self._updates = 0
+
+    def predict(self, features):
+        """
+        Finds the most likely label for a set of features
+
+        :param features: The features of a token
+        :type features: list of str
+        :return: The label
+        :rtype: str
+        """
+        scores = defaultdict(float)
+        for feature in features:
+            for label, weight in self.weights.get(feature, {}).items():
+                scores[label] += weight
+        # break ties by name, so that predictions don't depend on the order of a set
+        return max(self.classes, key=lambda label: (scores[label], label))
+
+    def update(self, truth, guess, features):
+        """
+        Moves the weights towards the right label, if the guess was wrong
+
+        :param truth: The right label
+        :type truth: str
+        :param guess: The predicted label
+        :type guess: str
+        :param features: The features the label was predicted from
+        :type features: list of str
+        """
+        self._updates += 1
+        if truth == guess:
+            return
+        for feature in features:
+            weights = self.weights.setdefault(feature, {})
+            for label, change in [(truth, 1.0), (guess, -1.0)]:
+                key = (feature, label)
+                weight = weights.get(label, 0.0)
+                self._totals[key] += (self._updates - self._stamps[key]) * weight
+                self._stamps[key] = self._updates
+                weights[label] = weight + change
+
+    def average(self):
+        """
+        Replaces each weight with its average over every update. The perceptron can't
+        be trained any further afterwards.
+        """
+        for feature, weights in self.weights.items():
+            averaged = {}
+            for label, weight in weights.items():
+                key = (feature, label)
+                total = self._totals[key] + (self._updates - self._stamps[key]) * weight
+                if total:
+                    averaged[label] = round(total / self._updates, 3)
+            self.weights[feature] = averaged
+        self._totals = defaultdict(float)
+        self._stamps = defaultdict(int)
+
+    def to_dict(self):
+        """
+        :return: The weights and labels of the perceptron, as plain data that can be
+                 pickled without the class, which is __main__.AveragedPerceptron when
+                 this module is run to train a model
+        :rtype: dict
+        """
+        return {'weights': self.weights, 'classes': sorted(self.classes)}
+
+    @staticmethod
+    def from_dict(data):
+        """
+        :param data: A perceptron, as returned by *to_dict*
+        :type data: dict
+        :rtype: AveragedPerceptron
+        """
+        perceptron = AveragedPerceptron()
+        perceptron.weights = data['weights']
+        perceptron.classes = set(data['classes'])
+        return perceptron
+
+
+class PerceptronClassifier(NERClassifier):
+    """
+    Classifies named entities with an averaged perceptron, in pure Python
+    """
+    _DEFAULT_MODEL = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ner_perceptron_model.pickle')
+
+    def __init__(self, model=_DEFAULT_MODEL, tags=None):
+        """
+        :param model: The trained perceptron, or the file it was saved to
+        :type model: AveragedPerceptron or str
+        :param tags: Maps the labels the perceptron was trained with to TEI tags. The
+                     perceptron is trained with TEI tags, so by default they map to
+                     themselves.
+        :type tags: dict of str: str
+        """
+        if isinstance(model, AveragedPerceptron):
+            self._perceptron = model
+        else:
+            with open(model, 'rb') as model_file:
+                self._perceptron = AveragedPerceptron.from_dict(pickle.load(model_file))
+
+        tags = tags or {tag: tag for tag in set(DEFAULT_TAGS.values())}
+        self._tags = tags
+        super().__init__(tags)
+
+    def classify(self, text):
+        text = re.sub('\n', ' ', text)
+        tokens, spans = tokenize(text)
+        labels = self.label(tokens)
+
+        builder = []
+        last = 0
+        for start, end, label in entities(text, spans, labels):
+            tag = self._tags.get(label)
+            if tag:
+                builder.append(text[last:start])
+                builder.append('<{0}>{1}</{0}>'.format(tag, text[start:end]))
+                last = end
+        builder.append(text[last:])
+        return ''.join(builder)
+
+    def label(self, tokens):
+        """
+        Labels each token as beginning, inside or outside an entity
+
+        :param tokens: The tokens of a paragraph
+        :type tokens: list of str
+        :return: The label of each token, such as B-persName, I-persName or O
+        :rtype: list of str
+        """
+        labels = []
+        prev, prev2 = START, START
+        for i in range(len(tokens)):
+            label = self._perceptron.predict(features(tokens, i, prev, prev2))
+            labels.append(label)
+            prev2, prev = prev, label
+        return labels
+
+    @staticmethod
+    def train(file_names, iterations=5, tags=None, dump=None, seed=0):
+        """
+        Trains a classifier on TEI documents whose entities have already been tagged
+
+        :param file_names: The tagged documents
+        :type file_names: list of str
+        :param iterations: The number of passes to make over the documents
+        :type iterations: int
+        :param tags: The TEI tags to learn. By default, the tags the CoreNLP classifier
+                     marks up.
+        :type tags: list of str
+        :param dump: A file to save the trained perceptron to
+        :type dump: str
+        :param seed: The seed for shuffling the paragraphs between passes
+        :type seed: int
+        :return: The trained classifier
+        :rtype: PerceptronClassifier
+        """
+        tags = tags or sorted(set(DEFAULT_TAGS.values()))
+        paragraphs = []
+        for file_name in file_names:
+            with open(file_name, encoding='utf-8') as input_file:
+                paragraphs.extend(read_paragraphs(BeautifulSoup(input_file, 'html.parser'), tags))
+
+        perceptron = AveragedPerceptron()
+        perceptron.classes = {OUTSIDE} | {prefix + tag for tag in tags for prefix in ['B-', 'I-']}
+        shuffle = random.Random(seed).shuffle
+
+        for _ in range(iterations):
+            shuffle(paragraphs)
+            for tokens, truths in paragraphs:
+                prev, prev2 = START, START
+                for i, truth in enumerate(truths):
+                    token_features = features(tokens, i, prev, prev2)
+                    guess = perceptron.predict(token_features)
+                    perceptron.update(truth, guess, token_features)
+                    prev2, prev = prev, guess
+        perceptron.average()
+
+        if dump:
+            with open(dump, 'wb') as model_file:
+                pickle.dump(perceptron.to_dict(), model_file)
+
+        return PerceptronClassifier(perceptron, {tag: tag for tag in tags})
+
+
+def tokenize(text):
+    """
+    Splits the text of a paragraph into tokens, skipping any markup
+
+    :param text: The paragraph, which may contain tags
+    :type text: str
+    :return: The tokens, and where each starts and ends in the text
+    :rtype: tuple of (list of str, list of (int, int))
+    """
+    tokens = []
+    spans = []
+    last = 0
+    for markup in list(MARKUP.finditer(text)) + [None]:
+        end = markup.start() if markup else len(text)
+        for match in TOKEN.finditer(text, last, end):
+            tokens.append(match.group(0))
+            spans.append(match.span())
+        last = markup.end() if markup else end
+    return tokens, spans
+
+
+def entities(text, spans, labels):
+    """
+    Finds the entities in a labelled paragraph. An entity never crosses markup, so
+    that tagging it keeps the paragraph well formed.
+
+    :param text: The paragraph
+    :type text: str
+    :param spans: Where each token starts and ends in the text
+    :type spans: list of (int, int)
+    :param labels: The label of each token
+    :type labels: list of str
+    :return: Where each entity starts and ends, and its tag
+    :rtype: generator of (int, int, str)
+    """
+    current = None  # the start, end, and tag of the entity being read
+    for (start, end), label in zip(spans, labels):
+        prefix, _, tag = label.partition('-')
+        continues = (current and prefix == 'I' and tag == current[2] and
+                     '<' not in text[current[1]:start])
+        if continues:
+            current[1] = end
+            continue
+        if current:
+            yield tuple(current)
+        current = [start, end, tag] if tag else None
+    if current:
+        yield tuple(current)
+
+
+def read_paragraphs(soup, tags):
+    """
+    Reads the tokens of each paragraph in a tagged TEI document, and labels them with
+    the entities they belong to
+
+    :param soup: The document, parsed with html.parser
+    :type soup: BeautifulSoup
+    :param tags: The TEI tags to label
+    :type tags: list of str
+    :return: The tokens of each paragraph, and their labels
+    :rtype: list of (list of str, list of str)
+    """
+    names = {tag.lower(): tag for tag in tags}
+    paragraphs = []
+    for paragraph in soup.find_all('p'):
+        tokens = []
+        labels = []
+        last_entity = None
+        for node in paragraph.descendants:
+            if not isinstance(node, NavigableString):
+                continue
+            # the innermost entity the text is part of
+            entity = next((parent for parent in node.parents if parent.name in names), None)
+            for token in TOKEN.findall(str(node)):
+                if entity is None:
+                    labels.append(OUTSIDE)
+                else:
+                    # only the first token of an entity begins it
+                    prefix = 'I-' if entity is last_entity else 'B-'
+                    labels.append(prefix + names[entity.name])
+                tokens.append(token)
+                last_entity = entity
+        if tokens:
+            paragraphs.append((tokens, labels))
+    return paragraphs
+
+
+def features(tokens, i, prev, prev2):
+    """
+    Describes a token and its context for the perceptron
+
+    :param tokens: The tokens of the paragraph
+    :type tokens: list of str
+    :param i: The position of the token
+    :type i: int
+    :param prev: The label given to the token before
+    :type prev: str
+    :param prev2: The label given to the token before that
+    :type prev2: str
+    :return: The features
+    :rtype: list of str
+    """
+    word = tokens[i]
+    before = tokens[i - 1] if i > 0 else START
+    after = tokens[i + 1] if i + 1 < len(tokens) else START
+    return [
+        'bias',
+        'word=' + word.lower(),
+        'shape=' + shape(word),
+        'prefix=' + word[:3],
+        'suffix=' + word[-3:].lower(),
+        'prev=' + prev,
+        'prev2=' + prev2 + ' ' + prev,
+        'prev word=' + before.lower(),
+        'prev shape=' + shape(before),
+        'prev label+word=' + prev + ' ' + word.lower(),
+        'next word=' + after.lower(),
+        'next shape=' + shape(after),
+        'first=' + str(i == 0),
+    ]
+
+
+def shape(word):
+    """
+    :return: The word with its letters and digits replaced by X, x and d, and runs of
+             the same character collapsed, e.g. Xx for Cairo and X.X. for S.S.
+    :rtype: str
+    """
+    word = re.sub('[A-Z]', 'X', word)
+    word = re.sub('[a-z]', 'x', word)
+    word = re.sub('[0-9]', 'd', word)
+    return re.sub(r'(.)\1+', r'\1', word)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains the pure Python named entity classifier')
+    parser.add_argument('files', nargs='+', help='TEI documents whose entities have been tagged')
+    parser.add_argument('--iterations', help='The number of passes to make over the documents', type=int, default=5)
+    parser.add_argument('--output', help='Where to save the model', default=PerceptronClassifier._DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    print('Training the named entity classifier on {} documents...'.format(len(args.files)))
+    PerceptronClassifier.train(args.files, args.iterations, dump=args.output)
+    print('Classifier trained.')
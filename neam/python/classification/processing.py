@@ -8,17 +8,31 @@ call the pipeline's *run* method. The pipeline will pipe the data given to
 *run* through each process defined in the pipeline, in order.
 """
 import re
+import time
 from abc import ABC
+from collections import namedtuple
 from bs4 import BeautifulSoup, NavigableString
 from neam.python.util import multi_sub
 
+
+# How far a pipeline has got: the name and 1-based number of the current stage, the
+# number of stages, and how many items the stage has processed out of its total. The
+# total is 0 if the stage doesn't report its progress.
+Progress = namedtuple('Progress', ['stage', 'stage_number', 'stages', 'current', 'total'])
+
+
 class NEAMProcessor(ABC):
     """
     Defines the interface for neam processes.
 
     A NEAMProcessor should implement a method called "run", which accepts an
     str and returns an str.
+
+    Processors that work through a document an item at a time should call
+    *progress* as they go, so that a pipeline can report how far it has got.
     """
+    _progress = None
+
     def __init__(self, from_type, to_type):
         self._from = from_type
         self._to = to_type
@@ -26,6 +40,18 @@ class NEAMProcessor(ABC):
     def run(self, text):
         raise NotImplemented
 
+    def progress(self, current, total):
+        """
+        Reports how many items the processor has dealt with
+
+        :param current: The number of items processed so far
+        :type current: int
+        :param total: The total number of items to process
+        :type total: int
+        """
+        if self._progress:
+            self._progress(current, total)
+
 
 class Pipeline:
     """
@@ -40,7 +66,16 @@ class Pipeline:
         """
         self._processes = processes or []
 
-    def run(self, data):
+    @property
+    def processes(self):
+        """
+        The processes in the pipeline, in the order they are run
+
+        :rtype: list of NEAMProcessor or callable
+        """
+        return list(self._processes)
+
+    def run(self, data, progress=None):
         """
         Consumes some data and passes it sequentially through each processor
         in the pipeline.
@@ -48,13 +83,28 @@ class Pipeline:
         Each processor receives as input the output of the previous processor.
 
         :param data: The data to pass into the first processor
+        :param progress: Called with a Progress as each stage starts, and again
+                         whenever the stage reports how far it has got
+        :type progress: callable
         :return: The output from the final processor
         """
-        for process in self._processes:
+        stages = len(self._processes)
+
+        for number, process in enumerate(self._processes, 1):
+            name = getattr(process, '__name__', type(process).__name__)
+
+            if progress:
+                progress(Progress(name, number, stages, 0, 0))
+                if isinstance(process, NEAMProcessor):
+                    process._progress = lambda current, total: progress(Progress(name, number, stages, current, total))
+
             try:
                 data = process.run(data)
             except AttributeError:
                 data = process(data)
+            finally:
+                if progress and isinstance(process, NEAMProcessor):
+                    del process._progress
         return data
 
     def add(self, process):
@@ -67,6 +117,55 @@ class Pipeline:
         self._processes.append(process)
 
 
+class StageTimer:
+    """
+    Times each stage of a pipeline, from the progress it reports. Subclasses decide
+    what to do with each stage's time by overriding *record*.
+
+    Pass the timer to a pipeline's *run* method in place of the progress callback, and
+    call *finish* once the pipeline has finished.
+    """
+    def __init__(self, progress=None):
+        """
+        Initializes the timer
+
+        :param progress: Passed all of the progress the pipeline reports
+        :type progress: callable
+        """
+        self._progress = progress
+        self._stage = None
+        self._number = None
+        self._start = None
+
+    def __call__(self, progress):
+        if progress.stage_number != self._number:
+            self.finish()
+            self._stage = progress.stage
+            self._number = progress.stage_number
+            self._start = time.perf_counter()
+
+        if self._progress:
+            self._progress(progress)
+
+    def finish(self):
+        """
+        Records the time taken by the current stage
+        """
+        if self._stage:
+            self.record(self._stage, time.perf_counter() - self._start)
+            self._stage = None
+
+    def record(self, stage, seconds):
+        """
+        Records how long a stage took. Does nothing by default.
+
+        :param stage: The name of the stage
+        :type stage: str
+        :param seconds: How long the stage took
+        :type seconds: float
+        """
+
+
 class ASCIIifier(NEAMProcessor):
     """
     Replaces non-ascii characters with ascii equivalents
@@ -186,5 +285,5 @@ class TagExpander(NEAMProcessor):
         return '{}<{}>{} '.format(prefix, tag, words)
 
 
-__all__ = ['ASCIIifier', 'PageReplacer', 'SicReplacer', 'SpaceNormalizer', 'Pipeline', 'PossessionFixer', 'TagExpander']
+__all__ = ['Progress', 'StageTimer', 'ASCIIifier', 'PageReplacer', 'SicReplacer', 'SpaceNormalizer', 'Pipeline', 'PossessionFixer', 'TagExpander']
 
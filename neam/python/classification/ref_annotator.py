@@ -1,21 +1,45 @@
 import re
+from neam.python.classification.entity_registry import EntityRegistry, make_id
 from neam.python.classification.processing import NEAMProcessor
 
 class RefAnnotator(NEAMProcessor):
+    """
+    Sets the ref attribute of named entity tags, and indexes the entities the refs
+    point to in *registry* as it goes. The registry is replaced each time the
+    annotator runs, so it holds the entities of the last document.
+    """
     _DEFAULT_TAGS = ['persName', 'placeName', 'orgName']
+    _REF_PATTERN = re.compile(r'\sref="([^"]*)"')
 
     def __init__(self, tags=None):
         tags = tags or self._DEFAULT_TAGS
         tag_pattern = '|'.join(tags)
-        self._pattern = re.compile('<({})>(.*?)</(?:{})>'.format(tag_pattern, tag_pattern))
+        self._pattern = re.compile(r'<({0})((?:\s[^>]*)?)>(.*?)</(?:{0})>'.format(tag_pattern))
+        self.registry = EntityRegistry()
+        super().__init__(str, str)
 
     def run(self, text):
+        self.registry = EntityRegistry()
         return self._pattern.sub(self._make_ref, text)
 
     def _make_ref(self, match_object):
         tag = match_object.group(1)
-        ne  = match_object.group(2)
-        ref = ne.replace(' ', '_').replace('.', '')
+        attributes = match_object.group(2)
+        ne  = match_object.group(3)
 
-        return '<{} ref="#{}">{}</{}>'.format(tag, ref, ne, tag)
+        # Entities that already have a ref, such as from a gazetteer, keep it, unless
+        # it is the ID of an entity of another type. Only refs to entities within the
+        # document are indexed.
+        existing = self._REF_PATTERN.search(attributes)
+        if existing:
+            if not existing.group(1).startswith('#'):
+                return match_object.group(0)
+            ref = self.registry.add(tag, ne, existing.group(1))
+            if ref == existing.group(1):
+                return match_object.group(0)
+            attributes = self._REF_PATTERN.sub(' ref="{}"'.format(ref), attributes, count=1)
+            return '<{}{}>{}</{}>'.format(tag, attributes, ne, tag)
 
+        ref = self.registry.add(tag, ne, '#' + make_id(ne))
+
+        return '<{} ref="{}"{}>{}</{}>'.format(tag, ref, attributes, ne, tag)
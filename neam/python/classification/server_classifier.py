@@ -0,0 +1,195 @@
+"""
+server_classifier.py
+
+Defines a named entity classifier that sends text to a Stanford CoreNLP server over
+HTTP, rather than running CoreNLP in a JVM of its own. Running CoreNLP in process ties
+every worker to a JVM with a 4GB heap; with a server, many lightweight workers can share
+a few large JVMs.
+
+To start a server from the CoreNLP directory:
+    java -mx4g -cp "*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -port 9000
+
+Paragraphs are sent in batches, as a single document with a paragraph on each line, over
+a pool of keep-alive connections. The entity mentions the server finds are marked up with
+the same TEI tags as the in-process classifier.
+"""
+import json
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from neam.python.classification.classifier import NERClassifier, CORE_NLP_DEFAULTS, DEFAULT_TAGS
+
+DEFAULT_URL = 'http://localhost:9000'
+
+SERVER_DEFAULTS = {
+    'outputFormat': 'json',
+    # a batch has a paragraph on each line, and no sentence, or entity, may cross them
+    'ssplit.newlineIsSentenceBreak': 'always'
+}
+
+
+class ServerClassifier(NERClassifier):
+    """
+    Classifies named entities with a Stanford CoreNLP server
+    """
+    def __init__(self, url=DEFAULT_URL, options=None, tags=None, batch_chars=20000, connections=4,
+                 timeout=(5, 120), retries=3):
+        """
+        :param url: The address of the server
+        :type url: str
+        :param options: CoreNLP properties to override the defaults with. Any files they
+                        name, such as *ner.model*, are read by the server.
+        :type options: dict of str: str
+        :param tags: Maps CoreNLP's entity types to TEI tags
+        :type tags: dict of str: str
+        :param batch_chars: About how many characters to send to the server at once. A
+                            paragraph longer than this is sent on its own, and the server
+                            rejects documents longer than its -maxCharLength.
+        :type batch_chars: int
+        :param connections: How many batches to send to the server at once
+        :type connections: int
+        :param timeout: How many seconds to wait to connect to the server, and for it to
+                        annotate a batch
+        :type timeout: tuple of (float, float)
+        :param retries: How many times to retry a batch the server couldn't be reached
+                        for, or failed on
+        :type retries: int
+        """
+        props = CORE_NLP_DEFAULTS.copy()
+        if options:
+            props.update(options)
+        props.update(SERVER_DEFAULTS)
+
+        self._url = url
+        self._params = {'properties': json.dumps(props)}
+        self._tags = tags or DEFAULT_TAGS
+        self._batch_chars = batch_chars
+        self._connections = connections
+        self._timeout = timeout
+
+        # POST isn't retried by default, but annotating the same text again is harmless
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                      allowed_methods=['POST'], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        super().__init__(self._tags)
+
+    def classify(self, text):
+        return next(iter(self.classify_all([text])))
+
+    def classify_all(self, texts):
+        texts = [text.replace('\n', ' ') for text in texts]
+        with ThreadPoolExecutor(max_workers=self._connections) as executor:
+            for tagged in executor.map(self._classify_batch, self._batches(texts)):
+                yield from tagged
+
+    def _batches(self, texts):
+        """
+        Groups paragraphs into batches of about *batch_chars* characters
+
+        :param texts: The text of each paragraph, without newlines
+        :type texts: list of str
+        :return: The paragraphs of each batch
+        :rtype: generator of list of str
+        """
+        batch = []
+        size = 0
+        for text in texts:
+            if batch and size + len(text) > self._batch_chars:
+                yield batch
+                batch = []
+                size = 0
+            batch.append(text)
+            size += len(text) + 1
+        if batch:
+            yield batch
+
+    def _classify_batch(self, texts):
+        """
+        Sends a batch of paragraphs to the server and marks up the entities it finds
+
+        :param texts: The text of each paragraph, without newlines
+        :type texts: list of str
+        :return: The marked up text of each paragraph
+        :rtype: list of str
+        """
+        document = '\n'.join(texts)
+        response = self._session.post(self._url, params=self._params, data=document.encode('utf-8'),
+                                      timeout=self._timeout)
+        response.raise_for_status()
+        annotation = response.json()
+
+        # where each paragraph starts in the document, and the entities found in each
+        starts = []
+        position = 0
+        for text in texts:
+            starts.append(position)
+            position += len(text) + 1
+        mentions = [[] for _ in texts]
+
+        index = _python_offsets(document)
+        for sentence in annotation.get('sentences', []):
+            for mention in sentence.get('entitymentions', []):
+                start = index(mention['characterOffsetBegin'])
+                end = index(mention['characterOffsetEnd'])
+                paragraph = bisect_right(starts, start) - 1
+                offset = starts[paragraph]
+                mentions[paragraph].append((start - offset, end - offset, mention['ner']))
+
+        return [tag_mentions(text, found, self._tags) for text, found in zip(texts, mentions)]
+
+
+def tag_mentions(text, mentions, tags):
+    """
+    Marks up the entity mentions found in a paragraph, in the same way as
+    NEAMClassifier.tagDocument. A mention that overlaps an earlier one is left out, and
+    a mention whose type doesn't map to one of the TEI tags is left untagged.
+
+    :param text: The paragraph
+    :type text: str
+    :param mentions: Where each mention starts and ends in the text, and its type
+    :type mentions: list of (int, int, str)
+    :param tags: Maps CoreNLP's entity types to TEI tags
+    :type tags: dict of str: str
+    :return: The paragraph, with the mentions tagged
+    :rtype: str
+    """
+    acceptable = set(tags.values())
+    builder = []
+    last = 0
+    for start, end, label in sorted(mentions):
+        tag = tags.get(label, label)
+        if start < last or tag not in acceptable:
+            continue
+        builder.append(text[last:start])
+        builder.append('<{0}>{1}</{0}>'.format(tag, text[start:end]))
+        last = end
+    builder.append(text[last:])
+    return ''.join(builder)
+
+
+def _python_offsets(text):
+    """
+    CoreNLP counts characters as Java does, in UTF-16 code units, so a character outside
+    the Basic Multilingual Plane counts as two
+
+    :param text: The text CoreNLP annotated
+    :type text: str
+    :return: A function that converts a CoreNLP character offset to a Python one
+    :rtype: function
+    """
+    if len(text.encode('utf-16-le')) == 2 * len(text):
+        return lambda offset: offset
+
+    offsets = []
+    for i, char in enumerate(text):
+        offsets.extend([i] * (2 if ord(char) > 0xFFFF else 1))
+    offsets.append(len(text))
+    return offsets.__getitem__
@@ -3,6 +3,7 @@ Processor for retagging named entities using Wikidata
 """
 from collections import OrderedDict
 from bs4 import BeautifulSoup
+from lxml import etree
 from neam.python.classification.processing import NEAMProcessor
 from neam.python.query import wiki
 
@@ -18,7 +19,7 @@ class WikiRetagger(NEAMProcessor):
         ('Organization', 'orgName')
     ])
 
-    def __init__(self, tags=None, tagmap=None):
+    def __init__(self, tags=None, tagmap=None, parser='xml', memo_size=0):
         """
         Initializes the processor
 
@@ -26,9 +27,24 @@ class WikiRetagger(NEAMProcessor):
         :type tags: list of str
         :param tagmap: A mapping from Wikipedia tags to TEI tags
         :type tagmap: dict of str: str
+        :param parser: How to parse the text, either 'xml' for BeautifulSoup or
+                       'lxml' to work on an lxml tree directly
+        :type parser: str
+        :param memo_size: How many entities to remember the retagging of from one
+                          document to the next, such as for the life of a worker,
+                          dropping the least recently used first. By default, each is
+                          only remembered within a document, so that corrections to
+                          Wikidata are picked up by the next document.
+        :type memo_size: int
         """
-        self._tags = tags or self._DEFAULT_TAGS
+        if parser not in ('xml', 'lxml'):
+            raise ValueError('Unknown parser: {}'.format(parser))
+
+        self._tags = [tag for tag in tags or [] if tag] or self._DEFAULT_TAGS
         self._tagmap = tagmap or self._DEFAULT_TAGMAP
+        self._parser = parser
+        self._memo = OrderedDict() if memo_size else None
+        self._memo_size = memo_size
         super().__init__(str, str)
 
     def run(self, text):
@@ -42,23 +58,98 @@ class WikiRetagger(NEAMProcessor):
         :return: The retagged text
         :rtype: str
         """
+        if self._parser == 'lxml':
+            return self._run_lxml(text)
+
         # Parse the text to get the XML structure
         soup = BeautifulSoup(text, 'xml')
+        memo = self._new_memo()
 
         # Run through each NE tag and evaluate it
+        done = 0
+        total = len(soup.find_all(self._tags))
         for tag in self._tags:
             for element in soup.find_all(tag):
-                named_entity = ' '.join(element.stripped_strings)
-                retag = self.retag(named_entity)
+                # Entities with a ref have already been resolved, by a gazetteer
+                if not element.get('ref'):
+                    named_entity = ' '.join(element.stripped_strings)
+                    retag = self._decide(named_entity, memo)
+
+                    if retag:
+                        new_tag = self._tagmap[retag]
+                        element.name = new_tag
+                    else:
+                        element.name = tag
 
-                if retag:
-                    new_tag = self._tagmap[retag]
-                    element.name = new_tag
-                else:
-                    element.name = tag
+                # Retagged elements can come up again under their new tag
+                done += 1
+                self.progress(min(done, total), total)
 
         return str(soup.body)
 
+    def _run_lxml(self, text):
+        """
+        Runs a block of text through the retagger using lxml rather than
+        BeautifulSoup. The output is the same as that of *run*.
+
+        :param text: The text to run through the tagger
+        :type text: str
+        :return: The retagged text
+        :rtype: str
+        """
+        root = etree.fromstring(text, etree.XMLParser(huge_tree=True))
+        body = root if root.tag == 'body' else root.find('.//body')
+        memo = self._new_memo()
+
+        done = 0
+        total = sum(1 for _ in root.iter(*self._tags))
+        for tag in self._tags:
+            # Gather the elements up front, since renaming them changes what matches
+            for element in list(root.iter(tag)):
+                if not element.get('ref'):
+                    named_entity = ' '.join(s.strip() for s in element.itertext() if s.strip())
+                    retag = self._decide(named_entity, memo)
+
+                    if retag:
+                        element.tag = self._tagmap[retag]
+
+                # Retagged elements can come up again under their new tag
+                done += 1
+                self.progress(min(done, total), total)
+
+        return etree.tostring(body, encoding='unicode', with_tail=False)
+
+    def _new_memo(self):
+        """
+        :return: Where to remember how each entity in a document was retagged
+        :rtype: OrderedDict of str: Union[str, None]
+        """
+        return self._memo if self._memo is not None else OrderedDict()
+
+    def _decide(self, named_entity, memo):
+        """
+        Retags an entity, unless an entity with the same name has been retagged already,
+        in which case the same decision is made without asking Wikidata again
+
+        :param named_entity: The text of the entity
+        :type named_entity: str
+        :param memo: The decisions made so far, by the entity's text with its whitespace
+                     normalized
+        :type memo: OrderedDict of str: Union[str, None]
+        :return: The Wikidata type the entity is an instance of, if it is one in the
+                 tag map
+        :rtype: Union[str, None]
+        """
+        key = ' '.join(named_entity.split())
+        if key in memo:
+            memo.move_to_end(key)
+            return memo[key]
+
+        decision = memo[key] = self.retag(key)
+        if memo is self._memo and len(memo) > self._memo_size:
+            memo.popitem(last=False)
+        return decision
+
     def retag(self, tag):
         entity = wiki.Entity(tag)
         matches = entity.which(self._tagmap.keys())
@@ -3,13 +3,36 @@
 evaluate.py
 
 Evaluates a set of tagged data against a gold standard. Provides both MUC and CoNLL-style
-calculates of precision, recall, and f-measure.
+calculates of precision, recall, and f-measure, and a confusion matrix of the tag types.
+
+Both documents are turned into sets of entity spans (start, end, type) before they are
+scored, so nested and adjacent entities are each counted on their own.
+
+The files are read a piece at a time and tokenized as they are parsed, and only the
+entities and the tokens inside them are kept, so large files can be evaluated without
+holding the whole document in memory.
+
+With --corpus, evaluates many pairs of test and gold files in parallel instead, and
+reports micro- and macro-averaged scores over all of them. The pairs are read from a
+manifest, with a tab-separated test and gold path on each line, or from a directory
+with test/ and gold/ subdirectories holding files of the same names.
 
 :author: Sunny Woldenga-Racine
 """
-from bs4 import BeautifulSoup
+from collections import Counter, deque, namedtuple
+from contextlib import redirect_stdout
+from html.parser import HTMLParser
+from itertools import islice, zip_longest
+from multiprocessing import Pool
+import argparse
+import io
+import json
+import math
+import numpy as np
+import os
 import re
 import sys
+from xml.sax.saxutils import escape
 
 
 # the tags we want to keep in the gold standard
@@ -20,6 +43,40 @@ KEEP_TAGS = ['persname', 'placename', 'orgname']
 EVAL_TAGS = ['persname', 'placename', 'orgname']
 
 
+# patterns used on every document or token, compiled once
+PUNCT = re.escape('!"#$%&\'()*+,-.:;=?@[\\]^_`{|}~’‘')
+PUNCT_AFTER = re.compile(r'([%s])(\W|$)' % re.escape(PUNCT))
+PUNCT_BEFORE = re.compile(r'(\W|^)([%s])' % re.escape(PUNCT))
+APOSTROPHE = re.compile(r'(\w)(\')(\w)')
+NAME_ATTRS = re.compile(r'<(persname|placename|orgname)\s[^>]*>')
+INNER_OPEN = re.compile(r'<(persname|placename|orgname)>\s+')
+INNER_CLOSE = re.compile(r'\s+</(persname|placename|orgname)>')
+PAGE_BREAK = re.compile(r'<pb.+?>')
+PAGE_NUMBER = re.compile(r'PAGE \d+')
+ANY_TAG = re.compile(r'</?.+?>')
+TAG_NAME = re.compile(r'\w+')
+TOKEN_TAG = re.compile(r'</?\w+>')
+TOKEN_TAG_PARTS = re.compile(r'<(/?)(\w+)>')
+LAST_WORD = re.compile(r'\S*\s*$')
+
+# how much of a file to read at a time when streaming it
+CHUNK_SIZE = 1 << 16
+# how many entities to collect before scoring them, when streaming
+SCORE_BATCH = 1000
+
+# the label used in the confusion matrix for a missing entity
+NO_TAG = 'none'
+
+
+# a tokenized document: each token as it appears, and in parallel the token with its
+# tags removed and the tags on it, in order, as (whether it is a closing tag, tag name)
+Tokens = namedtuple('Tokens', ['tokens', 'words', 'tags'])
+# an entity, from its first to its last token
+Span = namedtuple('Span', ['start', 'end', 'tag'])
+# the MUC totals and the CoNLL counts by tag, and the confusion matrix of the tag types
+Scores = namedtuple('Scores', ['muc', 'conll', 'confusion'])
+
+
 def clean_gold(soup):
     """
     Tidies up the gold standard for evaluation. Removes tags that aren't being evaluated,
@@ -32,21 +89,13 @@ def clean_gold(soup):
     # convert to string
     str_soup = str(spaced)
     # remove tag attributes
-    str_soup = re.sub(r'<persname.+?>', '<persname>', str_soup)
-    str_soup = re.sub(r'<placename.+?>', '<placename>', str_soup)
-    str_soup = re.sub(r'<orgname.+?>', '<orgname>', str_soup)
+    str_soup = NAME_ATTRS.sub(r'<\1>', str_soup)
     # remove any whitespace before a closing tag or after opening tag
     str_soup = strip_inner_tag(str_soup)
     # turn page breaks into line breaks
-    str_soup = re.sub(r'<pb.+?>', '\n', str_soup)
-    # get the tags present in the text
-    tags = set(re.findall(r'</?.+?>', str_soup))
+    str_soup = PAGE_BREAK.sub('\n', str_soup)
     # remove tags which we do not want to keep
-    for tag in tags:
-        tag_name = re.search(r'\w+', tag)
-        if tag_name.group(0) not in KEEP_TAGS:
-            str_soup = re.sub(re.escape(tag), '', str_soup)
-    return str_soup
+    return remove_tags(str_soup, KEEP_TAGS)
 
 
 def clean_test(soup):
@@ -64,18 +113,30 @@ def clean_test(soup):
     str_soup = strip_inner_tag(str_soup)
     # remove the BOM char which literally no one likes
     str_soup = str_soup.replace('\ufeff', '')
-    # get the tags present in the text
-    tags = set(re.findall(r'</?.+?>', str_soup))
     # remove tags which we do not want to keep
-    for tag in tags:
-        tag_name = re.search(r'\w+', tag)
-        if tag_name.group(0) not in EVAL_TAGS:
-            str_soup = re.sub(tag, '', str_soup)
+    str_soup = remove_tags(str_soup, EVAL_TAGS)
     # remove page information
-    str_soup = re.sub(r'PAGE \d+', '', str_soup)
+    str_soup = PAGE_NUMBER.sub('', str_soup)
     return str_soup
 
 
+def remove_tags(text, keep):
+    """
+    Removes every tag from the text except for those with the given names, in a
+    single pass.
+    :param text: text to remove tags from
+    :param keep: the names of the tags to keep
+    :return: the text without the other tags
+    """
+    keep = set(keep)
+
+    def replace(match):
+        tag_name = TAG_NAME.search(match.group(0))
+        return match.group(0) if tag_name and tag_name.group(0) in keep else ''
+
+    return ANY_TAG.sub(replace, text)
+
+
 def space_punct(soup):
     """
     Puts whitespace around word-external punctuation and word-internal
@@ -84,15 +145,23 @@ def space_punct(soup):
     :type soup: BeautifulSoup object
     :return: soup object with external punctuation surrounded with whitespace
     """
-    punct = re.escape('!"#$%&\'()*+,-.:;=?@[\\]^_`{|}~’‘')
     for node in soup.find_all(string=lambda x: x.strip()):
-        spaced = re.sub(r'([%s])(\W|$)' % re.escape(punct), r' \1 ', str(node))
-        spaced = re.sub(r'(\W|^)([%s])' % re.escape(punct), r' \2 ', spaced)
-        spaced = re.sub(r'(\w)(\')(\w)', r'\1 \2 \3', spaced)
-        node.replace_with(spaced)
+        node.replace_with(space_text(str(node)))
     return soup
 
 
+def space_text(text):
+    """
+    Puts whitespace around word-external punctuation and word-internal
+    apostrophes in a piece of text.
+    :param text: the text of a single node
+    :return: the text with external punctuation surrounded with whitespace
+    """
+    spaced = PUNCT_AFTER.sub(r' \1 ', text)
+    spaced = PUNCT_BEFORE.sub(r' \2 ', spaced)
+    return APOSTROPHE.sub(r'\1 \2 \3', spaced)
+
+
 def strip_inner_tag(text):
     """
     Strips leading and trailing whitespace within a tag. This prevents an
@@ -101,12 +170,8 @@ def strip_inner_tag(text):
     :param text: text to be stripped
     :return: stripped text
     """
-    stripped_text = re.sub(r'<persname>\s+', '<persname>', text)
-    stripped_text = re.sub(r'\s+</persname>', '</persname>', stripped_text)
-    stripped_text = re.sub(r'<placename>\s+', '<placename>', stripped_text)
-    stripped_text = re.sub(r'\s+</placename>', '</placename>', stripped_text)
-    stripped_text = re.sub(r'<orgname>\s+', '<orgname>', stripped_text)
-    stripped_text = re.sub(r'\s+</orgname>', '</orgname>', stripped_text)
+    stripped_text = INNER_OPEN.sub(r'<\1>', text)
+    stripped_text = INNER_CLOSE.sub(r'</\1>', stripped_text)
     return stripped_text
 
 
@@ -121,6 +186,198 @@ def tokenize(text):
     return tokens
 
 
+def parse_tokens(tokens):
+    """
+    Finds the tags on each token once, so that they can be looked up while
+    checking and scoring the tokens without searching them again.
+    :param tokens: tokens from tokenize
+    :type tokens: list of strings
+    :return: the tokens, with their words and tags
+    :rtype: Tokens
+    """
+    if isinstance(tokens, Tokens):
+        return tokens
+    words = [TOKEN_TAG.sub('', t) for t in tokens]
+    tags = [token_tags(t) for t in tokens]
+    return Tokens(tokens, words, tags)
+
+
+def token_tags(token):
+    """
+    Finds the tags on a token.
+    :param token: a token from tokenize
+    :return: the tags, in order, as (whether it is a closing tag, tag name)
+    :rtype: list of (bool, str)
+    """
+    return [(bool(closing), name) for closing, name in TOKEN_TAG_PARTS.findall(token)]
+
+
+class TokenParser(HTMLParser):
+    """
+    Cleans and tokenizes the body of a document as it is fed to the parser, in the
+    same way as tokenize(clean_gold(soup.body)). Finished tokens are added to
+    *tokens* as soon as they are found.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens = deque()
+        self._text = []  # the text of the current node, which may arrive in pieces
+        self._pending = []  # cleaned text which may still be joined to what comes next
+        self._in_body = False
+        self._done = False
+        self._strip = False  # whether to strip whitespace after a kept opening tag
+        self._last_text = ''  # the text added since the last tag
+
+    def handle_starttag(self, tag, attrs):
+        if self._done:
+            return
+        self._add_text()
+        if not self._in_body:
+            self._in_body = tag == 'body'
+            return
+        # keep the tags being evaluated, without their attributes
+        if tag in KEEP_TAGS:
+            self._pending.append('<{}>'.format(tag))
+            self._strip = True
+            return
+        self._strip = False
+        # turn page breaks into line breaks
+        if tag == 'pb':
+            self._pending.append('\n')
+
+    def handle_endtag(self, tag):
+        if not self._in_body or self._done:
+            return
+        self._add_text()
+        if tag == 'body':
+            self._done = True
+            return
+        self._strip = False
+        # remove any whitespace before a kept closing tag
+        if tag in KEEP_TAGS:
+            text = ''.join(self._pending)
+            trailing = len(self._last_text) - len(self._last_text.rstrip())
+            self._pending = [text[:len(text) - trailing], '</{}>'.format(tag)]
+
+    def handle_data(self, data):
+        if self._in_body and not self._done:
+            self._text.append(data)
+
+    def _add_text(self):
+        # clean the text of a node once all of it has arrived
+        data = ''.join(self._text)
+        self._text = []
+        self._last_text = ''
+        if data.strip():
+            data = escape(space_text(data))
+        if self._strip:
+            data = data.lstrip()
+        if data:
+            self._strip = False
+            self._last_text = data
+            self._pending.append(data)
+            # everything before the last word is finished
+            text = ''.join(self._pending)
+            last = LAST_WORD.search(text).start()
+            self.tokens.extend(text[:last].split())
+            self._pending = [text[last:]]
+
+    def close(self):
+        super().close()
+        self._add_text()
+        self.tokens.extend(''.join(self._pending).split())
+        self._pending = []
+
+
+def stream_tokens(filename):
+    """
+    Reads, cleans, and tokenizes a file for evaluation a piece at a time.
+    :param filename: the file to read, or a file object open for reading text
+    :return: the tokens in the file
+    :rtype: generator of strings
+    """
+    if isinstance(filename, str):
+        with open(filename, 'r', encoding='utf-8', errors="surrogateescape") as f:
+            yield from stream_tokens(f)
+        return
+    parser = TokenParser()
+    for chunk in iter(lambda: filename.read(CHUNK_SIZE), ''):
+        parser.feed(chunk)
+        while parser.tokens:
+            yield parser.tokens.popleft()
+    parser.close()
+    yield from parser.tokens
+
+
+class EntityFinder:
+    """
+    Finds the entities being evaluated in tokens, one token at a time. Each closing
+    tag ends the innermost open tag with the same name, so nested entities are found
+    as well. Tags which are never closed are ignored.
+    """
+    def __init__(self):
+        self.spans = []  # the entities found, ordered by where they end
+        self._open_tags = []  # the tags opened but not yet closed, with where they were opened
+        self._open_entities = 0  # how many of those are being evaluated
+
+    def add(self, i, token_tags):
+        """
+        Finds the entities which start or end at a token.
+        :param i: the position of the token
+        :param token_tags: the tags on the token, from parse_tokens
+        :return: whether the token is part of an entity being evaluated
+        """
+        inside = self.is_open()
+        for closing, name in token_tags:
+            if not closing:
+                self._open_tags.append((name, i))
+                self._open_entities += name in EVAL_TAGS
+                continue
+            # find the innermost tag this closes
+            for j in range(len(self._open_tags) - 1, -1, -1):
+                if self._open_tags[j][0] == name:
+                    if name in EVAL_TAGS:
+                        self.spans.append(Span(self._open_tags[j][1], i, name))
+                        self._open_entities -= 1
+                        inside = True
+                    del self._open_tags[j]
+                    break
+        return inside or self.is_open()
+
+    def is_open(self):
+        """
+        :return: whether an entity being evaluated has been opened but not closed
+        """
+        return self._open_entities > 0
+
+
+class CoveredTokens(dict):
+    """
+    Some of the tokens of a document, by their position, which can be sliced like a
+    list of all of them
+    """
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.get(i, '') for i in range(key.start or 0, key.stop)]
+        return super().__getitem__(key)
+
+
+def entity_spans(tokens):
+    """
+    Finds the entities being evaluated in the tokens. Each closing tag ends the
+    innermost open tag with the same name, so nested entities are found as well.
+    Tags which are never closed are ignored.
+    :param tokens: the tokens to find entities in
+    :type tokens: list of strings or Tokens
+    :return: the entities, ordered by where they end
+    :rtype: list of Span
+    """
+    finder = EntityFinder()
+    for i, token_tags in enumerate(parse_tokens(tokens).tags):
+        finder.add(i, token_tags)
+    return finder.spans
+
+
 def check(test, gold):
     """
     Checks whether all tokens (once tags have been removed) are identical
@@ -131,19 +388,22 @@ def check(test, gold):
     cleaning or tokenizing the data.
     it.
     :param test: list of tokens in the test data
+    :type test: list of strings or Tokens
     :param gold: list of tokens in the gold standard data
+    :type gold: list of strings or Tokens
     :return: whether the lists are the same length
     """
-    for i, t in enumerate(test):
+    test, test_words = parse_tokens(test)[:2]
+    gold, gold_words = parse_tokens(gold)[:2]
+    for i, t1 in enumerate(test_words):
         # avoid IndexError when indexing gold
         if i < len(gold):
-            t1 = re.sub(r'</?\w+>', '', t)
-            t2 = re.sub(r'</?\w+>', '', gold[i])
+            t2 = gold_words[i]
             # if the tokens are different
             if t1 != t2:
                 print('Difference: \'{}\' vs \'{}\''.format(t1, t2))
-                print('Context test = {} {} {} {} {}'.format(test[i-2], test[i-1], test[i], test[i+1], test[i+2]))
-                print('Context gold = {} {} {} {} {}'.format(gold[i-2], gold[i-1], gold[i], gold[i+1], gold[i+2]))
+                print('Context test = {}'.format(' '.join(test[max(i-2, 0):i+3])))
+                print('Context gold = {}'.format(' '.join(gold[max(i-2, 0):i+3])))
                 return False
     if len(test) > len(gold):
         print('Test has more tokens than gold. Extra:')
@@ -166,46 +426,12 @@ def conll_eval(test, gold):
     meaning a tag is only considered correct if both its type and span match
     the gold standard.
     :param test: the data to be tested
-    :type test: list of strings
+    :type test: list of strings or Tokens
     :param gold: the gold standard data
-    :type test: list of strings
+    :type test: list of strings or Tokens
     """
-    counts = {}
-    for tag in EVAL_TAGS:
-        counts[tag] = {'cor': 0,  # number of correct guesses made
-                       'gue': 0,  # total number of guesses made
-                       'pos': 0}  # number of possible correct tags
-    # whether an opening tag in test has been found and matches the gold
-    correct_open = False
-    for i, t1 in enumerate(test):
-        t2 = gold[i]
-        # an opening tag found in test
-        t1_has_left = re.search(r'<(\w+)>', t1)
-        # its closing tag
-        t1_has_right = re.search(r'</\w+>', t1)
-        # an opening tag found in gold
-        if re.search(r'<(\w+)>', t2):
-            gold_tag = re.search(r'<(\w+)>', t2).group(1)
-            if gold_tag in EVAL_TAGS:
-                # increment number of possible correct tags
-                counts[gold_tag]['pos'] = counts[gold_tag]['pos'] + 1
-        # an opening tag found in test
-        if t1_has_left:
-            test_tag = t1_has_left.group(1)
-            # increment number of guesses
-            counts[test_tag]['gue'] = counts[test_tag]['gue'] + 1
-            # if the tag matches the gold at this point
-            if t1 == t2:
-                correct_open = True  # a correct opening tag was found
-        # if a correct opening tag has already been found
-        if correct_open:
-            # if the test's tag has been closed, and that tag matches the gold at this point
-            if t1_has_right and t1 == t2:
-                # exact match found
-                counts[test_tag]['cor'] = counts[test_tag]['cor'] + 1
-                correct_open = False  # reset the opening tag tracker
     # write the results to stdout
-    print_eval('CoNLL', counts)
+    print_eval('CoNLL', score(test, gold).conll)
 
 
 def muc_eval(test, gold):
@@ -214,81 +440,145 @@ def muc_eval(test, gold):
     evaluation, then prints the results. MUC gives points separately for the
     correct tag type and tag span, for a maximum of two points per tag.
     :param test: the data to be tested
-    :type test: list of strings
+    :type test: list of strings or Tokens
     :param gold: the gold standard data
-    :type test: list of strings
+    :type test: list of strings or Tokens
     """
-    counts = {}
-    for tag in EVAL_TAGS:
-        counts[tag] = {'text_cor': 0,  # number of correct spans
-                       'text_gue': 0,  # total span guesses
-                       'text_pos': 0,  # number of possible correct spans
-                       'type_cor': 0,  # number of correct tag types
-                       'type_gue': 0,  # total tag type guesses
-                       'type_pos': 0}  # number of possible correct tag types
-    test_tag = ""  # type of tag found in test, empty if uninitialized
-    test_span = [-1, -1]  # span of tag found in test, -1 if uninitialized
-    gold_tag = ""  # type of tag found in gold, empty if uninitialized
-    gold_span = [-1, -1]  # span of tag found in gold, -1 if uninitialized
-    for i, t1 in enumerate(test):
-        t2 = gold[i]
-        # if the test token has an opening tag
-        if re.search(r'<(\w+)>', t1):
-            test_tag = re.search(r'<(\w+)>', t1).group(1)  # get tag type
-            test_span[0] = i  # get start index of span
-            # increment total guesses
-            counts[test_tag]['text_gue'] = counts[test_tag]['text_gue'] + 1
-            counts[test_tag]['type_gue'] = counts[test_tag]['type_gue'] + 1
-        # if the test token has a closing tag
-        if re.search(r'</(\w+)>', t1):
-            # if the start index of span is initialized (if it's not, it
-            # has been reset and we should do nothing)
-            if test_span[0] != -1:
-                test_span[1] = i  # get end index of span
-        # if the test token has an opening tag
-        if re.search(r'<(\w+)>', t2):
-            gold_tag = re.search(r'<(\w+)>', t2).group(1)  # get tag type
-            gold_span[0] = i  # get start index of span
-            if gold_tag in EVAL_TAGS:
-                # increment total possible correct
-                counts[gold_tag]['text_pos'] = counts[gold_tag]['text_pos'] + 1
-                counts[gold_tag]['type_pos'] = counts[gold_tag]['type_pos'] + 1
-        # if the test token has a closing tag
-        if re.search(r'</(\w+)>', t2):
-            # if the start index of span is initialized (if it's not, it
-            # has been reset and we should do nothing)
-            if gold_span[0] != -1:
-                gold_span[1] = i  # get end index of span
-        # if an open tag has been closed
-        if test_span[1] > -1 or gold_span[1] > -1:
-            incorrect = False  # whether the tag is wrong in some way
-            # if tag types match
-            if test_tag == gold_tag:
-                # increment correct tag type
-                counts[test_tag]['type_cor'] = counts[test_tag]['type_cor'] + 1
-            else:
-                incorrect = True
-            # if tag spans match
-            if test_span == gold_span:
-                # increment correct span
-                counts[test_tag]['text_cor'] = counts[test_tag]['text_cor'] + 1
-            else:
-                incorrect = True
-            # dump incorrect tags to stderr
-            if incorrect:
-                print2err(test_span, gold_span, test, gold)
-            # reset tag variables
-            test_tag = ""
-            test_span = [-1, -1]
-            gold_tag = ""
-            gold_span = [-1, -1]
-    totals = {}
-    for tag in EVAL_TAGS:
-        totals[tag] = {'cor': counts[tag]['text_cor'] + counts[tag]['type_cor'],
-                       'gue': counts[tag]['text_gue'] + counts[tag]['type_gue'],
-                       'pos': counts[tag]['text_pos'] + counts[tag]['type_pos']}
     # write the results to stdout
-    print_eval('MUC', totals)
+    print_eval('MUC', score(test, gold, print2err).muc)
+
+
+def match_spans(test_spans, gold_spans):
+    """
+    Pairs each entity in the test data with the entity it was meant to find in the
+    gold standard. Entities with the same boundaries are paired first, preferring
+    those of the same type, then the rest are paired with the first entity they
+    overlap. Each entity is paired at most once.
+    :param test_spans: entities in the test data
+    :type test_spans: list of Span
+    :param gold_spans: entities in the gold standard data
+    :type gold_spans: list of Span
+    :return: the pairs of test and gold entities, the test entities left unpaired,
+             and the gold entities left unpaired
+    :rtype: tuple of (list of (Span, Span), list of Span, list of Span)
+    """
+    # pair entities with exactly the same span and type
+    exact = Counter(test_spans) & Counter(gold_spans)
+    pairs = [(span, span) for span in exact.elements()]
+    # pair entities with the same boundaries but different types
+    gold_bounds = {}
+    gold_exact = exact.copy()
+    for span in gold_spans:
+        if gold_exact[span]:
+            gold_exact[span] -= 1
+        else:
+            gold_bounds.setdefault(span[:2], []).append(span)
+    test_left = []
+    test_exact = exact.copy()
+    for span in test_spans:
+        if test_exact[span]:
+            test_exact[span] -= 1
+            continue
+        same_bounds = gold_bounds.get(span[:2])
+        if same_bounds:
+            pairs.append((span, same_bounds.pop()))
+        else:
+            test_left.append(span)
+    gold_left = sorted(span for spans in gold_bounds.values() for span in spans)
+    # pair overlapping entities, sweeping through both in order of their starts
+    test_left.sort()
+    test_unpaired = []
+    gold_unpaired = []
+    i = j = 0
+    while i < len(test_left) and j < len(gold_left):
+        if test_left[i].end < gold_left[j].start:
+            test_unpaired.append(test_left[i])
+            i += 1
+        elif gold_left[j].end < test_left[i].start:
+            gold_unpaired.append(gold_left[j])
+            j += 1
+        else:
+            pairs.append((test_left[i], gold_left[j]))
+            i += 1
+            j += 1
+    test_unpaired.extend(test_left[i:])
+    gold_unpaired.extend(gold_left[j:])
+    return pairs, test_unpaired, gold_unpaired
+
+
+def score(test, gold, on_error=None):
+    """
+    Counts the correct guesses, total guesses, and possible correct tags for
+    both MUC and CoNLL style evaluation, and how often each type of gold entity
+    was tagged as each type, from the entities in the data.
+    :param test: the data to be tested
+    :type test: list of strings or Tokens
+    :param gold: the gold standard data
+    :type test: list of strings or Tokens
+    :param on_error: called with the test span, gold span, test tokens and gold
+                     tokens of each tag MUC finds to be wrong
+    :return: the MUC totals and the CoNLL counts by tag, and the confusion matrix
+             with a row for each gold type and a column for each test type, in the
+             order of EVAL_TAGS followed by NO_TAG
+    :rtype: Scores
+    """
+    test = parse_tokens(test)
+    gold = parse_tokens(gold)
+    return score_spans(entity_spans(test), entity_spans(gold), on_error, test.tokens, gold.tokens)
+
+
+def score_spans(test_spans, gold_spans, on_error=None, test_tokens=None, gold_tokens=None):
+    """
+    Scores the entities found in the test data against those in the gold standard,
+    as score does.
+    :param test_spans: entities in the test data
+    :type test_spans: list of Span
+    :param gold_spans: entities in the gold standard data
+    :type gold_spans: list of Span
+    :param on_error: called with the test span, gold span, test tokens and gold
+                     tokens of each tag MUC finds to be wrong
+    :param test_tokens: the tokens in the test data, passed to on_error
+    :param gold_tokens: the tokens in the gold standard data, passed to on_error
+    :return: the MUC totals and the CoNLL counts by tag, and the confusion matrix
+    :rtype: Scores
+    """
+    pairs, test_unpaired, gold_unpaired = match_spans(test_spans, gold_spans)
+    # number each tag, with one more for entities which are missing
+    labels = {tag: n for n, tag in enumerate(EVAL_TAGS)}
+    k = len(EVAL_TAGS)
+
+    def count(spans):
+        return np.bincount(np.array([labels[span.tag] for span in spans], dtype=int), minlength=k)
+
+    guesses = count(test_spans)
+    possible = count(gold_spans)
+    # CoNLL: an entity is correct only if its span and type are both in the gold
+    conll_correct = count(t for t, g in pairs if t == g)
+    # MUC: a point for each correct span and each correct type, credited to the test's type
+    test_types = np.array([labels[t.tag] for t, g in pairs], dtype=int)
+    gold_types = np.array([labels[g.tag] for t, g in pairs], dtype=int)
+    same_span = np.array([t[:2] == g[:2] for t, g in pairs], dtype=bool)
+    same_type = test_types == gold_types
+    muc_correct = (np.bincount(test_types[same_span], minlength=k) +
+                   np.bincount(test_types[same_type], minlength=k))
+    # the confusion matrix, with the last row and column for missing entities
+    confusion = np.zeros((k + 1, k + 1), dtype=int)
+    np.add.at(confusion, (gold_types, test_types), 1)
+    np.add.at(confusion, (k, [labels[span.tag] for span in test_unpaired]), 1)
+    np.add.at(confusion, ([labels[span.tag] for span in gold_unpaired], k), 1)
+    # report incorrect tags, in the order they appear
+    if on_error:
+        errors = [([t.start, t.end], [g.start, g.end]) for t, g in pairs if t != g]
+        errors.extend(([t.start, t.end], [-1, -1]) for t in test_unpaired)
+        errors.extend(([-1, -1], [g.start, g.end]) for g in gold_unpaired)
+        for test_span, gold_span in sorted(errors, key=lambda e: max(e[0][1], e[1][1])):
+            on_error(test_span, gold_span, test_tokens, gold_tokens)
+    muc = {}
+    conll = {}
+    for tag, n in labels.items():
+        muc[tag] = {'cor': int(muc_correct[n]), 'gue': 2 * int(guesses[n]), 'pos': 2 * int(possible[n])}
+        conll[tag] = {'cor': int(conll_correct[n]), 'gue': int(guesses[n]), 'pos': int(possible[n])}
+    return Scores(muc, conll, confusion)
 
 
 def print2err(test_span, gold_span, test_tokens, gold_tokens):
@@ -314,22 +604,20 @@ def print2err(test_span, gold_span, test_tokens, gold_tokens):
     print("[{}] VS [{}]".format(test_text, gold_text), file=sys.stderr)
 
 
-def print_eval(name, totals):
+def accuracy(totals):
     """
-    Writes the precision, recall, and f-measure of the input counts to stdout, with
-    the name of the evaluation style used.
-    :param name: name of evaluation style used
+    Calculates the precision, recall, and f-measure of each tag, and of all tags
+    together.
     :param totals: the counts for correct, guesses, and possible tags
+    :return: the precision, recall, and f-measure for every tag, then for 'Total'
+    :rtype: list of (str, [float, float, float])
     """
-    cols = ['Precision', 'Recall', 'F-measure']  # columns out output table
     rows = []  # rows of output table
     total_cor = 0  # total correct guesses for all tags
     total_gue = 0  # total guesses for all tags
     total_pos = 0  # total possible correct guesses for all tags
-    accuracy = []  # precision, recall, and f-measure for every tag
     # for every tag
     for tag in EVAL_TAGS:
-        rows.append(tag)  # make a row for it
         # increment total counts
         total_cor += totals[tag]['cor']
         total_gue += totals[tag]['gue']
@@ -338,18 +626,37 @@ def print_eval(name, totals):
         precision = safe_divide(totals[tag]['cor'], totals[tag]['gue'])
         recall = safe_divide(totals[tag]['cor'], totals[tag]['pos'])
         fmeasure = 2 * safe_divide(precision * recall, precision + recall)
-        # add figures to master list
-        accuracy.append([precision, recall, fmeasure])
-    # make a row for the total accuracy of all tags
-    rows.append('Total')
+        # add a row for it
+        rows.append((tag, [precision, recall, fmeasure]))
     # get total precision, recall, and f-measure
     total_precision = safe_divide(total_cor, total_gue)
     total_recall = safe_divide(total_cor, total_pos)
     total_fmeasure = 2 * safe_divide(total_precision * total_recall, total_precision + total_recall)
-    # add figures to master list
-    accuracy.append([total_precision, total_recall, total_fmeasure])
+    # make a row for the total accuracy of all tags
+    rows.append(('Total', [total_precision, total_recall, total_fmeasure]))
+    return rows
+
+
+def print_eval(name, totals):
+    """
+    Writes the precision, recall, and f-measure of the input counts to stdout, with
+    the name of the evaluation style used.
+    :param name: name of evaluation style used
+    :param totals: the counts for correct, guesses, and possible tags
+    """
+    print_accuracy(name, accuracy(totals))
+
+
+def print_accuracy(name, rows):
+    """
+    Writes a table of precision, recall, and f-measure to stdout, with the name of
+    the evaluation style used.
+    :param name: name of evaluation style used
+    :param rows: the precision, recall, and f-measure of each tag, from accuracy
+    """
+    cols = ['Precision', 'Recall', 'F-measure']  # columns out output table
     # get the column width
-    max_width = max(len(x) for x in cols + rows) + 2
+    max_width = max(len(x) for x in cols + [tag for tag, _ in rows]) + 2
     # create the format for text cells
     text_align = '{:>%d}' % max_width
     # create the format for numerical cells
@@ -360,12 +667,29 @@ def print_eval(name, totals):
     # print the table
     print('\n%s-Style Evaluation Results:' % name)
     print(first_row.format("", *cols))
-    for i, tag in enumerate(rows):
-        vals = accuracy[i]
+    for tag, vals in rows:
         print(text_align.format(tag), end="")
         print(num_align.format(*vals))
 
 
+def print_confusion(confusion):
+    """
+    Writes the confusion matrix of the tag types to stdout.
+    :param confusion: how often each gold type (rows) was tagged as each test type
+                      (columns), from score
+    """
+    labels = EVAL_TAGS + [NO_TAG]
+    # get the column width
+    max_width = max(len(x) for x in labels + ['gold \\ test']) + 2
+    # create the format for cells
+    align = '{:>%d}' % max_width
+    # print the table
+    print('\nConfusion Matrix:')
+    print((align * (len(labels) + 1)).format('gold \\ test', *labels))
+    for tag, row in zip(labels, confusion):
+        print((align * (len(labels) + 1)).format(tag, *row))
+
+
 def safe_divide(x, y):
     """
     Divides two numbers, or returns NaN if the denominator is 0.
@@ -379,32 +703,265 @@ def safe_divide(x, y):
         return float('nan')
 
 
-def main():
-    # get the command line arguments
+def evaluate_files(test_file, gold_file, on_error=None):
+    """
+    Scores a test file against its gold standard, reading both a piece at a time.
+    If their tokens don't line up, prints where they differ as check does.
+    :param test_file: the file to be tested, or a file object open for reading text
+    :param gold_file: the gold standard file, or a file object open for reading text
+    :param on_error: called with the test span, gold span, test tokens and gold
+                     tokens of each tag MUC finds to be wrong
+    :return: the scores, or None if the tokens don't line up. Any errors found
+             before the tokens stop lining up will already have been reported.
+    :rtype: Scores
+    """
+    scores = None
+    test_finder = EntityFinder()
+    gold_finder = EntityFinder()
+    # only the tokens inside entities are kept, for reporting errors
+    test_covered = CoveredTokens()
+    gold_covered = CoveredTokens()
+    recent = deque(maxlen=2)  # the last two pairs of tokens, for context
+    test_tokens = stream_tokens(test_file)
+    gold_tokens = stream_tokens(gold_file)
+    for i, (t1, t2) in enumerate(zip_longest(test_tokens, gold_tokens)):
+        if t1 is None or t2 is None:
+            if t2 is None:
+                print('Test has more tokens than gold. Extra:')
+                extra = test_tokens
+            else:
+                print('Gold has more tokens than test. Extra:')
+                extra = gold_tokens
+            print(t1 or t2)
+            for t in extra:
+                print(t)
+            return None
+        # if the tokens are different
+        w1 = TOKEN_TAG.sub('', t1)
+        w2 = TOKEN_TAG.sub('', t2)
+        if w1 != w2:
+            test_context = [t for t, _ in recent] + [t1] + list(islice(test_tokens, 2))
+            gold_context = [g for _, g in recent] + [t2] + list(islice(gold_tokens, 2))
+            print('Difference: \'{}\' vs \'{}\''.format(w1, w2))
+            print('Context test = {}'.format(' '.join(test_context)))
+            print('Context gold = {}'.format(' '.join(gold_context)))
+            return None
+        recent.append((t1, t2))
+        in_test = test_finder.add(i, token_tags(t1))
+        in_gold = gold_finder.add(i, token_tags(t2))
+        if in_test or in_gold:
+            test_covered[i] = t1
+            gold_covered[i] = t2
+        # once no entity is open, the entities found so far can't overlap any to come,
+        # so score them and let them go
+        if (len(test_finder.spans) + len(gold_finder.spans) >= SCORE_BATCH and not test_finder.is_open() and
+                not gold_finder.is_open()):
+            scores = add_scores(scores, score_spans(test_finder.spans, gold_finder.spans, on_error,
+                                                    test_covered, gold_covered))
+            test_finder.spans, gold_finder.spans = [], []
+            test_covered.clear()
+            gold_covered.clear()
+    return add_scores(scores, score_spans(test_finder.spans, gold_finder.spans, on_error, test_covered, gold_covered))
+
+
+def add_scores(a, b):
+    """
+    Adds together the scores of two parts of a document.
+    :param a: the scores of one part, or None
+    :type a: Scores
+    :param b: the scores of the other
+    :type b: Scores
+    :return: the scores of both parts
+    :rtype: Scores
+    """
+    if a is None:
+        return b
+    muc = {tag: {count: a.muc[tag][count] + b.muc[tag][count] for count in a.muc[tag]} for tag in a.muc}
+    conll = {tag: {count: a.conll[tag][count] + b.conll[tag][count] for count in a.conll[tag]} for tag in a.conll}
+    return Scores(muc, conll, a.confusion + b.confusion)
+
+
+def read_pairs(path):
+    """
+    Finds the pairs of test and gold files in a corpus.
+    :param path: a manifest with a tab-separated test and gold path on each line,
+                 relative to the manifest, or a directory with test/ and gold/
+                 subdirectories holding files of the same names
+    :return: the paths of each test file and its gold standard
+    :rtype: list of (str, str)
+    """
+    if os.path.isdir(path):
+        test_dir = os.path.join(path, 'test')
+        gold_dir = os.path.join(path, 'gold')
+        names = sorted(set(os.listdir(test_dir)) & set(os.listdir(gold_dir)))
+        return [(os.path.join(test_dir, name), os.path.join(gold_dir, name)) for name in names]
+    base = os.path.dirname(path)
+    pairs = []
+    with open(path, encoding='utf-8') as manifest:
+        for line in manifest:
+            # skip blank lines and comments
+            if line.strip() and not line.startswith('#'):
+                test_file, gold_file = line.rstrip('\n').split('\t')
+                pairs.append((os.path.join(base, test_file), os.path.join(base, gold_file)))
+    return pairs
+
+
+def evaluate_pair(pair):
+    """
+    Scores one test file of a corpus against its gold standard.
+    :param pair: the paths of the test file and its gold standard
+    :type pair: tuple of (str, str)
+    :return: the paths, and either the counts for the pair or why it could not be
+             scored
+    :rtype: dict
+    """
+    result = {'test': pair[0], 'gold': pair[1]}
     try:
-        testfile = sys.argv[1]
-        goldfile = sys.argv[2]
-    except IndexError:
+        # keep the reason the tokens don't line up, rather than printing it
+        differences = io.StringIO()
+        with redirect_stdout(differences):
+            scores = evaluate_files(pair[0], pair[1])
+        if not scores:
+            result['error'] = differences.getvalue().strip()
+            return result
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+        return result
+    result['muc'] = scores.muc
+    result['conll'] = scores.conll
+    result['confusion'] = scores.confusion.tolist()
+    return result
+
+
+def set_eval_tags(tags):
+    """
+    Sets the tags to evaluate in a worker process.
+    :param tags: the tags to evaluate
+    """
+    global EVAL_TAGS
+    EVAL_TAGS = tags
+
+
+def json_number(x):
+    """
+    Converts NaN to None, since JSON has no NaN.
+    :param x: a number
+    :return: the number, or None if it is NaN
+    """
+    return None if math.isnan(x) else x
+
+
+def aggregate(results, style):
+    """
+    Averages the scores of the documents in a corpus.
+    :param results: the results of evaluate_pair for each document
+    :param style: 'muc' or 'conll'
+    :return: the micro-averaged counts over every document, and the
+             micro-averaged and macro-averaged precision, recall, and f-measure
+             for each tag
+    :rtype: tuple of (dict, list, list)
+    """
+    scored = [r[style] for r in results if 'error' not in r]
+    # micro-averaging adds up the counts of every document
+    totals = {}
+    for tag in EVAL_TAGS:
+        totals[tag] = {count: sum(r[tag][count] for r in scored) for count in ['cor', 'gue', 'pos']}
+    micro = accuracy(totals)
+    # macro-averaging averages the scores of every document, skipping those where
+    # a score is undefined
+    per_document = np.array([[vals for _, vals in accuracy(r)] for r in scored], dtype=float)
+    macro = []
+    for i, (tag, _) in enumerate(micro):
+        vals = []
+        for j in range(3):
+            defined = per_document[:, i, j][~np.isnan(per_document[:, i, j])] if scored else []
+            vals.append(float(np.mean(defined)) if len(defined) else float('nan'))
+        macro.append((tag, vals))
+    return totals, micro, macro
+
+
+def evaluate_corpus(path, processes=None):
+    """
+    Evaluates every pair of test and gold files in a corpus, in parallel.
+    :param path: a manifest or directory, see read_pairs
+    :param processes: the number of processes to use, or None for one per CPU
+    :return: the report of the evaluation
+    :rtype: dict
+    """
+    pairs = read_pairs(path)
+    with Pool(processes, initializer=set_eval_tags, initargs=(EVAL_TAGS,)) as pool:
+        results = pool.map(evaluate_pair, pairs, chunksize=max(1, len(pairs) // (4 * (processes or os.cpu_count()))))
+    report = {'tags': EVAL_TAGS, 'documents': results}
+    for style in ['muc', 'conll']:
+        totals, micro, macro = aggregate(results, style)
+        report[style] = {
+            'counts': totals,
+            'micro': {tag: dict(zip(['precision', 'recall', 'fmeasure'], map(json_number, vals)))
+                      for tag, vals in micro},
+            'macro': {tag: dict(zip(['precision', 'recall', 'fmeasure'], map(json_number, vals)))
+                      for tag, vals in macro},
+        }
+    confusion = np.zeros((len(EVAL_TAGS) + 1, len(EVAL_TAGS) + 1), dtype=int)
+    for r in results:
+        if 'error' not in r:
+            confusion += np.array(r['confusion'], dtype=int)
+    report['confusion'] = {'labels': EVAL_TAGS + [NO_TAG], 'matrix': confusion.tolist()}
+    return report
+
+
+def print_report(report):
+    """
+    Writes the averaged scores of a corpus, and the documents which could not be
+    scored, to stdout.
+    :param report: the report from evaluate_corpus
+    """
+    failed = [r for r in report['documents'] if 'error' in r]
+    print('Evaluated {} of {} documents'.format(len(report['documents']) - len(failed), len(report['documents'])))
+    for r in failed:
+        print('Could not evaluate {}: {}'.format(r['test'], r['error']))
+    for name, style in [('MUC', 'muc'), ('CoNLL', 'conll')]:
+        for average in ['micro', 'macro']:
+            rows = [(tag, [float('nan') if v is None else v for v in vals.values()])
+                    for tag, vals in report[style][average].items()]
+            print_accuracy('{}-averaged {}'.format(average.capitalize(), name), rows)
+    print_confusion(np.array(report['confusion']['matrix']))
+
+
+def load_args():
+    parser = argparse.ArgumentParser(description='Evaluates tagged data against a gold standard')
+    parser.add_argument('files', nargs='*', metavar='file',
+                        help='The file to be tested and the gold standard file, then optionally the tags to '
+                             'evaluate. With --corpus, only the tags to evaluate.')
+    parser.add_argument('--corpus', help='A manifest or directory of test and gold files to evaluate together')
+    parser.add_argument('--report', help='Where to write the JSON report of a corpus evaluation')
+    parser.add_argument('--processes', type=int, help='The number of processes to evaluate a corpus with')
+    args = parser.parse_args()
+    if not args.corpus and len(args.files) < 2:
         print('Command line arguments needed: file to be tested, gold standard file')
         sys.exit(1)
-    if len(sys.argv) > 3:
+    return args
+
+
+def main():
+    args = load_args()
+    tags = args.files if args.corpus else args.files[2:]
+    if tags:
         global EVAL_TAGS
-        EVAL_TAGS = [x.lower() for x in sys.argv[3:]]
+        EVAL_TAGS = [x.lower() for x in tags]
     EVAL_TAGS.sort()
-    # make soup for test
-    with open(testfile, 'r', encoding='utf-8', errors="surrogateescape") as tf:
-        test = BeautifulSoup(tf, 'html.parser')
-    # make soup for gold
-    with open(goldfile, 'r', encoding='utf-8', errors="surrogateescape") as gf:
-        gold = BeautifulSoup(gf, 'html.parser')
-    # clean and tokenize the data
-    test = tokenize(clean_gold(test.body))
-    gold = tokenize(clean_gold(gold.body))
-    # ensure the data are formatted for evaluation
-    if check(test, gold):
-        # evaluate using CoNLL and MUC style evaluation
-        muc_eval(test, gold)
-        conll_eval(test, gold)
+    if args.corpus:
+        report = evaluate_corpus(args.corpus, args.processes)
+        print_report(report)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        return
+    # evaluate using CoNLL and MUC style evaluation, if the data line up
+    scores = evaluate_files(args.files[0], args.files[1], print2err)
+    if scores:
+        print_eval('MUC', scores.muc)
+        print_eval('CoNLL', scores.conll)
+        print_confusion(scores.confusion)
 
 
 if __name__ == '__main__':
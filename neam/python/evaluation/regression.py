@@ -0,0 +1,232 @@
+"""
+regression.py
+
+Measures the effect of a pipeline change on both accuracy and speed. Annotates a
+document, evaluates the output against a gold standard, and reports precision, recall
+and f-measure alongside how long each stage of the pipeline took and how much memory
+the process had used by the end of it. The memory is the high-water mark of the whole
+process, which only ever grows, so each stage's figure includes every stage before it.
+It can't be measured on Windows.
+
+A report can be saved as JSON and used as the baseline for a later run, which fails if
+f-measure has dropped or the pipeline has slowed down by more than a threshold.
+
+Use:
+    python neam.py diary.txt --gs gold.xml --report baseline.json > /dev/null
+    python neam.py diary.txt --gs gold.xml --baseline baseline.json > /dev/null
+"""
+import datetime
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, so memory isn't measured there
+    resource = None
+
+from neam.python.classification import StageTimer
+from neam.python.evaluation import evaluate
+from neam.python.util import git_commit
+
+MB = 1024 * 1024
+STYLES = [('MUC', 'muc'), ('CoNLL', 'conll')]
+
+
+class StageRecorder(StageTimer):
+    """
+    Records how long each stage of a pipeline takes and the most memory the process
+    has used by the time it has finished
+    """
+    def __init__(self, progress=None):
+        super().__init__(progress)
+        self.stages = []  # the measurements of each stage, in the order they ran
+
+    def record(self, stage, seconds):
+        self.stages.append({'name': stage, 'seconds': seconds, 'max_rss_mb': max_rss_mb()})
+
+
+def max_rss_mb():
+    """
+    :return: The most memory this process has used so far, including the JVM, in
+             megabytes, or None where it can't be measured
+    :rtype: Union[float, None]
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return (peak if sys.platform == 'darwin' else peak * 1024) / MB
+
+
+def run(pipeline, journal, gold_file):
+    """
+    Annotates a document and evaluates the output against a gold standard
+
+    :param pipeline: The pipeline to annotate the document with
+    :type pipeline: Pipeline
+    :param journal: The document, as read by *read_journal*
+    :type journal: BeautifulSoup
+    :param gold_file: The path of the gold standard
+    :type gold_file: str
+    :return: The annotated document, and the report of the run
+    :rtype: tuple of (str, dict)
+    """
+    recorder = StageRecorder()
+    start = time.perf_counter()
+    try:
+        output = pipeline.run(journal, recorder)
+    finally:
+        recorder.finish()
+    seconds = time.perf_counter() - start
+
+    # keep the reason the output doesn't line up with the gold, rather than printing it
+    differences = io.StringIO()
+    with redirect_stdout(differences):
+        scores = evaluate.evaluate_files(io.StringIO(output), gold_file)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'gold': gold_file,
+            'tags': evaluate.EVAL_TAGS
+        },
+        'stages': recorder.stages,
+        'pipeline': {'name': 'neam', 'seconds': seconds, 'max_rss_mb': max_rss_mb()}
+    }
+    if scores:
+        report['muc'] = _accuracy(scores.muc)
+        report['conll'] = _accuracy(scores.conll)
+    else:
+        report['error'] = differences.getvalue().strip()
+    return output, report
+
+
+def compare(report, baseline, max_f1_drop=0.01, max_slowdown=0.1):
+    """
+    Prints how a report has changed since a baseline, and finds the changes that go
+    beyond the thresholds
+
+    :param report: The report of the current run
+    :type report: dict
+    :param baseline: The report to compare against
+    :type baseline: dict
+    :param max_f1_drop: How far the total f-measure may drop before the run fails
+    :type max_f1_drop: float
+    :param max_slowdown: The fraction the pipeline may slow down by before the run fails
+    :type max_slowdown: float
+    :return: A description of each change beyond the thresholds
+    :rtype: list of str
+    """
+    failures = []
+    if 'error' in report:
+        failures.append('The output could not be evaluated against the gold standard')
+
+    print('Compared with {} ({})'.format(baseline['meta']['commit'], baseline['meta']['timestamp']))
+    print('{:>20}{:>12}{:>12}{:>10}'.format('F-measure', 'Before', 'After', 'Change'))
+    for name, style in STYLES:
+        if style not in report or style not in baseline:
+            continue
+        for tag, scores in report[style].items():
+            before = baseline[style].get(tag, {}).get('fmeasure')
+            after = scores['fmeasure']
+            if before is None or after is None:
+                continue
+            flag = ''
+            if tag == 'Total' and before - after > max_f1_drop:
+                failures.append('{} f-measure dropped from {:.4f} to {:.4f}'.format(name, before, after))
+                flag = '  WORSE'
+            print('{:>20}{:>12.4f}{:>12.4f}{:>+10.4f}{}'.format(
+                '{} {}'.format(name, tag), before, after, after - before, flag
+            ))
+
+    slower = compare_stages(report, baseline, max_slowdown, checked=[report['pipeline']['name']], memory='max_rss_mb')
+    failures.extend('The pipeline slowed down by {:.1%}'.format(change) for change in slower.values())
+
+    return failures
+
+
+def compare_stages(report, baseline, threshold, checked=None, memory='peak_memory_mb'):
+    """
+    Prints how long each stage, and the pipeline as a whole, took before and after, and
+    how their memory use changed
+
+    :param report: The report of the current run, with the measurements of each stage
+                   in *stages* and of the whole pipeline in *pipeline*
+    :type report: dict
+    :param baseline: The report to compare against
+    :type baseline: dict
+    :param threshold: The fraction a stage may slow down by before it is flagged
+    :type threshold: float
+    :param checked: The names of the stages to flag. By default, every stage.
+    :type checked: list of str
+    :param memory: The measurement of memory to compare, in megabytes
+    :type memory: str
+    :return: How much each flagged stage slowed down, by its name
+    :rtype: dict of str: float
+    """
+    old = {stage['name']: stage for stage in baseline['stages'] + [baseline['pipeline']]}
+    slower = {}
+
+    print('{:>20}{:>12}{:>12}{:>10}{:>12}'.format('Stage', 'Before (s)', 'After (s)', 'Change', 'Memory'))
+    for stage in report['stages'] + [report['pipeline']]:
+        name = stage['name']
+        if name not in old:
+            continue
+
+        change = stage['seconds'] / old[name]['seconds'] - 1 if old[name]['seconds'] else 0.0
+        before, after = old[name].get(memory), stage.get(memory)
+        memory_change = float('nan') if before is None or after is None else after - before
+        flag = ''
+        if change > threshold and (checked is None or name in checked):
+            slower[name] = change
+            flag = '  SLOWER'
+
+        print('{:>20}{:>12.4f}{:>12.4f}{:>+9.1%}{:>+10.1f}MB{}'.format(
+            name, old[name]['seconds'], stage['seconds'], change, memory_change, flag
+        ))
+
+    return slower
+
+
+def print_report(report):
+    """
+    Prints the accuracy and timings of a run as tables
+
+    :param report: The report of the run
+    :type report: dict
+    """
+    if 'error' in report:
+        print('Could not evaluate the output: {}'.format(report['error']))
+    for name, style in STYLES:
+        if style in report:
+            rows = [(tag, [float('nan') if v is None else v for v in scores.values()])
+                    for tag, scores in report[style].items()]
+            evaluate.print_accuracy(name, rows)
+
+    print()
+    # the process's memory high-water mark once each stage had finished
+    print('{:>20}{:>12}{:>20}'.format('Stage', 'Time (s)', 'Max RSS so far (MB)'))
+    for stage in report['stages'] + [report['pipeline']]:
+        memory = float('nan') if stage['max_rss_mb'] is None else stage['max_rss_mb']
+        print('{:>20}{:>12.4f}{:>20.1f}'.format(stage['name'], stage['seconds'], memory))
+
+
+def _accuracy(totals):
+    """
+    Works out the precision, recall and f-measure of each tag, in a form that can be
+    written as JSON
+
+    :return: The precision, recall and f-measure of each tag, and of all of them
+    :rtype: dict
+    """
+    return {
+        tag: dict(zip(['precision', 'recall', 'fmeasure'], map(evaluate.json_number, vals)))
+        for tag, vals in evaluate.accuracy(totals)
+    }
+
+
+__all__ = ['StageRecorder', 'max_rss_mb', 'run', 'compare', 'compare_stages', 'print_report']
@@ -25,6 +25,7 @@ lib_dir = os.path.join(java_dir, 'lib')
 
 
 def boot_java():
+    install_corenlp()
     print("Starting Java.", file=sys.stderr)
     src_path = os.path.join(java_dir, 'neam')
     jar_paths = [os.path.join(lib_dir, jar) for jar in JARS]
@@ -50,7 +51,6 @@ def install_corenlp():
             shutil.rmtree(lib_dir)
 
 
-install_corenlp()
 clms = JPackage('clms')
 
 __all__ = ['java', 'clms']
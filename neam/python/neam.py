@@ -1,13 +1,43 @@
 import argparse
+import json
+import sys
+from contextlib import redirect_stdout
 from neam.python.classification import *
-from bs4 import BeautifulSoup
+from neam.python.evaluation import regression
+from bs4 import BeautifulSoup, Tag
 
 
-def neam(input_file, model=None, year=1900, expand=None, retag=None):
-    expand = expand or ['persName']
-    retag = retag or ['placeName', 'orgName']
+def neam(input_file, model=None, year=1900, expand=None, retag=None, parser='xml', pipeline=None, progress=None):
+    pipeline = pipeline or build_pipeline(model, year, expand, retag, parser)
+    return pipeline.run(read_journal(input_file), progress)
 
-    pipeline = Pipeline([
+
+def read_journal(input_file):
+    """
+    Reads a journal into a soup that a pipeline can run on
+
+    :param input_file: The lines of the journal
+    :type input_file: iterable of str
+    :return: The journal
+    :rtype: BeautifulSoup
+    """
+    text = '<body>' + ''.join(input_file) + '</body>'
+    return BeautifulSoup(text, 'html.parser')
+
+
+def build_pipeline(model=None, year=1900, expand=None, retag=None, parser='xml', classifier=None, title_annotator=None,
+                   ner='corenlp', gazetteer=None, wiki_memo_size=0):
+    shaping = build_shaping_pipeline(year, title_annotator)
+    annotation = build_annotation_pipeline(model, expand, retag, parser, classifier, ner, gazetteer, wiki_memo_size)
+    return Pipeline(shaping.processes + annotation.processes)
+
+
+def build_shaping_pipeline(year=1900, title_annotator=None):
+    """
+    Builds the stages that find the entries of a journal. Their output can be split up
+    with *split_journal* and handed to the annotation stages a chunk at a time.
+    """
+    return Pipeline([
         #################
         # Preprocessing #
         #################
@@ -20,15 +50,37 @@ def neam(input_file, model=None, year=1900, expand=None, retag=None):
         ###########
         
         # Tag all of the titles using a custom trained MaxEnt classifier
-        TitleAnnotator(),
+        title_annotator or TitleAnnotator(),
         # Add in the <p> and <div> tags
         JournalShaper('EBA', year),
+    ])
+
+
+def build_annotation_pipeline(model=None, expand=None, retag=None, parser='xml', classifier=None, ner='corenlp',
+                              gazetteer=None, wiki_memo_size=0):
+    """
+    Builds the stages that annotate the entries of a shaped journal
+
+    *ner* chooses the named entity classifier, if one isn't given: 'corenlp' for
+    Stanford CoreNLP, 'perceptron' for the pure Python classifier, or the URL of a
+    CoreNLP server to send the text to. If a *gazetteer* CSV file is given, the
+    entities it lists are tagged with their refs first, and the later stages leave
+    them alone. Each entity is checked against Wikidata once per document, or once
+    for up to *wiki_memo_size* entities for the life of the pipeline.
+    """
+    # The command line passes [''] when no tags are given
+    expand = [tag for tag in expand or [] if tag] or ['persName']
+    retag = [tag for tag in retag or [] if tag] or ['placeName', 'orgName']
+
+    return Pipeline([
         # Replace page numbers with <pb> tags
         PageReplacer(),
         # Replace sic marks with <sic> tags
         SicReplacer(),
-        # Run Stanford CoreNLP to tag named entities and dates
-        load_classifier(model),
+        # Tag the entities listed in the gazetteer, if there is one
+        *([GazetteerTagger(gazetteer)] if gazetteer else []),
+        # Run Stanford CoreNLP, or the pure Python classifier, to tag named entities and dates
+        classifier or load_classifier(model, ner),
 
         ######################
         # Tag postprocessing #
@@ -39,8 +91,8 @@ def neam(input_file, model=None, year=1900, expand=None, retag=None):
         # Move any of the following titles inside tags that occur directly to their right
         TagExpander(tags=expand, words=['the', 'Mr.', 'Mrs.', 'Ms.', 'Miss', 'Lady', 'Dr.', 'Maj.', 'Col.', 'Capt.', 'Rev', 'SS', 'S.S.', 'Contessa', 'Judge', 'Mlle.', 'M.']),
         # Check tags against Wikipedia
-        WikiRetagger(tags=retag),
-        # Set the ref attribute of named entity tags
+        WikiRetagger(tags=retag, parser=parser, memo_size=wiki_memo_size),
+        # Set the ref attribute of named entity tags, and index the entities they refer to
         RefAnnotator(),
 
         ##############
@@ -50,17 +102,79 @@ def neam(input_file, model=None, year=1900, expand=None, retag=None):
         # Adjust the spacing to get rid of weird newlines and repeated spaces
         SpaceNormalizer(),
         # Format the XML into a standardized layout
-        Beautifier()
+        Beautifier(parser=parser)
     ])
 
-    text = '<body>' + ''.join(input_file) + '</body>'
-    return pipeline.run(BeautifulSoup(text, 'html.parser'))
 
+def entity_registry(pipeline):
+    """
+    Finds the entities the last document a pipeline ran on refers to
+
+    :param pipeline: A pipeline that sets refs with a RefAnnotator
+    :type pipeline: Pipeline
+    :return: The entities, or None if the pipeline doesn't set refs
+    :rtype: Union[EntityRegistry, None]
+    """
+    return next((process.registry for process in pipeline.processes if isinstance(process, RefAnnotator)), None)
+
+
+def split_journal(soup, entries):
+    """
+    Splits a shaped journal into chunks of whole entries
+
+    Any text before the first entry goes in the first chunk.
+
+    :param soup: The output of the shaping stages
+    :type soup: BeautifulSoup
+    :param entries: The number of entries to put in each chunk
+    :type entries: int
+    :return: The chunks, each of which can be read with *read_journal* and run
+             through the annotation stages
+    :rtype: list of str
+    """
+    chunks = []
+    chunk = []
+    count = 0
 
-def load_classifier(model):
+    for child in soup.body.contents:
+        if count == entries:
+            chunks.append(chunk)
+            chunk = []
+            count = 0
+        chunk.append(str(child))
+        if isinstance(child, Tag):
+            count += 1
+
+    chunks.append(chunk)
+    return [''.join(chunk) for chunk in chunks]
+
+
+def join_journal(chunks):
+    """
+    Stitches the annotated chunks of a journal back together
+
+    :param chunks: The output of the annotation stages for each chunk, in order
+    :type chunks: iterable of str
+    :return: The annotated journal, as the annotation stages would have laid it out
+             had it been run in one go
+    :rtype: str
+    """
+    lines = ['<body>']
+    for chunk in chunks:
+        # Drop the opening and closing body tags
+        lines.extend(chunk.split('\n')[1:-1])
+    lines.append('</body>')
+    return '\n'.join(lines)
+
+
+def load_classifier(model, ner='corenlp'):
+    if ner == 'perceptron':
+        return PerceptronClassifier(model) if model else PerceptronClassifier()
     props = {}
     if model:
         props["ner.model"] = model
+    if ner.startswith(('http://', 'https://')):
+        return ServerClassifier(ner, props)
     return Classifier(props)
 
 
@@ -68,17 +182,92 @@ def load_args():
     parser = argparse.ArgumentParser(description='Named Entity recognition and Automated Markup on historical texts')
     parser.add_argument('file', help='The file NEAM should classify')
     parser.add_argument('--model', help='A NER model to override the default')
-    parser.add_argument('--gs', help='The gold standard')
+    parser.add_argument('--ner', help='The named entity classifier to use: corenlp, perceptron, or the URL of a running '
+                                      'CoreNLP server. The perceptron runs without Java, but must be trained first.',
+                        type=ner_backend, default='corenlp')
+    parser.add_argument('--gazetteer', help='A CSV file of known entities to tag before the classifier runs, with the '
+                                            'ref, name and TEI tag of one on each line')
+    parser.add_argument('--standoff', help='A file to write TEI standoff markup describing the people, places and '
+                                           'organizations the output refers to')
+    parser.add_argument('--gs', help='A gold standard to evaluate the output against. The accuracy and timings are '
+                                     'printed to stderr.')
+    parser.add_argument('--report', help='A file to write the accuracy and timings to as JSON, with --gs')
+    parser.add_argument('--baseline', help='A report from an earlier run to compare against, with --gs')
+    parser.add_argument('--max-f1-drop', help='How far the total f-measure may drop from the baseline before failing',
+                        type=float, default=0.01)
+    parser.add_argument('--max-slowdown', help='The fraction the pipeline may slow down by before failing',
+                        type=float, default=0.1)
     parser.add_argument('--year', help='The year of the first journal entry', type=int, default=1900)
     parser.add_argument('--expand', help='The tags NEAM should expand into titles', default='')
     parser.add_argument('--retag', help='The tags NEAM should consult with Wikipedia on', default='')
+    parser.add_argument('--parser', help='The XML parser to use for the later stages', choices=['xml', 'lxml'], default='xml')
     return parser.parse_args()
 
 
+def ner_backend(value):
+    if value in ['corenlp', 'perceptron'] or value.startswith(('http://', 'https://')):
+        return value
+    raise argparse.ArgumentTypeError('expected corenlp, perceptron or a URL, not {!r}'.format(value))
+
+
 def main():
     args = load_args()
+    if args.gs:
+        sys.exit(evaluate_run(args))
+    pipeline = build_pipeline(args.model, args.year, args.expand.split(','), args.retag.split(','), args.parser,
+                              ner=args.ner, gazetteer=args.gazetteer)
     with open(args.file, encoding="utf-8") as input_file:
-        print(neam(input_file, args.model, args.year, args.expand.split(','), args.retag.split(',')))
+        print(neam(input_file, pipeline=pipeline))
+    write_standoff(pipeline, args.standoff)
+
+
+def write_standoff(pipeline, file_name):
+    """
+    Writes the standoff markup of the entities the pipeline last annotated, if a file
+    was given to write it to
+
+    :param pipeline: The pipeline
+    :type pipeline: Pipeline
+    :param file_name: The file to write to, or None
+    :type file_name: Union[str, None]
+    """
+    if file_name:
+        with open(file_name, 'w', encoding='utf-8') as standoff_file:
+            standoff_file.write(entity_registry(pipeline).standoff())
+
+
+def evaluate_run(args):
+    """
+    Annotates a file, prints the output, and reports its accuracy against the gold
+    standard and the timings of each stage
+
+    :param args: The command line arguments
+    :type args: argparse.Namespace
+    :return: The exit status, which is 1 if the run did worse than the baseline
+    :rtype: int
+    """
+    pipeline = build_pipeline(args.model, args.year, args.expand.split(','), args.retag.split(','), args.parser,
+                              ner=args.ner, gazetteer=args.gazetteer)
+    with open(args.file, encoding="utf-8") as input_file:
+        output, report = regression.run(pipeline, read_journal(input_file), args.gs)
+    print(output)
+    write_standoff(pipeline, args.standoff)
+
+    failures = []
+    with redirect_stdout(sys.stderr):
+        regression.print_report(report)
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+            print()
+            failures = regression.compare(report, baseline, args.max_f1_drop, args.max_slowdown)
+            for failure in failures:
+                print(failure)
+
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    return 1 if failures or 'error' in report else 0
 
 
 if __name__ == '__main__':
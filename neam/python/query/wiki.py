@@ -40,6 +40,8 @@ from pywikibot.data import api
 
 URL = 'https://query.wikidata.org/sparql'
 CACHE = {}
+# How many lookups were answered from the cache, and how many had to go to Wikidata
+STATS = {'hits': 0, 'misses': 0}
 
 PYWIKI_SITE = pywikibot.Site('wikidata', 'wikidata')
 PYWIKI_PARAMS = {
@@ -173,7 +175,9 @@ def lookup(string):
     :rtype: dict
     """
     if string in CACHE:
+        STATS['hits'] += 1
         return CACHE[string]
+    STATS['misses'] += 1
 
     if re.match('[A-Z]\d+', string):
         entity = { 'id': string, 'label': None }
@@ -3,8 +3,10 @@ Miscellaneous helper methods - should be refactored should this file get too
 large.
 """
 from contextlib import contextmanager
+import os
 import re
 import ssl
+import subprocess
 
 
 def multi_sub(correspondences, text):
@@ -21,6 +23,20 @@ def multi_sub(correspondences, text):
     return re.sub(pattern, lambda match: correspondences[match.group(0)], text)
 
 
+def git_commit():
+    """
+    Finds the commit of the checkout NEAM is running from, wherever it is run from
+
+    :return: The short hash of the checked out commit, or None if it can't be found
+    :rtype: Union[str, None]
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.realpath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
 @contextmanager
 def unverified_https_context():
     """
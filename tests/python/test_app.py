@@ -0,0 +1,25 @@
+import unittest
+from unittest import mock
+
+from neam.python.app import ChunkProgress, status
+
+
+class TestChunkProgress(unittest.TestCase):
+    def record(self, done, stages_done=1):
+        reports = []
+        progress = ChunkProgress(reports.append, 'task', 0, 3, 1)
+        with mock.patch.object(status, 'record_chunk', return_value=done):
+            progress.record(stages_done, 4)
+        report = reports[0]
+        return report.stage_number, report.current, report.total
+
+    def test_it_reports_the_stage_of_the_slowest_chunk(self):
+        # the mean of these is past the first stage, but one chunk hasn't finished it
+        self.assertEqual((2, 2, 3), self.record([3, 3, 0]))
+        self.assertEqual((3, 2, 3), self.record([2, 3, 1]))
+
+    def test_chunks_that_havent_recorded_yet_havent_finished_a_stage(self):
+        self.assertEqual((2, 2, 3), self.record([4, 4]))
+
+    def test_it_reports_the_last_stage_once_every_chunk_is_done(self):
+        self.assertEqual((5, 3, 3), self.record([4, 4, 4], 4))
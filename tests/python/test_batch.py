@@ -0,0 +1,77 @@
+import io
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from werkzeug.datastructures import FileStorage
+
+from neam.python.app.batch import BatchTooLarge, iter_documents, write_archive
+from neam.python.app.storage import LocalBlobStore
+
+
+class TestIterDocuments(unittest.TestCase):
+    def test_it_reads_plain_files_and_zip_archives(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('letters/', '')
+            z.writestr('letters/a.txt', 'Jan. 1st')
+        archive.seek(0)
+
+        files = [FileStorage(archive, 'letters.zip'), FileStorage(io.BytesIO(b'Feb. 2d'), 'b.txt')]
+        documents = [(name, b''.join(chunks)) for name, chunks in iter_documents(files)]
+        self.assertEqual([('letters/a.txt', b'Jan. 1st'), ('b.txt', b'Feb. 2d')], documents)
+
+    def test_it_keeps_paths_within_archives_and_never_repeats_a_name(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('a/x.txt', 'one')
+            z.writestr('b/x.txt', 'two')
+            z.writestr('../../etc/x.txt', 'three')
+        archive.seek(0)
+
+        files = [FileStorage(archive, 'letters.zip'), FileStorage(io.BytesIO(b'four'), 'x.txt'),
+                 FileStorage(io.BytesIO(b'five'), 'x.txt')]
+        documents = [(name, b''.join(chunks)) for name, chunks in iter_documents(files)]
+        self.assertEqual(['a/x.txt', 'b/x.txt', 'etc/x.txt', 'x.txt', 'x (2).txt'], [name for name, _ in documents])
+
+    def test_it_rejects_an_archive_that_unpacks_into_too_much(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('a.txt', bytes(60))
+            z.writestr('b.txt', bytes(60))
+        archive.seek(0)
+
+        documents = iter_documents([FileStorage(archive, 'letters.zip')], max_bytes=100)
+        name, chunks = next(documents)
+        self.assertEqual(60, len(b''.join(chunks)))
+        with self.assertRaises(BatchTooLarge):
+            next(documents)
+
+    def test_it_rejects_a_tar_archive_that_claims_too_much(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as t:
+            member = tarfile.TarInfo('a.txt')
+            member.size = 200
+            t.addfile(member, io.BytesIO(bytes(200)))
+        archive.seek(0)
+
+        with self.assertRaises(BatchTooLarge):
+            next(iter_documents([FileStorage(archive, 'letters.tar')], max_bytes=100))
+
+    def test_it_counts_the_bytes_read(self):
+        files = [FileStorage(io.BytesIO(bytes(80)), 'a.txt'), FileStorage(io.BytesIO(bytes(80)), 'b.txt')]
+        documents = iter_documents(files, max_bytes=100)
+        self.assertEqual(80, len(b''.join(next(documents)[1])))
+        with self.assertRaises(BatchTooLarge):
+            b''.join(next(documents)[1])
+
+class TestWriteArchive(unittest.TestCase):
+    def test_it_zips_documents_and_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalBlobStore(directory)
+            key = write_archive([('a.xml', store.put([b'<TEI/>']))], [('b.txt', 'bad')], store)
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(store.get(key))))
+
+            self.assertEqual(b'<TEI/>', archive.read('a.xml'))
+            self.assertEqual(b'b.txt: bad\n', archive.read('errors.txt'))
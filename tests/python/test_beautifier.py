@@ -0,0 +1,57 @@
+import io
+import unittest
+
+from neam.python.classification.beautifier import Beautifier
+
+
+class TestBeautifier(unittest.TestCase):
+    def setUp(self):
+        self.processor = Beautifier(chunk_size=4)
+
+    def test_it_indents_nested_tags(self):
+        output = self.processor.run('<body><div>text</div></body>')
+        self.assertEqual('<body>\n  <div>\n    text\n  </div>\n</body>', output)
+
+    def test_it_keeps_text_between_tags(self):
+        output = self.processor.run('<body>a<div>b</div>c</body>')
+        self.assertEqual('<body>\n  a\n  <div>\n    b\n  </div>\n  c\n</body>', output)
+
+    def test_it_keeps_attributes(self):
+        output = self.processor.run('<body><div type="Entry" xml:id="EBA19000101"></div></body>')
+        self.assertEqual('<body>\n  <div type="Entry" xml:id="EBA19000101">\n  </div>\n</body>', output)
+
+    def test_it_does_not_format_ignored_tags(self):
+        output = self.processor.run('<body><p>Saw <persName>Bob</persName> <pb n="2"/> &amp; left</p></body>')
+        self.assertEqual('<body>\n  <p>Saw <persName>Bob</persName> <pb n="2"/> &amp; left</p>\n</body>', output)
+
+    def test_it_keeps_namespace_declarations(self):
+        output = self.processor.run('<TEI xmlns="http://www.tei-c.org/ns/1.0" xmlns:x="urn:x"><text x:n="1">'
+                                    '<p>Saw <x:b>Bob</x:b></p></text></TEI>')
+        self.assertEqual('<TEI xmlns="http://www.tei-c.org/ns/1.0" xmlns:x="urn:x">\n  <text x:n="1">\n'
+                         '    <p>Saw <x:b>Bob</x:b></p>\n  </text>\n</TEI>', output)
+
+    def test_it_keeps_comments(self):
+        output = self.processor.run('<!-- a --><body><!-- b --><p>Saw <!-- c -->Bob</p></body>')
+        self.assertEqual('<!-- a -->\n<body>\n  <!-- b -->\n  <p>Saw <!-- c -->Bob</p>\n</body>', output)
+
+    def test_it_writes_to_a_file(self):
+        output = io.StringIO()
+        self.processor.write(io.StringIO('<body><p>text</p></body>'), output)
+        self.assertEqual('<body>\n  <p>text</p>\n</body>', output.getvalue())
+
+    def test_it_handles_deep_nesting(self):
+        depth = 5000
+        output = self.processor.run('<a>' * depth + '</a>' * depth)
+        self.assertEqual(2 * depth, len(output.split('\n')))
+
+    def test_the_lxml_parser_gives_the_same_output(self):
+        text = '<body>a<div type="Entry"><p>Saw <persName>Bob</persName> <pb n="2"/></p>b</div></body>'
+        lxml_processor = Beautifier(parser='lxml', chunk_size=4)
+        self.assertEqual(self.processor.run(text), lxml_processor.run(text))
+
+    def test_the_lxml_parser_gives_the_same_output_for_namespaced_documents(self):
+        text = ('<TEI xmlns="http://www.tei-c.org/ns/1.0" xmlns:x="urn:x"><!-- a --><text>a<div type="Entry">'
+                '<p xmlns:y="urn:y">Saw <y:b>Bob</y:b> <!-- b --><pb n="2"/></p><x:c/>b</div></text></TEI>')
+        lxml_processor = Beautifier(parser='lxml', chunk_size=4)
+        self.assertEqual(self.processor.run(text), lxml_processor.run(text))
+        self.assertNotIn('<p xmlns="', lxml_processor.run(text))
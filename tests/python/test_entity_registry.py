@@ -0,0 +1,113 @@
+import re
+import unittest
+from unittest import mock
+
+from neam.python.classification import RefAnnotator
+from neam.python.classification.entity_registry import EntityRegistry, make_id, rename_refs
+
+
+class TestRefAnnotator(unittest.TestCase):
+    def setUp(self):
+        self.annotator = RefAnnotator()
+
+    def test_it_sets_refs_and_keeps_existing_ones(self):
+        output = self.annotator.run('<body><persName>Mrs. Andrews</persName> and '
+                                    '<placeName ref="#Luxor_Temple">Luxor</placeName></body>')
+        self.assertEqual('<body><persName ref="#Mrs_Andrews">Mrs. Andrews</persName> and '
+                         '<placeName ref="#Luxor_Temple">Luxor</placeName></body>', output)
+
+    def test_it_indexes_each_entity_once(self):
+        self.annotator.run('<body><persName>Mr. Davis</persName> <placeName>Luxor</placeName> '
+                           '<persName>Mr. <sic>Davis</sic></persName> <orgName ref="http://x">Cook</orgName></body>')
+        self.assertEqual([
+            {'id': 'Mr_Davis', 'tag': 'persName', 'name': 'Mr. Davis', 'qid': None, 'count': 2, 'first': 1},
+            {'id': 'Luxor', 'tag': 'placeName', 'name': 'Luxor', 'qid': None, 'count': 1, 'first': 2},
+        ], list(self.annotator.registry))
+
+    def test_it_tells_entities_of_different_types_with_the_same_name_apart(self):
+        output = self.annotator.run('<body><persName>Washington</persName> <placeName>Washington</placeName> '
+                                    '<placeName>Washington</placeName></body>')
+        self.assertEqual('<body><persName ref="#Washington">Washington</persName> '
+                         '<placeName ref="#Washington_placeName">Washington</placeName> '
+                         '<placeName ref="#Washington_placeName">Washington</placeName></body>', output)
+        self.assertEqual([('Washington', 'persName', 1), ('Washington_placeName', 'placeName', 2)],
+                         [(entity['id'], entity['tag'], entity['count']) for entity in self.annotator.registry])
+
+    def test_it_looks_up_the_wikidata_id_of_the_text_of_an_entity(self):
+        with mock.patch.dict('neam.python.query.wiki.CACHE', {'Cook & Son': {'id': 'Q2'}}):
+            self.annotator.run('<body><orgName>Cook &amp; Son</orgName></body>')
+        self.assertEqual(['Q2'], [entity['qid'] for entity in self.annotator.registry])
+
+    def test_it_renames_an_existing_ref_to_an_entity_of_another_type(self):
+        output = self.annotator.run('<body><placeName>Luxor</placeName> <persName ref="#Luxor">Luxor</persName></body>')
+        self.assertEqual('<body><placeName ref="#Luxor">Luxor</placeName> '
+                         '<persName ref="#Luxor_persName">Luxor</persName></body>', output)
+
+    def test_its_registry_only_holds_the_last_document(self):
+        self.annotator.run('<body><persName>Mr. Davis</persName></body>')
+        self.annotator.run('<body><placeName>Luxor</placeName></body>')
+        self.assertEqual(['Luxor'], [entity['id'] for entity in self.annotator.registry])
+
+
+class TestEntityRegistry(unittest.TestCase):
+    def test_ids_are_valid_xml_ids(self):
+        self.assertEqual('Mrs_Andrews', make_id('Mrs.  Andrews'))
+        self.assertEqual('_18th_Dynasty', make_id("18th Dynasty"))
+        self.assertEqual('Queen_Tiyis', make_id("<sic>Queen</sic> Tiyi's"))
+
+    def test_it_merges_the_chunks_of_a_document(self):
+        first, second = EntityRegistry(), EntityRegistry()
+        first.add('persName', 'Mr. Davis', '#Mr_Davis')
+        first.add('placeName', 'Luxor', '#Luxor')
+        second.add('placeName', 'Cairo', '#Cairo')
+        second.add('persName', 'Mr. Davis', '#Mr_Davis')
+
+        first.merge(EntityRegistry.from_dict(second.to_dict()))
+        self.assertEqual(4, first.mentions)
+        self.assertEqual([('Mr_Davis', 2, 1), ('Luxor', 1, 2), ('Cairo', 1, 3)],
+                         [(entity['id'], entity['count'], entity['first']) for entity in first])
+
+    def test_every_ref_in_merged_chunks_points_at_an_entity_of_its_type(self):
+        annotator = RefAnnotator()
+        registry = EntityRegistry()
+        chunks = []
+        for chunk in ['<body><persName>Washington</persName> <placeName>Washington</placeName></body>',
+                      '<body><placeName>Washington</placeName> <placeName>Luxor</placeName></body>',
+                      '<body><persName ref="#Luxor">Luxor</persName> <persName>Washington</persName></body>']:
+            output = annotator.run(chunk)
+            chunks.append(rename_refs(output, registry.merge(EntityRegistry.from_dict(annotator.registry.to_dict()))))
+
+        standoff = registry.standoff()
+        ids = re.findall(r'<(\w+) xml:id="([^"]*)">\s*<(\w+)>', standoff)
+        self.assertEqual(len(ids), len({key for _, key, _ in ids}))
+        tags = {key: tag for _, key, tag in ids}
+        refs = re.findall(r'<(\w+) ref="#([^"]*)"', ''.join(chunks))
+        self.assertEqual(6, len(refs))
+        for tag, key in refs:
+            self.assertEqual(tag, tags[key])
+        self.assertEqual([('Washington', 2), ('Washington_placeName', 2), ('Luxor', 1), ('Luxor_persName', 1)],
+                         [(entity['id'], entity['count']) for entity in registry])
+
+    def test_it_writes_standoff_lists(self):
+        registry = EntityRegistry()
+        registry.add('placeName', 'Luxor', '#Q1')
+        registry.add('persName', 'Mr. &amp; Mrs. Davis', '#Davises')
+        registry.add('date', 'Jan. 1st', '#Jan_1st')
+        self.assertEqual('<standOff>\n'
+                         ' <listPerson>\n'
+                         '  <person xml:id="Davises">\n'
+                         '   <persName>Mr. &amp; Mrs. Davis</persName>\n'
+                         '   <note type="mentions">1</note>\n'
+                         '   <note type="firstMention">2</note>\n'
+                         '  </person>\n'
+                         ' </listPerson>\n'
+                         ' <listPlace>\n'
+                         '  <place xml:id="Q1">\n'
+                         '   <placeName>Luxor</placeName>\n'
+                         '   <idno type="wikidata">Q1</idno>\n'
+                         '   <note type="mentions">1</note>\n'
+                         '   <note type="firstMention">1</note>\n'
+                         '  </place>\n'
+                         ' </listPlace>\n'
+                         '</standOff>', registry.standoff(' '))
+        self.assertEqual('', EntityRegistry().standoff())
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from bs4 import BeautifulSoup
+
+from neam.python.evaluation import evaluate
+from neam.python.evaluation.evaluate import (Span, check, clean_gold, entity_spans, evaluate_corpus, parse_tokens,
+                                             remove_tags, score, stream_tokens, tokenize)
+
+
+class TestRemoveTags(unittest.TestCase):
+    def test_it_keeps_only_the_given_tags(self):
+        text = '<p>Saw <persname>Bob</persname> at <hi rend="b">home</hi></p>'
+        self.assertEqual('Saw <persname>Bob</persname> at home', remove_tags(text, ['persname']))
+
+
+class TestStreamTokens(unittest.TestCase):
+    def test_it_tokenizes_as_clean_gold_does(self):
+        document = ('<html><head><title>x</title></head><body><p>Went with <persName ref="#a"> Mr. Davis </persName>'
+                    '<placeName ref="#b">Luxor</placeName>, to <hi>tea</hi>&amp; <pb n="4"/>it\'s '
+                    '<orgName ref="#c">the <lb/>Museum <pb n="5"/></orgName></p></body></html>')
+        with tempfile.NamedTemporaryFile('w', suffix='.xml', delete=False) as f:
+            f.write(document)
+        self.addCleanup(os.remove, f.name)
+        expected = tokenize(clean_gold(BeautifulSoup(document, 'html.parser').body))
+        # read a few characters at a time, so that text and tags are split between pieces
+        original, evaluate.CHUNK_SIZE = evaluate.CHUNK_SIZE, 5
+        try:
+            self.assertEqual(expected, list(stream_tokens(f.name)))
+        finally:
+            evaluate.CHUNK_SIZE = original
+
+    def test_it_tokenizes_entities_without_attributes_as_clean_gold_does(self):
+        document = '<html><body><p><persName>Mr. Davis</persName> at <placeName>Luxor</placeName></p></body></html>'
+        with tempfile.NamedTemporaryFile('w', suffix='.xml', delete=False) as f:
+            f.write(document)
+        self.addCleanup(os.remove, f.name)
+        expected = tokenize(clean_gold(BeautifulSoup(document, 'html.parser').body))
+        self.assertEqual(['<persname>Mr', '.', 'Davis</persname>', 'at'], expected[:4])
+        self.assertEqual(expected, list(stream_tokens(f.name)))
+
+
+class TestScore(unittest.TestCase):
+    def setUp(self):
+        self.gold = parse_tokens('Saw <persname>Bob Smith</persname> in <placename>Cairo</placename>'.split())
+
+    def test_it_scores_a_perfect_match(self):
+        scores = score(self.gold, self.gold)
+        self.assertEqual({'cor': 2, 'gue': 2, 'pos': 2}, scores.muc['persname'])
+        self.assertEqual({'cor': 1, 'gue': 1, 'pos': 1}, scores.conll['placename'])
+
+    def test_it_gives_muc_credit_for_the_right_type_with_the_wrong_span(self):
+        test = parse_tokens('Saw <persname>Bob</persname> Smith in Cairo'.split())
+        errors = []
+        scores = score(test, self.gold, lambda *args: errors.append(args[:2]))
+        self.assertTrue(check(test, self.gold))
+        self.assertEqual({'cor': 1, 'gue': 2, 'pos': 2}, scores.muc['persname'])
+        self.assertEqual({'cor': 0, 'gue': 1, 'pos': 1}, scores.conll['persname'])
+        self.assertEqual([([1, 1], [1, 2]), ([-1, -1], [4, 4])], errors)
+
+    def test_it_scores_nested_and_adjacent_entities_separately(self):
+        gold = parse_tokens('<orgname>Bank of <placename>Egypt</placename></orgname> '
+                            '<persname>Bob</persname><persname>Ann</persname>'.split())
+        test = parse_tokens('<orgname>Bank of <persname>Egypt</persname></orgname> '
+                            '<persname>Bob</persname><persname>Ann</persname>'.split())
+        self.assertEqual([Span(2, 2, 'placename'), Span(0, 2, 'orgname'), Span(3, 3, 'persname'),
+                          Span(3, 3, 'persname')], entity_spans(gold))
+        scores = score(test, gold)
+        self.assertEqual({'cor': 2, 'gue': 3, 'pos': 2}, scores.conll['persname'])
+        self.assertEqual({'cor': 1, 'gue': 1, 'pos': 1}, scores.conll['orgname'])
+        # rows are gold types and columns test types: persname, placename, orgname, none
+        self.assertEqual([[2, 0, 0, 0], [1, 0, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]], scores.confusion.tolist())
+
+
+class TestEvaluateCorpus(unittest.TestCase):
+    def test_it_averages_the_scores_of_every_pair(self):
+        documents = {
+            'a.xml': ('<body><persName ref="#p">Bob</persName> in Cairo</body>',
+                      '<body><persName ref="#p">Bob</persName> in Cairo</body>'),
+            'b.xml': ('<body><persName ref="#p">Ann</persName> in Cairo</body>',
+                      '<body>Ann in <placeName ref="#p">Cairo</placeName></body>'),
+            'c.xml': ('<body>Ann</body>', '<body>Bob</body>'),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for kind, i in [('test', 0), ('gold', 1)]:
+                os.mkdir(os.path.join(directory, kind))
+                for name, texts in documents.items():
+                    with open(os.path.join(directory, kind, name), 'w') as f:
+                        f.write(texts[i])
+            report = evaluate_corpus(directory, processes=1)
+
+        self.assertIn('error', report['documents'][2])
+        self.assertEqual({'cor': 1, 'gue': 2, 'pos': 1}, report['conll']['counts']['persname'])
+        self.assertEqual(0.5, report['conll']['micro']['persname']['precision'])
+        self.assertEqual(0.5, report['conll']['macro']['Total']['precision'])
+        self.assertEqual(1.0, report['conll']['macro']['persname']['recall'])
+        self.assertIsNone(report['conll']['micro']['placename']['precision'])
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from bs4 import BeautifulSoup
+
+from neam.python.classification import NERClassifier, WikiRetagger
+from neam.python.classification.gazetteer import Gazetteer, GazetteerTagger
+
+ENTRIES = [
+    ('Mr. Davis', 'persName', 'Theodore_M_Davis'),
+    ('Davis', 'persName', 'Davis'),
+    ('Luxor', 'placeName', 'Luxor'),
+    ('Bedawin', 'orgName', 'Bedawin'),
+    ('Bedawin Camp', 'placeName', 'Bedawin_Camp'),
+]
+
+
+class TestGazetteer(unittest.TestCase):
+    def setUp(self):
+        self.gazetteer = Gazetteer(ENTRIES)
+
+    def test_it_prefers_the_leftmost_longest_name(self):
+        self.assertEqual([(4, 13, 'persName', 'Theodore_M_Davis'), (17, 29, 'placeName', 'Bedawin_Camp')],
+                         self.gazetteer.find('Saw Mr. Davis at Bedawin Camp'))
+
+    def test_it_only_matches_whole_words(self):
+        self.assertEqual([(10, 15, 'placeName', 'Luxor')], self.gazetteer.find('Luxorians Luxor'))
+
+    def test_runs_of_whitespace_match_a_space(self):
+        self.assertEqual([(0, 12, 'persName', 'Theodore_M_Davis')], self.gazetteer.find('Mr.\n   Davis'))
+
+    def test_it_reads_the_csv_format_of_csv_to_sql(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('Luxor,Luxor,placeName\nEmma_B_Andrews,"Andrews, Emma",persName\n')
+        gazetteer = Gazetteer.from_csv(f.name)
+        os.remove(f.name)
+        self.assertEqual([(0, 13, 'persName', 'Emma_B_Andrews')], gazetteer.find('Andrews, Emma'))
+
+
+class TestGazetteerTagger(unittest.TestCase):
+    def test_it_tags_names_with_their_refs_and_skips_tagged_ones(self):
+        soup = BeautifulSoup('<body><p>Mr. Davis at <placeName>Luxor</placeName> and Luxor &amp; <sic>Davis</sic></p>'
+                             '</body>', 'html.parser')
+        output = str(GazetteerTagger(Gazetteer(ENTRIES)).run(soup))
+        self.assertEqual('<body><p><persName ref="#Theodore_M_Davis">Mr. Davis</persName> at '
+                         '<placename>Luxor</placename> and <placeName ref="#Luxor">Luxor</placeName> &amp; '
+                         '<sic><persName ref="#Davis">Davis</persName></sic></p></body>', output)
+
+
+class StubClassifier(NERClassifier):
+    """
+    Tags every mention of Davis and of Mr. Davis, as a classifier that doesn't know
+    about refs would
+    """
+    def classify(self, text):
+        return (text.replace('Mr. <persName ref="#Davis">Davis</persName>',
+                             '<persName>Mr. <persName ref="#Davis">Davis</persName></persName>')
+                    .replace('>Davis<', '><persName>Davis</persName><'))
+
+
+class TestResolvedEntities(unittest.TestCase):
+    def test_the_classifier_leaves_resolved_entities_alone(self):
+        soup = BeautifulSoup('<body><p>Mr. <persName ref="#Davis">Davis</persName></p></body>', 'html.parser')
+        self.assertEqual('<body><p>Mr. <persName ref="#Davis">Davis</persName></p></body>',
+                         StubClassifier().run(soup))
+
+    def test_the_wiki_retagger_skips_resolved_entities(self):
+        retagger = WikiRetagger(tags=['placeName'])
+        retagger.retag = lambda entity: 'Person'
+        self.assertEqual('<body><placeName ref="#Luxor">Luxor</placeName> <persName>Mr Luxor</persName></body>',
+                         retagger.run('<body><placeName ref="#Luxor">Luxor</placeName> '
+                                      '<placeName>Mr Luxor</placeName></body>'))
@@ -0,0 +1,66 @@
+import unittest
+
+from bs4 import BeautifulSoup, NavigableString
+
+from neam.python.classification.journal_shaper import JournalShaper, DateIndex
+
+
+def make_soup(titles):
+    soup = BeautifulSoup('<body></body>', 'html.parser')
+    for title in titles:
+        tag = soup.new_tag('title')
+        tag.string = title
+        soup.body.append(tag)
+        soup.body.append(NavigableString(' Some text '))
+    return soup
+
+
+class TestJournalShaper(unittest.TestCase):
+    def setUp(self):
+        self.processor = JournalShaper('EBA', 1900)
+
+    def test_it_wraps_entries_in_divs(self):
+        output = self.processor.run(make_soup(['Jan. 5th']))
+        div = output.body.div
+        self.assertEqual('EBA19000105', div['xml:id'])
+        self.assertEqual('Jan. 5th', div.title.string)
+
+    def test_it_rolls_the_year_forward(self):
+        index = self.processor.index(['Jul. 30th', 'Jan. 2d'])
+        self.assertEqual(['EBA19000730', 'EBA19010102'], list(index))
+
+    def test_it_numbers_every_month(self):
+        index = self.processor.index(['Aug. 1st', 'Sep. 2d', 'Oct. 3d', 'Dec. 4th'])
+        self.assertEqual(['EBA19000801', 'EBA19000902', 'EBA19001003', 'EBA19001204'], list(index))
+
+    def test_it_extracts_codes_in_batches(self):
+        titles = ['Dec. 30th', 'Jan. 2d', 'Jan. 3d', 'Feb. 1st']
+        first, date = self.processor.extract_codes(titles[:2])
+        second, _ = self.processor.extract_codes(titles[2:], date)
+        self.assertEqual(list(self.processor.index(titles)), first + second)
+
+    def test_it_uses_years_in_titles(self):
+        index = self.processor.index(['Feb. 2d 1891', 'Feb. 3d'])
+        self.assertEqual(['EBA18910202', 'EBA18910203'], list(index))
+
+    def test_it_marks_titles_without_dates(self):
+        index = self.processor.index([None])
+        self.assertEqual(['EBA???'], list(index))
+
+    def test_it_finds_the_titles_of_entries(self):
+        self.assertEqual(['Jan. 5th', 'Jan. 6th'], self.processor.titles(make_soup(['Jan. 5th', 'Jan. 6th'])))
+
+    def test_it_can_be_reused(self):
+        first = self.processor.run(make_soup(['Dec. 30th', 'Jan. 2d']))
+        second = self.processor.run(make_soup(['Dec. 30th', 'Jan. 2d']))
+        self.assertEqual(str(first), str(second))
+
+    def test_it_uses_a_given_index(self):
+        titles = ['Dec. 30th', 'Jan. 2d', 'Jan. 3d']
+        index = self.processor.index(titles)
+        output = self.processor.run(make_soup(titles[1:]), index[1:])
+        self.assertEqual(['EBA19010102', 'EBA19010103'], [div['xml:id'] for div in output.find_all('div')])
+
+    def test_index_slices_are_indices(self):
+        index = DateIndex(['a', 'b', 'c'])
+        self.assertEqual(DateIndex(['b', 'c']), index[1:])
@@ -0,0 +1,24 @@
+import os
+import unittest
+from unittest import mock
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from neam.python.app import metrics
+
+
+class Collector:
+    def collect(self):
+        yield GaugeMetricFamily('neam_test_collector', 'A collector for testing', value=1)
+
+
+class TestRegistry(unittest.TestCase):
+    def test_it_adds_a_collector_to_the_global_registry_only_once(self):
+        collector = Collector()
+        with mock.patch.dict(os.environ):
+            os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            self.assertIs(REGISTRY, metrics.registry([collector]))
+            self.assertIs(REGISTRY, metrics.registry([collector]))
+        REGISTRY.unregister(collector)
+        metrics._global_collectors.discard(collector)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bs4 import BeautifulSoup
+
+from neam.python.classification import WikiRetagger, RefAnnotator
+from neam.python.neam import split_journal, join_journal, load_args, build_annotation_pipeline, evaluate_run
+
+
+class TestSplitJournal(unittest.TestCase):
+    def setUp(self):
+        self.soup = BeautifulSoup(
+            '<body>preface<div n="1"></div><div n="2"></div><div n="3"></div></body>',
+            'html.parser'
+        )
+
+    def test_it_splits_between_entries(self):
+        chunks = split_journal(self.soup, 2)
+        self.assertEqual(['preface<div n="1"></div><div n="2"></div>', '<div n="3"></div>'], chunks)
+
+    def test_it_keeps_a_small_journal_in_one_chunk(self):
+        self.assertEqual(1, len(split_journal(self.soup, 3)))
+
+
+class TestJoinJournal(unittest.TestCase):
+    def test_it_joins_the_insides_of_the_bodies(self):
+        chunks = ['<body>\n  <div>\n  </div>\n</body>', '<body>\n</body>', '<body>\n  <p>a</p>\n</body>']
+        self.assertEqual('<body>\n  <div>\n  </div>\n  <p>a</p>\n</body>', join_journal(chunks))
+
+
+class TestBuildAnnotationPipeline(unittest.TestCase):
+    def test_the_command_line_defaults_retag_the_default_tags_with_either_parser(self):
+        for parser in ['xml', 'lxml']:
+            with mock.patch('sys.argv', ['neam.py', 'diary.txt', '--parser', parser]):
+                args = load_args()
+            pipeline = build_annotation_pipeline(expand=args.expand.split(','), retag=args.retag.split(','),
+                                                 parser=args.parser, classifier=lambda soup: soup)
+            retagger = next(process for process in pipeline.processes if isinstance(process, WikiRetagger))
+            retagger.retag = lambda entity: 'Person'
+            self.assertEqual('<body><persName>Luxor</persName> <persName>Cook</persName></body>',
+                             retagger.run('<body><placeName>Luxor</placeName> <orgName>Cook</orgName></body>'))
+
+
+class TestEvaluateRun(unittest.TestCase):
+    def test_it_writes_the_standoff_markup(self):
+        annotator = RefAnnotator()
+        annotator.run('<body><placeName>Luxor</placeName></body>')
+        pipeline = mock.Mock(processes=[annotator])
+        with tempfile.TemporaryDirectory() as directory:
+            journal, standoff = os.path.join(directory, 'diary.txt'), os.path.join(directory, 'standoff.xml')
+            open(journal, 'w').close()
+            with mock.patch('sys.argv', ['neam.py', journal, '--gs', 'gold.xml', '--standoff', standoff]):
+                args = load_args()
+            with mock.patch('neam.python.neam.build_pipeline', return_value=pipeline), \
+                    mock.patch('neam.python.neam.regression.run', return_value=('', {})), \
+                    mock.patch('neam.python.neam.regression.print_report'), mock.patch('sys.stdout'):
+                self.assertEqual(0, evaluate_run(args))
+            with open(standoff, encoding='utf-8') as standoff_file:
+                self.assertEqual(annotator.registry.standoff(), standoff_file.read())
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from neam.python.classification.perceptron_classifier import PerceptronClassifier, entities, tokenize
+
+
+class TestPerceptronClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        people = ['Mr. Davis', 'Mrs. Andrews', 'Dr. Sayce', 'Miss Buttles']
+        places = ['Cairo', 'Luxor', 'Thebes', 'Assouan']
+        paragraphs = ['<p>We went with <persName ref="#x">{}</persName> to <placeName ref="#y">{}</placeName>.</p>'
+                      .format(person, place) for person in people for place in places]
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.gold = os.path.join(cls.directory.name, 'gold.xml')
+        with open(cls.gold, 'w') as f:
+            f.write('<TEI><text><body>{}</body></text></TEI>'.format(''.join(paragraphs)))
+        cls.classifier = PerceptronClassifier.train([cls.gold], iterations=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_it_tags_entities_like_those_it_was_trained_on(self):
+        self.assertEqual('<p>We went with <persName>Mr. Davis</persName> to <placeName>Thebes</placeName>.</p>',
+                         self.classifier.classify('<p>We went with Mr. Davis to Thebes.</p>'))
+
+    def test_it_loads_the_model_it_saves(self):
+        model = os.path.join(self.directory.name, 'model.pickle')
+        PerceptronClassifier.train([self.gold], iterations=5, dump=model)
+        self.assertEqual(self.classifier.classify('<p>We went with Mr. Davis to Thebes.</p>'),
+                         PerceptronClassifier(model).classify('<p>We went with Mr. Davis to Thebes.</p>'))
+
+    def test_it_loads_a_model_saved_from_the_command_line(self):
+        model = os.path.join(self.directory.name, 'cli_model.pickle')
+        subprocess.check_call([sys.executable, '-m', 'neam.python.classification.perceptron_classifier', self.gold,
+                               '--output', model], stdout=subprocess.DEVNULL,
+                              cwd=os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+        self.assertEqual('<p>We went with <persName>Mr. Davis</persName> to <placeName>Thebes</placeName>.</p>',
+                         PerceptronClassifier(model).classify('<p>We went with Mr. Davis to Thebes.</p>'))
+
+
+class TestEntities(unittest.TestCase):
+    def test_it_never_lets_an_entity_cross_markup(self):
+        text = 'Mr. <sic>Davis</sic> went'
+        _, spans = tokenize(text)
+        self.assertEqual([(0, 3, 'persName'), (9, 14, 'persName')],
+                         list(entities(text, spans, ['B-persName', 'I-persName', 'O'])))
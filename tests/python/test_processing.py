@@ -1,6 +1,41 @@
 import unittest
 
 from neam.python.classification.processing import *
+from neam.python.classification.processing import NEAMProcessor
+
+
+class CountingProcessor(NEAMProcessor):
+    def __init__(self):
+        super().__init__(str, str)
+
+    def run(self, text):
+        for i in range(len(text)):
+            self.progress(i + 1, len(text))
+        return text
+
+
+class TestPipeline(unittest.TestCase):
+    def test_it_runs_each_process_in_order(self):
+        pipeline = Pipeline([SpaceNormalizer(), lambda text: text.upper()])
+        self.assertEqual('HELLO THERE', pipeline.run('hello   there'))
+
+    def test_it_reports_progress(self):
+        reports = []
+        pipeline = Pipeline([SpaceNormalizer(), CountingProcessor()])
+        pipeline.run('ab', progress=reports.append)
+        self.assertEqual([
+            Progress('SpaceNormalizer', 1, 2, 0, 0),
+            Progress('CountingProcessor', 2, 2, 0, 0),
+            Progress('CountingProcessor', 2, 2, 1, 2),
+            Progress('CountingProcessor', 2, 2, 2, 2)
+        ], reports)
+
+    def test_processors_stop_reporting_after_the_pipeline_finishes(self):
+        reports = []
+        processor = CountingProcessor()
+        Pipeline([processor]).run('a', progress=reports.append)
+        processor.run('abc')
+        self.assertEqual(2, len(reports))
 
 
 class TestPageReplacer(unittest.TestCase):
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+
+from neam.python.classification import Progress
+from neam.python.evaluation import regression
+from neam.python.evaluation.regression import StageRecorder, compare
+
+
+def report(fmeasure, seconds):
+    return {
+        'meta': {'commit': 'abc1234', 'timestamp': '2018-06-01T12:00:00'},
+        'conll': {'persname': {'fmeasure': fmeasure}, 'Total': {'fmeasure': fmeasure}},
+        'stages': [{'name': 'Classifier', 'seconds': seconds, 'max_rss_mb': 100.0}],
+        'pipeline': {'name': 'neam', 'seconds': seconds, 'max_rss_mb': 100.0}
+    }
+
+
+class TestCompare(unittest.TestCase):
+    def test_it_passes_changes_within_the_thresholds(self):
+        self.assertEqual([], compare(report(0.795, 1.05), report(0.8, 1.0), max_f1_drop=0.01, max_slowdown=0.1))
+
+    def test_it_fails_when_f_measure_drops_or_the_pipeline_slows_down(self):
+        failures = compare(report(0.7, 1.5), report(0.8, 1.0), max_f1_drop=0.01, max_slowdown=0.1)
+        self.assertEqual(['CoNLL f-measure dropped from 0.8000 to 0.7000', 'The pipeline slowed down by 50.0%'],
+                         failures)
+
+
+
+class TestStageRecorder(unittest.TestCase):
+    def test_it_records_each_stage_and_passes_the_progress_on(self):
+        progress = mock.Mock()
+        recorder = StageRecorder(progress)
+        for stage in [Progress('a', 1, 2, 0, 0), Progress('a', 1, 2, 1, 2), Progress('b', 2, 2, 0, 0)]:
+            recorder(stage)
+        recorder.finish()
+        self.assertEqual(['a', 'b'], [stage['name'] for stage in recorder.stages])
+        self.assertEqual(3, progress.call_count)
+
+    def test_it_records_no_memory_where_it_cant_be_measured(self):
+        recorder = StageRecorder()
+        with mock.patch.object(regression, 'resource', None):
+            recorder(Progress('a', 1, 1, 0, 0))
+            recorder.finish()
+        self.assertIsNone(recorder.stages[0]['max_rss_mb'])
@@ -0,0 +1,76 @@
+import unittest
+
+from neam.python.app import status
+from neam.python.app.routing import queue_for, acquire_slot, release_slot
+
+
+class TestQueueFor(unittest.TestCase):
+    def setUp(self):
+        self.config = {'SMALL_DOCUMENT_BYTES': 100, 'INTERACTIVE_QUEUE': 'interactive', 'BULK_QUEUE': 'bulk'}
+
+    def test_it_sends_small_documents_to_the_interactive_queue(self):
+        self.assertEqual('interactive', queue_for(100, self.config))
+
+    def test_it_sends_large_documents_to_the_bulk_queue(self):
+        self.assertEqual('bulk', queue_for(101, self.config))
+
+
+class SortedSets:
+    """
+    Keeps the sorted sets acquire_slot and release_slot use, in place of Redis
+    """
+    def __init__(self):
+        self.sets = {}
+        self.expiries = {}
+        self._results = None
+
+    def pipeline(self):
+        self._results = []
+        return self
+
+    def execute(self):
+        return self._results
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.sets.setdefault(key, {})
+        for member, score in list(members.items()):
+            if score <= high:
+                del members[member]
+        self._results.append(None)
+
+    def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+        self._results.append(None)
+
+    def zrank(self, key, member):
+        members = self.sets[key]
+        self._results.append(sorted(members, key=lambda m: (members[m], m)).index(member))
+
+    def zrem(self, key, member):
+        self.sets.get(key, {}).pop(member, None)
+
+    def expire(self, key, seconds):
+        self.expiries[key] = seconds
+
+
+class TestSlots(unittest.TestCase):
+    def setUp(self):
+        self.redis = SortedSets()
+        status._connections['fake://'] = self.redis
+
+    def tearDown(self):
+        del status._connections['fake://']
+
+    def test_a_user_only_gets_their_limit_of_slots(self):
+        self.assertTrue(acquire_slot('fake://', 'ann', 'a', 2))
+        self.assertTrue(acquire_slot('fake://', 'ann', 'b', 2))
+        self.assertFalse(acquire_slot('fake://', 'ann', 'c', 2))
+        release_slot('fake://', 'ann', 'a')
+        self.assertTrue(acquire_slot('fake://', 'ann', 'c', 2))
+
+    def test_stale_slots_free_themselves_and_refusals_do_not_extend_them(self):
+        self.assertTrue(acquire_slot('fake://', 'ann', 'a', 1))
+        self.redis.sets['neam:slots:ann']['a'] -= 100
+        self.assertFalse(acquire_slot('fake://', 'ann', 'b', 1, expire=1000))
+        self.assertEqual(['a'], list(self.redis.sets['neam:slots:ann']))
+        self.assertTrue(acquire_slot('fake://', 'ann', 'b', 1, expire=50))
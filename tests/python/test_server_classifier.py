@@ -0,0 +1,95 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from bs4 import BeautifulSoup
+
+from neam.python.classification.server_classifier import ServerClassifier, tag_mentions
+
+ENTITIES = {'Mr. Davis': 'PERSON', 'Luxor': 'LOCATION', 'Cook': 'ORGANIZATION', '😀 Karnak': 'LOCATION'}
+
+
+class StubServer(BaseHTTPRequestHandler):
+    """
+    Stands in for a CoreNLP server, finding each of ENTITIES wherever it appears. The
+    first *failures* requests get a 503.
+    """
+    failures = 0
+    documents = []
+
+    def do_POST(self):
+        document = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        if StubServer.failures:
+            StubServer.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        StubServer.documents.append(document)
+
+        # offsets are counted in UTF-16 code units, as Java does
+        units = document.encode('utf-16-le')
+        mentions = []
+        for phrase, ner in ENTITIES.items():
+            encoded = phrase.encode('utf-16-le')
+            start = units.find(encoded)
+            while start >= 0:
+                mentions.append({'characterOffsetBegin': start // 2, 'characterOffsetEnd': (start + len(encoded)) // 2,
+                                 'text': phrase, 'ner': ner})
+                start = units.find(encoded, start + len(encoded))
+
+        body = json.dumps({'sentences': [{'entitymentions': mentions}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestServerClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), StubServer)
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubServer.failures = 0
+        StubServer.documents = []
+
+    def test_it_tags_the_mentions_the_server_finds(self):
+        classifier = ServerClassifier(self.url)
+        self.assertEqual('<p>We met <persName>Mr. Davis</persName> at <placeName>Luxor</placeName> '
+                         'with <orgName>Cook</orgName>.</p>',
+                         classifier.classify('<p>We met Mr. Davis at Luxor\nwith Cook.</p>'))
+
+    def test_it_sends_paragraphs_in_batches(self):
+        soup = BeautifulSoup('<body><p>Saw Mr. Davis.</p><p>😀 Karnak by night.</p><p>Luxor</p></body>', 'html.parser')
+        output = ServerClassifier(self.url, batch_chars=40, connections=1).run(soup)
+        self.assertEqual('<body><p>Saw <persName>Mr. Davis</persName>.</p>'
+                         '<p><placeName>😀 Karnak</placeName> by night.</p>'
+                         '<p><placeName>Luxor</placeName></p></body>', output)
+        self.assertEqual(['<p>Saw Mr. Davis.</p>', '<p>😀 Karnak by night.</p>\n<p>Luxor</p>'],
+                         StubServer.documents)
+
+    def test_it_retries_when_the_server_fails(self):
+        StubServer.failures = 2
+        classifier = ServerClassifier(self.url, retries=2)
+        self.assertEqual('<p><placeName>Luxor</placeName></p>', classifier.classify('<p>Luxor</p>'))
+
+
+class TestTagMentions(unittest.TestCase):
+    def test_it_skips_overlapping_and_unknown_mentions(self):
+        tags = {'PERSON': 'persName'}
+        self.assertEqual('<persName>Emma B.</persName> Andrews on 1 May',
+                         tag_mentions('Emma B. Andrews on 1 May', [(5, 15, 'PERSON'), (0, 7, 'PERSON'),
+                                                                   (19, 24, 'DATE')], tags))
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+
+from neam.python.app.storage import LocalBlobStore, clean_up
+
+
+class TestLocalBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalBlobStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_it_reads_back_what_was_put(self):
+        key = self.store.put([b'Jan. 1st ', b'Saw Bob'])
+        self.assertEqual(b'Jan. 1st Saw Bob', b''.join(self.store.get(key)))
+
+    def test_it_keys_blobs_by_content(self):
+        self.assertEqual(self.store.put([b'a', b'b']), self.store.put([b'ab']))
+        self.assertNotEqual(self.store.put([b'a']), self.store.put([b'b']))
+
+    def test_it_raises_a_key_error_for_a_missing_blob(self):
+        with self.assertRaises(KeyError):
+            self.store.open('0' * 64)
+
+    def test_it_rejects_keys_outside_of_the_store(self):
+        with self.assertRaises(KeyError):
+            self.store.open('../secret')
+
+
+class TestCleanUp(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalBlobStore(self.directory.name)
+        self.keys = [self.store.put([bytes(10 * (i + 1))]) for i in range(3)]
+        now = time.time()
+        for age, key in zip([300, 200, 100], self.keys):
+            os.utime(os.path.join(self.directory.name, key), (now - age, now - age))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_it_removes_blobs_that_have_not_been_used_recently(self):
+        self.assertEqual((1, 10), clean_up(self.store, max_age=250))
+        self.assertEqual(set(self.keys[1:]), {key for key, _, _ in self.store.blobs()})
+
+    def test_it_removes_the_least_recently_used_blobs_to_meet_a_quota(self):
+        self.store.open(self.keys[0]).close()
+        self.assertEqual((1, 20), clean_up(self.store, max_bytes=45))
+        self.assertEqual({self.keys[0], self.keys[2]}, {key for key, _, _ in self.store.blobs()})
+
+    def test_it_keeps_recently_used_blobs_over_the_quota(self):
+        self.assertEqual((1, 10), clean_up(self.store, max_bytes=0, min_age=250))
+        self.assertEqual(set(self.keys[1:]), {key for key, _, _ in self.store.blobs()})
+
+    def test_it_removes_old_unfinished_blobs(self):
+        now = time.time()
+        for name, age in [('tmpold', 300), ('tmpnew', 0)]:
+            path = os.path.join(self.directory.name, name)
+            with open(path, 'wb') as f:
+                f.write(bytes(5))
+            os.utime(path, (now - age, now - age))
+        self.assertEqual((2, 15), clean_up(self.store, max_age=250))
+        self.assertEqual({'tmpnew'} | set(self.keys[1:]), set(os.listdir(self.directory.name)))
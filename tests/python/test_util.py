@@ -0,0 +1,17 @@
+import os
+import tempfile
+import unittest
+
+from neam.python.util import git_commit
+
+
+class TestGitCommit(unittest.TestCase):
+    def test_it_finds_the_commit_of_the_package_from_anywhere(self):
+        commit = git_commit()
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                self.assertEqual(commit, git_commit())
+            finally:
+                os.chdir(cwd)
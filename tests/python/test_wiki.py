@@ -93,3 +93,36 @@ class WikiRetaggerTest(TestCase):
         output = self.retagger.run('<body><placeName>afdsakjfas</placeName></body>')
         self.assertEqual('<body><placeName>afdsakjfas</placeName></body>', output)
 
+
+
+class WikiRetaggerMemoTest(TestCase):
+    def setUp(self):
+        self.lookups = []
+
+    def make_retagger(self, **kwargs):
+        retagger = WikiRetagger(['persName', 'placeName'], {'Person': 'persName'}, **kwargs)
+        retagger.retag = lambda entity: self.lookups.append(entity) or 'Person'
+        return retagger
+
+    def test_it_retags_each_entity_once_per_document(self):
+        retagger = self.make_retagger()
+        for parser in ['xml', 'lxml']:
+            self.lookups = []
+            output = retagger.run('<body><placeName>Mr. Davis</placeName> <persName>Mr.\n Davis</persName> '
+                                  '<placeName>Luxor</placeName></body>')
+            self.assertEqual('<body><persName>Mr. Davis</persName> <persName>Mr.\n Davis</persName> '
+                             '<persName>Luxor</persName></body>', output)
+            self.assertEqual(['Mr. Davis', 'Luxor'], self.lookups)
+
+    def test_it_forgets_its_memo_between_documents_by_default(self):
+        retagger = self.make_retagger()
+        retagger.run('<body><placeName>Luxor</placeName></body>')
+        retagger.run('<body><placeName>Luxor</placeName></body>')
+        self.assertEqual(['Luxor', 'Luxor'], self.lookups)
+
+    def test_it_can_keep_the_most_recently_used_between_documents(self):
+        retagger = self.make_retagger(memo_size=2)
+        retagger.run('<body><placeName>Luxor</placeName> <placeName>Cairo</placeName></body>')
+        retagger.run('<body><placeName>Luxor</placeName> <placeName>Thebes</placeName></body>')
+        retagger.run('<body><placeName>Luxor</placeName> <placeName>Cairo</placeName></body>')
+        self.assertEqual(['Luxor', 'Cairo', 'Thebes', 'Cairo'], self.lookups)